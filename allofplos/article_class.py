@@ -1,22 +1,28 @@
-import os
+import collections
+import io
 import re
 import subprocess
 
 import lxml.etree as et
-import requests
 
-from allofplos.transformations import (filename_to_doi, EXT_URL_TMP, INT_URL_TMP,
+from allofplos import http_client
+from allofplos.transformations import (filename_to_doi, doi_to_path, EXT_URL_TMP, INT_URL_TMP,
                                        BASE_URL_ARTICLE_LANDING_PAGE)
 from allofplos.plos_regex import (validate_doi, corpusdir)
-from allofplos.article_elements import (parse_article_date, get_contrib_info,
-                                        match_contribs_to_dicts)
+from allofplos.corpus_store import article_exists
+from allofplos.prefetch import default_depth, default_workers, filesystem_order, prefetch_files
+from allofplos.tree_cache import cached_parse, cached_parse_front, is_front_path, parse_front
+from allofplos.parsers import parse
+from allofplos.xpaths import XPATHS, get_xpath
+from allofplos import article_fields, corpus_layout
+from allofplos.article_elements import get_contrib_info, match_contribs_to_dicts
 
 
 class Article():
     """The primary object of a PLOS article, initialized by a valid PLOS DOI.
 
     """
-    def __init__(self, doi, directory=corpusdir, plos_network=False):
+    def __init__(self, doi, directory=corpusdir, plos_network=False, lazy=False):
         """Creation of an article object.
 
         Usage:
@@ -34,11 +40,15 @@ class Article():
         :type directory: str, optional
         :param plos_network: whether on the local PLOS network, defaults to False
         :type plos_network: bool, optional
+        :param lazy: for metadata in <front>, only parse the article up to the end of <front>,
+        and parse the whole article only when something else (like the body) is needed, defaults to False
+        :type lazy: bool, optional
         """
         self.doi = doi
         self.directory = directory
         self.reset_memoized_attrs()
         self.plos_network = plos_network
+        self.lazy = lazy
         self._editor = None
 
     def reset_memoized_attrs(self):
@@ -49,6 +59,7 @@ class Article():
         reset them when creating a new article object.
         """
         self._tree = None
+        self._front_tree = None
         self._local = None
         self._contributors = None
         self._correct_or_retract = None  # Will probably need to be an article subclass
@@ -101,6 +112,19 @@ class Article():
         self.reset_memoized_attrs()
         self._doi = d
 
+    @property
+    def directory(self):
+        """The directory where the local article XML file is located.
+
+        Changing it resets the memoized attributes, like changing the DOI does
+        """
+        return self._directory
+
+    @directory.setter
+    def directory(self, d):
+        self.reset_memoized_attrs()
+        self._directory = d
+
     def __str__(self, exclude_refs=True):
         """Output when you print an article object on the command line.
 
@@ -109,11 +133,10 @@ class Article():
         :param exclude_refs: remove references from the article tree (eases print viewing)
         :type pretty_print: bool, optional
         """
-        parser = et.XMLParser(remove_blank_text=True)
-        tree = et.parse(self.filename, parser)
+        tree = parse(self.filename, purpose='view')
         if exclude_refs:
             root = tree.getroot()
-            back = tree.xpath('./back')
+            back = XPATHS['back'](tree)
             root.remove(back[0])
         local_xml = et.tostring(tree,
                                 method='xml',
@@ -175,25 +198,49 @@ class Article():
         """
         subprocess.call(["open", self.page])
 
-    def get_element_xpath(self, tag_path_elements=None):
+    def get_element_xpath(self, tag_path_elements=None, location=None):
         """For a local article's root element, grab particular sub-elements via XPath location.
 
         Defaults to reading the element location for uncorrected proofs/versions of record
-        The basis of every method and property looking for particular metadata fields
-        :param article_root: the xml file for a single article
+        The XPath for each location is compiled once and shared, see xpaths.get_xpath()
+        For lazy articles, locations in <front> are looked up in self.front_tree
         :param tag_path_elements: xpath location in the XML tree of the article file
+        :param location: name of a location in xpaths.article_paths, instead of tag_path_elements
         :return: list of elements in the article with that xpath location
         """
-        if tag_path_elements is None:
-            tag_path_elements = ('/',
-                                 'article',
-                                 'front',
-                                 'article-meta',
-                                 'custom-meta-group',
-                                 'custom-meta',
-                                 'meta-value')
-        tag_location = '/'.join(tag_path_elements)
-        return self.root.xpath(tag_location)
+        xpath = get_xpath(tag_path_elements, name=location)
+        if self.lazy and is_front_path(xpath.path):
+            return xpath(self.front_tree)
+        return xpath(self.tree)
+
+    def _get_parts(self, body=False):
+        """The elements of the article that metadata fields are read from, see article_fields.ArticleParts.
+
+        :param body: whether the body is needed; if not, a lazy article only parses <front>
+        """
+        tree = self.front_tree if self.lazy and not body else self.tree
+        return article_fields.ArticleParts(tree.getroot(), label=self.doi)
+
+    def get_fields(self, fields=None):
+        """Read several metadata fields of the article at once.
+
+        The article tree is walked once for all of the fields, see article_fields.extract_fields()
+        The metadata properties below each read one field this way
+        For lazy articles, only <front> is parsed unless one of the fields needs the body
+        :param fields: names of fields in article_fields.FIELDS, defaults to all of them
+        :type fields: list, optional
+        :returns: dict of field names mapped to their values
+        :rtype: {dict}
+        """
+        if fields is None:
+            fields = list(article_fields.FIELDS)
+        parts = self._get_parts(body=article_fields.needs_body(fields))
+        return article_fields.extract_fields(parts, fields)
+
+    def get_field(self, field):
+        """Read one metadata field of the article, see get_fields().
+        """
+        return self.get_fields([field])[field]
 
     def get_plos_journal(self, caps_fixed=True):
         """For an individual PLOS article, get the journal it was published in.
@@ -201,31 +248,9 @@ class Article():
         :param caps_fixed: whether to render 'PLOS' in the journal name correctly, or as-is ('PLoS')
         :return: PLOS journal name at specified xpath location
         """
-        try:
-            journal = self.get_element_xpath(tag_path_elements=["/",
-                                                                "article",
-                                                                "front",
-                                                                "journal-meta",
-                                                                "journal-title-group",
-                                                                "journal-title"])
-            journal = journal[0].text
-        except IndexError:
-            # Need to file JIRA ticket: only affects pone.0047704
-            journal_meta = self.get_element_xpath(tag_path_elements=["/",
-                                                                     "article",
-                                                                     "front",
-                                                                     "journal-meta"])
-            for journal_child in journal_meta[0]:
-                if journal_child.attrib['journal-id-type'] == 'nlm-ta':
-                    journal = journal_child.text
-                    break
-
         if caps_fixed:
-            journal = journal.split()
-            if journal[0].lower() == 'plos':
-                journal[0] = "PLOS"
-            journal = (' ').join(journal)
-        return journal
+            return self.get_field('journal')
+        return article_fields.get_journal(self._get_parts(), caps_fixed=False)
 
     def get_dates(self, string_=False, string_format='%Y-%m-%d', debug=False):
         """For an individual article, get all of its dates, including publication date (pubdate), submission date.
@@ -237,39 +262,7 @@ class Article():
         :return: dict of date types mapped to datetime objects for that article
         :rtype: {dict}
         """
-        dates = {}
-        # first location is where pubdate and date added to collection are
-        tag_path_1 = ["/",
-                      "article",
-                      "front",
-                      "article-meta",
-                      "pub-date"]
-        element_list_1 = self.get_element_xpath(tag_path_elements=tag_path_1)
-        for element in element_list_1:
-            pub_type = element.get('pub-type')
-            try:
-                date = parse_article_date(element)
-            except ValueError:
-                print('Error getting pubdates for {}'.format(self.doi))
-                date = ''
-            dates[pub_type] = date
-
-        # second location is where historical dates are, including submission and acceptance
-        tag_path_2 = ["/",
-                      "article",
-                      "front",
-                      "article-meta",
-                      "history"]
-        element_list_2 = self.get_element_xpath(tag_path_elements=tag_path_2)
-        for element in element_list_2:
-            for part in element:
-                date_type = part.get('date-type')
-                try:
-                    date = parse_article_date(part)
-                except ValueError:
-                    print('Error getting history dates for {}'.format(self.doi))
-                    date = ''
-                dates[date_type] = date
+        dates = self.get_field('dates')
         if debug:
             # check whether date received is before date accepted is before pubdate
             if dates.get('received', '') and dates.get('accepted', '') in dates:
@@ -293,11 +286,7 @@ class Article():
         :returns: Dictionary of footnote ids to institution information
         :rtype: {dict}
         """
-        tags_to_aff = ["/",
-                       "article",
-                       "front",
-                       "article-meta"]
-        article_aff_elements = self.get_element_xpath(tag_path_elements=tags_to_aff)
+        article_aff_elements = self.get_element_xpath(location='article_meta')
         aff_dict = {}
         aff_elements = [el
                         for aff_element in article_aff_elements
@@ -327,12 +316,7 @@ class Article():
         :returns: Dictionary of footnote ids to institution information
         :rtype: {dict}
         """
-        tags_to_fn = ["/",
-                      "article",
-                      "front",
-                      "article-meta",
-                      "author-notes"]
-        article_fn_elements = self.get_element_xpath(tag_path_elements=tags_to_fn)
+        article_fn_elements = self.get_element_xpath(location='author_notes')
         fn_dict = {}
         fn_elements = [el
                        for fn_element in article_fn_elements
@@ -363,13 +347,8 @@ class Article():
         :return: dictionary of rid or author initials mapped to list of email address(es)
         :rtype: {dict}
         """
-        tag_path = ["/",
-                    "article",
-                    "front",
-                    "article-meta",
-                    "author-notes"]
         try:
-            author_notes_element = self.get_element_xpath(tag_path_elements=tag_path)[0]
+            author_notes_element = self.get_element_xpath(location='author_notes')[0]
         except IndexError:
             # no emails found
             return {}
@@ -461,13 +440,8 @@ class Article():
         if self.type_ in ['correction', 'retraction', 'expression-of-concern']:
             # these article types don't have proper 'authors'
             return {}
-        tag_path = ["/",
-                    "article",
-                    "front",
-                    "article-meta",
-                    "author-notes"]
         try:
-            author_notes_element = self.get_element_xpath(tag_path_elements=tag_path)[0]
+            author_notes_element = self.get_element_xpath(location='author_notes')[0]
         except IndexError:
             return {}
         author_contributions = {}
@@ -538,13 +512,7 @@ class Article():
         credit_dict = self.get_contributions_dict()
 
         # get list of contributor elements (one per contributor)
-        tag_path = ["/",
-                    "article",
-                    "front",
-                    "article-meta",
-                    "contrib-group",
-                    "contrib"]
-        contrib_list = self.get_element_xpath(tag_path_elements=tag_path)
+        contrib_list = self.get_element_xpath(location='contrib')
         contrib_dict_list = []
 
         error_printed = False
@@ -689,26 +657,7 @@ class Article():
         NOTE: what to do if more than one related article?
         :return: first doi at that xpath location
         """
-        related_article_elements = self.get_element_xpath(tag_path_elements=["/",
-                                                                             "article",
-                                                                             "front",
-                                                                             "article-meta",
-                                                                             "related-article"])
-        related_article = ''
-        if self.type_ == 'correction':
-            for element in related_article_elements:
-                if element.attrib['related-article-type'] in ('corrected-article', 'companion'):
-                    corrected_doi = element.attrib['{http://www.w3.org/1999/xlink}href']
-                    related_article = corrected_doi.lstrip('info:doi/')
-                    break
-        else:
-            try:
-                related_article_element = related_article_elements[0].attrib
-                related_article = related_article_element['{http://www.w3.org/1999/xlink}href']
-                related_article = related_article.lstrip('info:doi/')
-            except IndexError:
-                return ''
-        return related_article
+        return article_fields.get_first_related_doi(self._get_parts())
 
     def check_if_link_works(self):
         """See if a link is valid (i.e., returns a '200' to the HTML request).
@@ -718,7 +667,7 @@ class Article():
         :return: boolean if HTTP status code returned available or unavailable,
         "error" if a different status code is returned than 200 or 404
         """
-        request = requests.get(self.url)
+        request = http_client.get(self.url)
         if request.status_code == 200:
             return True
         elif request.status_code == 404:
@@ -739,7 +688,7 @@ class Article():
         url = "http://dx.doi.org/" + self.doi
         if self.check_if_link_works() is True:
             headers = {"accept": "application/vnd.citationstyles.csl+json"}
-            r = requests.get(url, headers=headers)
+            r = http_client.get(url, headers=headers)
             r_doi = r.json()['DOI']
             if r_doi == self.doi:
                 return "works"
@@ -763,18 +712,37 @@ class Article():
 
         See http://lxml.de/api/lxml.etree._ElementTree-class.html
         After accessing tree for the first time, it stores as an attribute
+        If the tree cache is on (see tree_cache.enable_tree_cache()), the tree is shared
+        with other article objects for the same file
         :returns: article's element tree
         :rtype: {lxml.etree._ElementTree-class} or None
         """
         if self._tree is None:
             if self.local:
-                local_element_tree = et.parse(self.filename)
-                return local_element_tree
+                self._tree = cached_parse(self.filename)
             else:
                 print("Local article file not found: {}".format(self.filename))
                 return None
-        else:
+        return self._tree
+
+    @property
+    def front_tree(self):
+        """The element tree of an article's local XML file, parsed only as far as the end of <front>.
+
+        If the whole tree has already been parsed, that's used instead
+        After accessing front_tree for the first time, it stores as an attribute
+        :returns: article's element tree, with <front> as the only child of the root element
+        :rtype: {lxml.etree._ElementTree-class} or None
+        """
+        if self._tree is not None:
             return self._tree
+        if self._front_tree is None:
+            if self.local:
+                self._front_tree = cached_parse_front(self.filename)
+            else:
+                print("Local article file not found: {}".format(self.filename))
+                return None
+        return self._front_tree
 
     @property
     def root(self):
@@ -799,23 +767,24 @@ class Article():
     @property
     def filename(self):
         """The path on the local file system to a given article's XML file
+
+        Follows the layout of the article's directory, see corpus_layout
         """
         if 'annotation' in self.doi:
-            article_path = os.path.join(self.directory, 'plos.correction.' + self.doi.split('/')[-1] + '.xml')
+            filename = 'plos.correction.' + self.doi.split('/')[-1] + '.xml'
         else:
-            article_path = os.path.join(self.directory, self.doi.lstrip('10.1371/') + '.xml')
-        return article_path
+            filename = self.doi.lstrip('10.1371/') + '.xml'
+        return corpus_layout.article_path(self.directory, filename)
 
     @property
     def local(self):
-        """Boolean of whether the article is stored locally or not.
+        """Boolean of whether the article is stored locally or not, as a file or in a pack store.
 
         Stored as attribute after first access
         """
         if self._local is None:
-            return os.path.isfile(self.filename)
-        else:
-            return self._local
+            self._local = article_exists(self.filename)
+        return self._local
 
     @property
     def proof(self):
@@ -824,14 +793,7 @@ class Article():
         'VOR update' to the uncorrected proof, or neither.
         :return: proof status if it exists; otherwise, None
         """
-        xpath_results = self.get_element_xpath()
-        proof = ''
-        for result in xpath_results:
-            if result.text == 'uncorrected-proof':
-                proof = 'uncorrected_proof'
-            elif result.text == 'vor-update-to-uncorrected-proof':
-                proof = 'vor_update'
-        return proof
+        return self.get_field('proof')
 
     @property
     def remote_element_tree(self):
@@ -841,7 +803,7 @@ class Article():
         :returns: article's online element tree
         :rtype: {lxml.etree._ElementTree-class}
         """
-        return et.parse(self.url)
+        return http_client.get_tree(self.url)
 
     @property
     def journal(self):
@@ -858,14 +820,7 @@ class Article():
 
         :return: string of article title at specified xpath location
         """
-        title = self.get_element_xpath(tag_path_elements=["/",
-                                                          "article",
-                                                          "front",
-                                                          "article-meta",
-                                                          "title-group",
-                                                          "article-title"])
-        title_text = et.tostring(title[0], encoding='unicode', method='text', pretty_print=True)
-        return title_text.rstrip('\n')
+        return self.get_field('title')
 
     @property
     def pubdate(self):
@@ -887,9 +842,8 @@ class Article():
         :rtype: {list}
         """
         if self._contributors is None:
-            return self.get_contributors_info()
-        else:
-            return self._contributors
+            self._contributors = self.get_contributors_info()
+        return self._contributors
 
     @property
     def authors(self):
@@ -944,9 +898,7 @@ class Article():
         Used primarily to find Correction (and thereby corrected) articles
         :return: JATS article_type at that xpath location
         """
-        type_element_list = self.get_element_xpath(tag_path_elements=["/",
-                                                                      "article"])
-        return type_element_list[0].attrib['article-type']
+        return self.get_field('type_')
 
     @property
     def plostype(self):
@@ -955,39 +907,14 @@ class Article():
         This format is less standardized than the JATS article type (self.type_)
         :return: PLOS article_type at that xpath location
         """
-        article_categories = self.get_element_xpath(tag_path_elements=["/",
-                                                                       "article",
-                                                                       "front",
-                                                                       "article-meta",
-                                                                       "article-categories"])
-        subject_list = article_categories[0].getchildren()
-
-        for i, subject in enumerate(subject_list):
-            if subject.get('subj-group-type') == "heading":
-                subject_instance = subject_list[i][0]
-                s = ''
-                for text in subject_instance.itertext():
-                    s = s + text
-                    plos_article_type = s
-        return plos_article_type
+        return self.get_field('plostype')
 
     @property
     def dtd(self):
         """Document Type Definition for an article.
         For more information on these DTD tagsets, see https://jats.nlm.nih.gov/1.1d3/ and https://dtd.nlm.nih.gov/3.0/
         """
-        dtd = self.get_element_xpath(tag_path_elements=["/",
-                                                        "article"])
-        try:
-            dtd = dtd[0].attrib['dtd-version']
-            if str(dtd) == '3.0':
-                dtd = 'NLM 3.0'
-            elif dtd == '1.1d3':
-                dtd = 'JATS 1.1d3'
-        except KeyError:
-            print('Error parsing DTD from', self.doi)
-            dtd = 'N/A'
-        return dtd
+        return self.get_field('dtd')
 
     @property
     def abstract(self):
@@ -996,24 +923,7 @@ class Article():
         Info about the article abstract: http://journals.plos.org/plosone/s/submission-guidelines#loc-abstract
         :return: plain-text string of content in abstract
         """
-        abstract = self.get_element_xpath(tag_path_elements=["/",
-                                                             "article",
-                                                             "front",
-                                                             "article-meta",
-                                                             "abstract"])
-        try:
-            abstract_text = et.tostring(abstract[0], encoding='unicode', method='text')
-        except IndexError:
-            if self.type_ == 'research-article' and self.plostype == 'Research Article':
-                print('No abstract found for research article {}'.format(self.doi))
-
-            abstract_text = ''
-
-        # clean up text: rem white space, new line marks, blank lines
-        abstract_text = abstract_text.strip().replace('  ', '')
-        abstract_text = os.linesep.join([s for s in abstract_text.splitlines() if s])
-
-        return abstract_text
+        return self.get_field('abstract')
 
     @property
     def correct_or_retract(self):
@@ -1048,22 +958,7 @@ class Article():
         Dictionary format for XML tags: {figures: fig-count, pages: page-count, tables: table-count}
         :return: counts dictionary of number of figures, pages, and tables in the article
         """
-        counts = {}
-
-        tag_path = ["/",
-                    "article",
-                    "front",
-                    "article-meta",
-                    "counts"]
-        count_element_list = self.get_element_xpath(tag_path_elements=tag_path)
-        for count_element in count_element_list:
-            for count_item in count_element:
-                count = count_item.get('count')
-                count_type = count_item.tag
-                counts[count_type] = count
-        if len(counts) > 3:  # this shouldn't happen
-            print(counts)
-        return counts
+        return self.get_field('counts')
 
     @property
     def word_count(self):
@@ -1071,16 +966,7 @@ class Article():
 
         :return: count of words in the body of the PLOS article
         """
-        body_element = self.get_element_xpath(tag_path_elements=["/",
-                                                                 "article",
-                                                                 "body"])
-        try:
-            body_text = et.tostring(body_element[0], encoding='unicode', method='text')
-            body_word_count = len(body_text.split(" "))
-        except IndexError:
-            print("Error parsing article body: {}".format(self.doi))
-            body_word_count = 0
-        return body_word_count
+        return self.get_field('word_count')
 
     @filename.setter
     def filename(self, value):
@@ -1097,3 +983,113 @@ class Article():
         """Initiate an article object using a local XML file.
         """
         return cls(filename_to_doi(filename))
+
+    @classmethod
+    def iter_many(cls, dois, directory=corpusdir, lazy=False, depth=default_depth, workers=default_workers):
+        """Iterate over the articles for many DOIs, with their files read ahead of parsing.
+
+        Articles come in the order their files are stored (see prefetch.filesystem_order()),
+        not in the order of dois. While one article is being used, the next files are read on
+        background threads (see prefetch.prefetch_files()). Each article is yielded with its tree
+        already parsed from the prefetched bytes, by this thread's shared parser.
+        Usage:
+        `for article in Article.iter_many(dois): print(article.title)`
+        :param dois: DOIs of the articles
+        :param directory: where the local article XML files are located
+        :param lazy: only parse each article up to the end of <front>, see Article()
+        :param depth: how many files to read ahead
+        :param workers: number of threads reading files
+        :returns: generator of Article objects; for DOIs without a local file, article.local is False
+        """
+        dois_by_path = {doi_to_path(doi, directory=directory): doi for doi in dois}
+        for path, content in prefetch_files(filesystem_order(dois_by_path), depth=depth, workers=workers):
+            article = cls(dois_by_path[path], directory=directory, lazy=lazy)
+            article._local = content is not None
+            if article.local and lazy:
+                article._front_tree = parse_front(io.BytesIO(content))
+            elif article.local:
+                article._tree = parse(io.BytesIO(content))
+            yield article
+
+    @classmethod
+    def batch(cls, dois, fields=None, directory=corpusdir, depth=default_depth, workers=default_workers):
+        """Read metadata fields of the articles for many DOIs.
+
+        Like iter_many(), files are read ahead and come in the order they're stored in
+        Articles are only parsed up to the end of <front> unless one of the fields needs the body
+        Usage:
+        `for fields in Article.batch(dois, ['title', 'pubdate']): print(fields['doi'], fields['title'])`
+        :param dois: DOIs of the articles
+        :param fields: names of fields in article_fields.FIELDS, defaults to all of them
+        :param directory: where the local article XML files are located
+        :param depth: how many files to read ahead
+        :param workers: number of threads reading files
+        :returns: generator of dicts of field names mapped to values, plus the article's 'doi';
+        articles without a local file are skipped
+        """
+        if fields is None:
+            fields = list(article_fields.FIELDS)
+        lazy = not article_fields.needs_body(fields)
+        for article in cls.iter_many(dois, directory=directory, lazy=lazy, depth=depth, workers=workers):
+            if not article.local:
+                print("Local article file not found: {}".format(article.filename))
+                continue
+            values = article.get_fields(fields)
+            values['doi'] = article.doi
+            yield values
+
+    def to_record(self, word_count=True):
+        """Get the article's metadata as a compact ArticleRecord.
+
+        :param word_count: whether to include the word count, which needs the body of the article;
+        without it, a lazy article only parses <front>
+        :type word_count: bool, optional
+        :returns: record of the article's metadata
+        :rtype: {ArticleRecord}
+        """
+        return ArticleRecord.from_article(self, word_count=word_count)
+
+
+class ArticleRecord(collections.namedtuple('ArticleRecord', ['doi',
+                                                             'title',
+                                                             'journal',
+                                                             'type_',
+                                                             'plostype',
+                                                             'dtd',
+                                                             'pubdate',
+                                                             'dates',
+                                                             'counts',
+                                                             'word_count',
+                                                             'related_doi',
+                                                             'proof'])):
+    """The metadata of a PLOS article, without its XML tree.
+
+    Holds the values of the Article properties of the same names, plus `dates` from Article.get_dates().
+    Records are immutable tuples without a per-object __dict__, so hundreds of thousands of them fit
+    in memory, and they pickle cheaply for sending between processes.
+    Usage:
+    `record = Article(doi).to_record()` or `record = ArticleRecord.from_article(article)`
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_article(cls, article, word_count=True):
+        """Read all of the record's fields from an article.
+
+        Reads every field in one walk over the article's memoized tree, so the article file is only
+        parsed once (or, for a lazy article without word_count, only as far as the end of <front>)
+        :param article: Article to read
+        :type article: {Article}
+        :param word_count: whether to include the word count; if False, word_count is None
+        :type word_count: bool, optional
+        :returns: record of the article's metadata
+        :rtype: {ArticleRecord}
+        """
+        fields = ['title', 'journal', 'type_', 'plostype', 'dtd', 'dates', 'counts', 'related_doi', 'proof']
+        if word_count:
+            fields.append('word_count')
+        values = article.get_fields(fields)
+        return cls(doi=article.doi,
+                   pubdate=values['dates'].get('epub'),
+                   word_count=values.pop('word_count', None),
+                   **values)
@@ -0,0 +1,315 @@
+"""Reading several metadata fields of an article at once.
+
+Every Article metadata property, and every get_article_* function in samples/corpus_analysis.py,
+used to parse the article file and search it from the root with its own XPath, so one row of
+corpus metadata meant about ten parses. extract_fields() parses an article once, walks the top of
+its tree once to find the elements that fields are read from (ArticleParts), and reads every
+requested field from those elements. If none of the fields need the body, the file is only
+parsed as far as the end of <front>.
+
+Usage:
+`extract_fields('allofplos_xml/journal.pone.0185809.xml', ['title', 'journal', 'pubdate'])`
+"""
+
+import collections
+import os
+
+import lxml.etree as et
+
+from allofplos.article_elements import parse_article_date
+from allofplos import parsers
+from allofplos.plos_regex import validate_doi
+from allofplos.transformations import doi_to_path
+from allofplos.tree_cache import cached_parse, cached_parse_front
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+class ArticleParts():
+    """The elements of an article that fields are read from, found in one walk over the top of its tree."""
+    def __init__(self, root, label=''):
+        """
+        :param root: root <article> element of an article tree
+        :param label: name of the article (like its DOI) for error messages
+        """
+        self.root = root
+        self.label = label
+        self.front = None
+        self.journal_meta = None
+        self.body = None
+        self._article_meta = {}
+        for child in root:
+            if child.tag == 'front':
+                self.front = child
+                for part in child:
+                    if part.tag == 'journal-meta':
+                        self.journal_meta = part
+                    elif part.tag == 'article-meta':
+                        for element in part:
+                            self._article_meta.setdefault(element.tag, []).append(element)
+            elif child.tag == 'body':
+                self.body = child
+
+    def meta(self, tag, subtag=None):
+        """
+        Elements inside <article-meta>
+        :param tag: tag of children of <article-meta>
+        :param subtag: if given, the children with this tag of those elements instead
+        :return: list of elements
+        """
+        elements = self._article_meta.get(tag, [])
+        if subtag is None:
+            return elements
+        return [child for element in elements for child in element if child.tag == subtag]
+
+
+def get_doi(parts):
+    """DOI from the <article-id> of the article."""
+    for element in parts.meta('article-id'):
+        if element.get('pub-id-type') == 'doi':
+            return element.text
+    return ''
+
+
+def get_title(parts):
+    """Plain text of the article title."""
+    title = parts.meta('title-group', 'article-title')
+    title_text = et.tostring(title[0], encoding='unicode', method='text')
+    return title_text.rstrip('\n')
+
+
+def get_journal(parts, caps_fixed=True):
+    """
+    Journal the article was published in
+    :param caps_fixed: whether to render 'PLOS' in the journal name correctly, or as-is ('PLoS')
+    """
+    journal = None
+    if parts.journal_meta is not None:
+        for title_group in parts.journal_meta.iterchildren('journal-title-group'):
+            for title in title_group.iterchildren('journal-title'):
+                journal = title.text
+                break
+            break
+        if journal is None:
+            # Need to file JIRA ticket: only affects pone.0047704
+            for journal_child in parts.journal_meta:
+                if journal_child.get('journal-id-type') == 'nlm-ta':
+                    journal = journal_child.text
+                    break
+    if caps_fixed and journal:
+        journal = journal.split()
+        if journal[0].lower() == 'plos':
+            journal[0] = "PLOS"
+        journal = (' ').join(journal)
+    return journal
+
+
+def get_type(parts):
+    """JATS article type."""
+    return parts.root.attrib['article-type']
+
+
+def get_plostype(parts):
+    """PLOS article type, from the 'heading' subject group; '' if there isn't one."""
+    plos_article_type = ''
+    for article_categories in parts.meta('article-categories')[:1]:
+        for subject_group in article_categories:
+            if subject_group.get('subj-group-type') == "heading":
+                plos_article_type = ''.join(subject_group[0].itertext())
+    return plos_article_type
+
+
+def get_dtd(parts):
+    """Document Type Definition the article uses."""
+    try:
+        dtd = parts.root.attrib['dtd-version']
+        if str(dtd) == '3.0':
+            dtd = 'NLM 3.0'
+        elif dtd == '1.1d3':
+            dtd = 'JATS 1.1d3'
+    except KeyError:
+        print('Error parsing DTD from', parts.label)
+        dtd = 'N/A'
+    return dtd
+
+
+def get_dates(parts):
+    """Dict of date types (like 'epub', 'received', 'accepted') mapped to datetime objects."""
+    dates = {}
+    # first location is where pubdate and date added to collection are
+    for element in parts.meta('pub-date'):
+        pub_type = element.get('pub-type')
+        try:
+            date = parse_article_date(element)
+        except ValueError:
+            print('Error getting pubdates for {}'.format(parts.label))
+            date = ''
+        dates[pub_type] = date
+    # second location is where historical dates are, including submission and acceptance
+    for element in parts.meta('history'):
+        for part in element:
+            date_type = part.get('date-type')
+            try:
+                date = parse_article_date(part)
+            except ValueError:
+                print('Error getting history dates for {}'.format(parts.label))
+                date = ''
+            dates[date_type] = date
+    return dates
+
+
+def get_pubdate(parts):
+    """Date the article was published online."""
+    return get_dates(parts)['epub']
+
+
+def get_counts(parts):
+    """Dict of counts of figures, tables and pages, like {'fig-count': '5'}."""
+    counts = {}
+    for count_element in parts.meta('counts'):
+        for count_item in count_element:
+            counts[count_item.tag] = count_item.get('count')
+    if len(counts) > 3:  # this shouldn't happen
+        print(counts)
+    return counts
+
+
+def get_word_count(parts):
+    """Number of words in the body of the article."""
+    if parts.body is None:
+        print("Error parsing article body: {}".format(parts.label))
+        return 0
+    body_text = et.tostring(parts.body, encoding='unicode', method='text')
+    return len(body_text.split(" "))
+
+
+def get_abstract(parts):
+    """Plain text of the abstract, without blank lines."""
+    abstract = parts.meta('abstract')
+    try:
+        abstract_text = et.tostring(abstract[0], encoding='unicode', method='text')
+    except IndexError:
+        if get_type(parts) == 'research-article' and get_plostype(parts) == 'Research Article':
+            print('No abstract found for research article {}'.format(parts.label))
+        abstract_text = ''
+
+    # clean up text: rem white space, new line marks, blank lines
+    abstract_text = abstract_text.strip().replace('  ', '')
+    abstract_text = os.linesep.join([s for s in abstract_text.splitlines() if s])
+    return abstract_text
+
+
+def get_first_related_doi(parts):
+    """
+    DOI of the first related article; for corrections, of the first corrected (or companion) article
+    NOTE: what to do if more than one related article?
+    """
+    related_article_elements = parts.meta('related-article')
+    related_article = ''
+    if get_type(parts) == 'correction':
+        for element in related_article_elements:
+            if element.attrib['related-article-type'] in ('corrected-article', 'companion'):
+                related_article = element.attrib[XLINK_HREF].lstrip('info:doi/')
+                break
+    elif related_article_elements:
+        related_article = related_article_elements[0].attrib[XLINK_HREF].lstrip('info:doi/')
+    return related_article
+
+
+def get_related_doi(parts):
+    """DOI of the corrected or retracted article, for corrections and retractions; otherwise ''."""
+    if get_type(parts) in ('correction', 'retraction'):
+        return get_first_related_doi(parts)
+    return ''
+
+
+def get_proof(parts):
+    """'uncorrected_proof', 'vor_update' (version of record update to an uncorrected proof) or ''."""
+    proof = ''
+    for meta_value in parts.meta('custom-meta-group', 'custom-meta'):
+        for result in meta_value.iterchildren('meta-value'):
+            if result.text == 'uncorrected-proof':
+                proof = 'uncorrected_proof'
+            elif result.text == 'vor-update-to-uncorrected-proof':
+                proof = 'vor_update'
+    return proof
+
+
+def parse_article_file(article_file, parse=parsers.parse):
+    """
+    Parse a local article file
+    Can also interpret DOIs, and filenames with a missing or differently capitalized extension
+    :param article_file: path to the article XML file, or its DOI; or its tree, if already parsed
+    :param parse: function that parses the file into a tree
+    :return: lxml element tree
+    """
+    if hasattr(article_file, 'getroot'):
+        return article_file
+    try:
+        return parse(article_file)
+    except OSError:
+        if validate_doi(article_file):
+            article_file = doi_to_path(article_file)
+        elif article_file.endswith('xml'):
+            article_file = article_file[:-3] + 'XML'
+        elif article_file.endswith('XML'):
+            article_file = article_file[:-3] + 'xml'
+        elif article_file.endswith('nxml'):
+            article_file = article_file[:-3] + 'nxml'
+        elif not article_file.endswith('.'):
+            article_file = article_file + '.xml'
+        else:
+            article_file = article_file + 'xml'
+        return parse(article_file)
+
+
+Field = collections.namedtuple('Field', ['extract', 'needs_body'])
+
+# Every field that extract_fields() can read, with whether it needs more than <front>
+FIELDS = {'doi': Field(get_doi, False),
+          'title': Field(get_title, False),
+          'journal': Field(get_journal, False),
+          'type_': Field(get_type, False),
+          'plostype': Field(get_plostype, False),
+          'dtd': Field(get_dtd, False),
+          'dates': Field(get_dates, False),
+          'pubdate': Field(get_pubdate, False),
+          'counts': Field(get_counts, False),
+          'word_count': Field(get_word_count, True),
+          'abstract': Field(get_abstract, False),
+          'related_doi': Field(get_related_doi, False),
+          'proof': Field(get_proof, False),
+          }
+
+
+def needs_body(fields):
+    """
+    :param fields: names of fields in FIELDS
+    :return: whether any of the fields need more of the article than <front>
+    """
+    return any(FIELDS[field].needs_body for field in fields)
+
+
+def extract_fields(article, fields=None, label=None):
+    """
+    Read several fields of an article, parsing and walking it only once
+    :param article: path to an article XML file (or its DOI), an article's lxml element tree or root element, or its ArticleParts
+    :param fields: names of fields in FIELDS to read, defaults to all of them
+    :param label: name of the article for error messages, defaults to the path
+    :return: dict of field names mapped to their values
+    """
+    if fields is None:
+        fields = list(FIELDS)
+    unknown_fields = [field for field in fields if field not in FIELDS]
+    if unknown_fields:
+        raise ValueError("Unknown article fields: {}".format(', '.join(unknown_fields)))
+    if isinstance(article, ArticleParts):
+        parts = article
+    else:
+        if isinstance(article, str):
+            label = label or article
+            article = parse_article_file(article, parse=cached_parse if needs_body(fields) else cached_parse_front)
+        if hasattr(article, 'getroot'):
+            article = article.getroot()
+        parts = ArticleParts(article, label=label or '')
+    return {field: FIELDS[field].extract(parts) for field in fields}
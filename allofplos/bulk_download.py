@@ -0,0 +1,596 @@
+"""Resumable downloading of large files, such as the zip file of the whole PLOS corpus.
+
+Files are downloaded with HTTP Range requests. The byte ranges already written are tracked in a
+small sidecar file next to the download (`<file>.ranges`), so an interrupted download picks up
+where it stopped instead of starting again from byte zero. Missing ranges can be fetched by
+several connections at once. Once every byte is in place, the file is checked against the
+expected size (and checksum, if one is known) and the sidecar is removed. A file that doesn't
+match is deleted with its sidecar, so that the next attempt starts over.
+
+A zip file can also be extracted while it downloads, with stream_unzip(). Zip members are read
+one by one from their local headers as the bytes arrive, so the zip file itself never has to
+be written to disk.
+
+A zip file that is already on disk can be extracted by several processes at once with
+extract_zip(), skipping files that were already extracted by an earlier run.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from allofplos import http_client
+from allofplos.corpus_layout import article_path
+from allofplos.plos_regex import validate_filename
+from allofplos.sync_state import invalidate_state
+
+CHUNK_SIZE = 1024 * 1024
+# Write the sidecar file after at least this many new bytes
+SAVE_EVERY = 16 * 1024 * 1024
+# Don't split the download into segments smaller than this
+MIN_SEGMENT_SIZE = 64 * 1024 * 1024
+ranges_suffix = '.ranges'
+
+
+def merge_ranges(ranges):
+    """
+    Combine overlapping and adjacent byte ranges
+    :param ranges: iterable of [start, end) pairs
+    :return: sorted list of non-overlapping [start, end) pairs
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(done_ranges, size):
+    """
+    Find the byte ranges of a file that haven't been downloaded yet
+    :param done_ranges: list of [start, end) pairs already downloaded
+    :param size: total size of the file in bytes
+    :return: list of [start, end) pairs still needed
+    """
+    missing = []
+    position = 0
+    for start, end in merge_ranges(done_ranges):
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+def split_ranges(ranges, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    """
+    Split byte ranges into pieces so they can be downloaded in parallel
+    :param ranges: list of [start, end) pairs
+    :param segments: how many pieces to aim for
+    :param min_segment_size: smallest piece size in bytes
+    :return: list of [start, end) pairs covering the same bytes
+    """
+    total = sum(end - start for start, end in ranges)
+    piece_size = max(min_segment_size, -(-total // max(segments, 1)))
+    pieces = []
+    for start, end in ranges:
+        while end - start > piece_size:
+            pieces.append([start, start + piece_size])
+            start += piece_size
+        pieces.append([start, end])
+    return pieces
+
+
+def read_ranges_file(ranges_path):
+    """
+    Load the download state saved by an earlier, interrupted download
+    :param ranges_path: path to the sidecar file
+    :return: tuple of total size (None if unknown), list of [start, end) pairs already downloaded
+    """
+    try:
+        with open(ranges_path) as f:
+            state = json.load(f)
+        return state['size'], state['done']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, []
+
+
+def get_remote_size(url, params=None):
+    """
+    Ask a server for the size of a file, and whether it accepts Range requests
+    :param url: URL of the file
+    :param params: query parameters for the request
+    :return: tuple of file size in bytes (None if unknown), boolean for Range support
+    """
+    response = http_client.get(url, params=params, headers={'Range': 'bytes=0-0'}, stream=True)
+    response.close()
+    response.raise_for_status()
+    if response.status_code == 206:
+        total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        if total.isdigit():
+            return int(total), True
+    length = response.headers.get('Content-Length')
+    return (int(length) if length else None), False
+
+
+def file_checksum(file_path, algorithm='md5'):
+    """
+    Calculate the checksum of a local file
+    :param file_path: path to the file
+    :param algorithm: any algorithm name understood by hashlib
+    :return: hex digest of the file contents
+    """
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_download(file_path, file_size=None, checksum=None):
+    """
+    Make sure a downloaded file is complete before it is used
+    :param file_path: path to the downloaded file
+    :param file_size: expected size in bytes, if known
+    :param checksum: expected checksum, as 'algorithm:hexdigest' (a bare hexdigest is taken as md5)
+    :return: None; raises OSError if the file doesn't match
+    """
+    actual_size = os.path.getsize(file_path)
+    if file_size is not None and actual_size != file_size:
+        raise OSError("{} is {} bytes, expected {}".format(file_path, actual_size, file_size))
+    if checksum:
+        algorithm, _, expected = checksum.rpartition(':')
+        actual = file_checksum(file_path, algorithm=algorithm or 'md5')
+        if actual.lower() != expected.lower():
+            raise OSError("{} has checksum {}, expected {}".format(file_path, actual, expected))
+
+
+class RangeDownload():
+    """The state of one resumable download: which bytes are on disk and which are still needed."""
+    def __init__(self, file_path, size):
+        self.file_path = file_path
+        self.ranges_path = file_path + ranges_suffix
+        self.size = size
+        saved_size, done = read_ranges_file(self.ranges_path)
+        if saved_size != size or not os.path.isfile(file_path):
+            done = []
+        self.done = merge_ranges(done)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    @property
+    def done_bytes(self):
+        return sum(end - start for start, end in self.done)
+
+    def prepare(self):
+        """Create the file at full size, so each segment can be written at its own offset."""
+        mode = 'r+b' if os.path.isfile(self.file_path) else 'wb'
+        with open(self.file_path, mode) as f:
+            f.truncate(self.size)
+        self.save()
+
+    def record(self, start, end):
+        """Mark a range of bytes as written to disk, saving the sidecar file now and then."""
+        with self._lock:
+            self.done = merge_ranges(self.done + [[start, end]])
+            self._unsaved += end - start
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        temp_path = self.ranges_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'size': self.size, 'done': self.done}, f)
+        os.replace(temp_path, self.ranges_path)
+        self._unsaved = 0
+
+    def fetch(self, url, start, end, params=None, pbar=None):
+        """
+        Download one byte range into place
+        :param url: URL of the file
+        :param start: first byte to download
+        :param end: byte after the last one to download
+        :param params: query parameters for the request
+        :param pbar: tqdm progress bar to update, optional
+        :return: None
+        """
+        headers = {'Range': 'bytes={}-{}'.format(start, end - 1)}
+        response = http_client.get(url, params=params, headers=headers, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            response.close()
+            raise OSError("Server ignored the Range request for {}".format(url))
+        with open(self.file_path, 'r+b') as f:
+            f.seek(start)
+            position = start
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if not chunk:
+                    continue
+                chunk = chunk[:end - position]
+                f.write(chunk)
+                self.record(position, position + len(chunk))
+                position += len(chunk)
+                if pbar is not None:
+                    pbar.update(len(chunk))
+                if position >= end:
+                    break
+        response.close()
+        if position < end:
+            raise OSError("Connection closed after {} of {} bytes".format(position - start, end - start))
+
+
+def remove_download(file_path):
+    """
+    Delete a downloaded file and its sidecar, so the next download starts again from byte zero
+    :param file_path: path to the downloaded file
+    :return: None
+    """
+    for path in (file_path, file_path + ranges_suffix):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def checked_download(file_path, file_size=None, checksum=None):
+    """
+    Verify a finished download, deleting it if it doesn't match, see verify_download()
+    A complete file with the wrong size or checksum can't be fixed by resuming it.
+    :return: None; raises OSError if the file doesn't match
+    """
+    try:
+        verify_download(file_path, file_size=file_size, checksum=checksum)
+    except OSError:
+        remove_download(file_path)
+        raise
+
+
+def resumable_download(url, file_path, params=None, file_size=None, checksum=None, segments=1):
+    """
+    Download a large file with Range requests, resuming any earlier partial download
+    Falls back to a plain download from the start if the server doesn't support Range requests
+    :param url: URL of the file
+    :param file_path: where to save the file
+    :param params: query parameters for the requests
+    :param file_size: expected size in bytes, used if the server doesn't report it and for verification
+    :param checksum: expected checksum, as 'algorithm:hexdigest', checked once the download is complete;
+    if the finished file doesn't match, it is deleted along with its sidecar and OSError is raised
+    :param segments: how many parts of the file to download at the same time
+    :return: file_path
+    """
+    remote_size, accepts_ranges = get_remote_size(url, params=params)
+    size = remote_size or file_size
+    if not accepts_ranges or size is None:
+        print("Server doesn't support resuming downloads; downloading from the start.")
+        response = http_client.get(url, params=params, stream=True)
+        response.raise_for_status()
+        with open(file_path, 'wb') as f, tqdm(total=size, unit='B', unit_scale=True) as pbar:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    pbar.update(len(chunk))
+        checked_download(file_path, file_size=file_size, checksum=checksum)
+        return file_path
+
+    download = RangeDownload(file_path, size)
+    if download.done:
+        print("Resuming download of {} at {} of {} bytes.".format(os.path.basename(file_path),
+                                                                 download.done_bytes,
+                                                                 size))
+    download.prepare()
+    pieces = split_ranges(missing_ranges(download.done, size), segments)
+    try:
+        with tqdm(total=size, initial=download.done_bytes, unit='B', unit_scale=True) as pbar:
+            if segments > 1:
+                with ThreadPoolExecutor(max_workers=segments) as executor:
+                    futures = [executor.submit(download.fetch, url, start, end, params=params, pbar=pbar)
+                               for start, end in pieces]
+                    for future in futures:
+                        future.result()
+            else:
+                for start, end in pieces:
+                    download.fetch(url, start, end, params=params, pbar=pbar)
+    finally:
+        download.save()
+    checked_download(file_path, file_size=file_size or size, checksum=checksum)
+    os.remove(download.ranges_path)
+    return file_path
+
+
+# Signatures of the records in a zip file, see https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP64_EXTRA_ID = 0x0001
+# Save the position of a streaming extraction after this many members
+SAVE_EVERY_MEMBERS = 500
+stream_state_file = '.allofplos_stream'
+
+
+class StreamReader():
+    """Reads exact numbers of bytes from an iterator of chunks, such as a streamed HTTP response."""
+    def __init__(self, chunks, position=0):
+        """
+        :param chunks: iterator of bytes objects
+        :param position: offset in the file of the first byte of the first chunk
+        """
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+        self.position = position
+
+    def read(self, size):
+        """Read up to size bytes; fewer are returned only at the end of the stream."""
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.position += len(data)
+        return data
+
+    def read_exactly(self, size):
+        data = self.read(size)
+        if len(data) < size:
+            raise EOFError("Stream ended {} bytes early".format(size - len(data)))
+        return data
+
+    def unread(self, data):
+        """Put back bytes that were read past the end of a zip member."""
+        self._buffer[:0] = data
+        self.position -= len(data)
+
+    def drain(self):
+        """Read to the end of the stream, keeping count of the bytes."""
+        while self.read(CHUNK_SIZE):
+            pass
+
+
+def read_zip_member(reader):
+    """
+    Read the next member of a zip file from a stream
+    :param reader: StreamReader positioned at the start of a local file header
+    :return: tuple of member name and its uncompressed bytes; None once the central directory is reached
+    """
+    if reader.read(4) != LOCAL_HEADER_SIGNATURE:
+        return None
+    (version, flags, method, mod_time, mod_date, crc, compressed_size, size,
+     name_length, extra_length) = struct.unpack('<HHHHHIIIHH', reader.read_exactly(26))
+    name = reader.read_exactly(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+    extra = reader.read_exactly(extra_length)
+    zip64 = False
+    while len(extra) >= 4:
+        extra_id, extra_size = struct.unpack('<HH', extra[:4])
+        if extra_id == ZIP64_EXTRA_ID:
+            zip64 = True
+            values = list(struct.unpack('<{}Q'.format(extra_size // 8), extra[4:4 + extra_size - extra_size % 8]))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+        extra = extra[4 + extra_size:]
+
+    has_descriptor = bool(flags & 0x08)
+    if method == 0 and not has_descriptor:
+        data = reader.read_exactly(compressed_size)
+    elif method == 8 and not has_descriptor:
+        data = zlib.decompress(reader.read_exactly(compressed_size), -15)
+    elif method == 8:
+        # sizes come after the data, so decompress until the deflate stream says it's done
+        decompressor = zlib.decompressobj(-15)
+        parts = []
+        while not decompressor.eof:
+            chunk = reader.read(64 * 1024)
+            if not chunk:
+                raise EOFError("Stream ended in the middle of {}".format(name))
+            parts.append(decompressor.decompress(chunk))
+        reader.unread(decompressor.unused_data)
+        data = b''.join(parts)
+    else:
+        raise OSError("Can't stream zip member {} (compression method {})".format(name, method))
+
+    if has_descriptor:
+        size_format = '<QQ' if zip64 else '<II'
+        first = reader.read_exactly(4)
+        if first == DATA_DESCRIPTOR_SIGNATURE:
+            first = reader.read_exactly(4)
+        crc = struct.unpack('<I', first)[0]
+        reader.read_exactly(struct.calcsize(size_format))
+    if zlib.crc32(data) & 0xFFFFFFFF != crc:
+        raise OSError("CRC check failed for zip member {}".format(name))
+    return name, data
+
+
+def member_path(name, extract_directory):
+    """
+    Where a zip member is extracted to, refusing names that point outside extract_directory
+    Article files at the top of the zip file go where the layout of extract_directory puts them
+    (see corpus_layout.article_path())
+    :param name: name of the zip member
+    :param extract_directory: directory the zip file is being extracted into
+    :return: path to extract the member to
+    """
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if '..' in parts:
+        raise OSError("Unsafe path in zip file: {}".format(name))
+    if len(parts) == 1 and validate_filename(parts[0]):
+        return article_path(extract_directory, parts[0])
+    return os.path.join(extract_directory, *parts)
+
+
+def write_member(path, data):
+    """Write an extracted file under a temporary name first, so readers never see half a file."""
+    temp_path = path + '.part'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def stream_unzip(url, extract_directory, params=None, file_size=None):
+    """
+    Extract a remote zip file while it downloads, without saving the zip file itself
+    Each file is usable as soon as it has been extracted. If the extraction is interrupted,
+    the next run continues from the last saved member, using a Range request.
+    :param url: URL of the zip file
+    :param extract_directory: directory to extract the files into
+    :param params: query parameters for the requests
+    :param file_size: size of the zip file in bytes, checked once the download is complete
+    :return: number of files extracted
+    """
+    os.makedirs(extract_directory, exist_ok=True)
+    # files added to existing shards don't change the directory, so the sync state has to list it again
+    invalidate_state(extract_directory)
+    state_path = os.path.join(extract_directory, stream_state_file)
+    try:
+        with open(state_path) as f:
+            offset = json.load(f)['offset']
+    except (FileNotFoundError, ValueError, KeyError):
+        offset = 0
+
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+    response = http_client.get(url, params=params, headers=headers, stream=True)
+    response.raise_for_status()
+    if offset and response.status_code != 206:
+        offset = 0
+    if offset:
+        print("Resuming extraction at byte {}.".format(offset))
+    reader = StreamReader(response.iter_content(CHUNK_SIZE), position=offset)
+
+    def save_offset(position):
+        with open(state_path, 'w') as f:
+            json.dump({'offset': position}, f)
+
+    extracted = 0
+    # where the member after the last one written starts; an interrupted extraction resumes there
+    next_member = offset
+    with tqdm(total=file_size, initial=offset, unit='B', unit_scale=True) as pbar:
+        try:
+            while True:
+                member = read_zip_member(reader)
+                if member is None:
+                    break
+                name, data = member
+                path = member_path(name, extract_directory)
+                if name.endswith('/'):
+                    os.makedirs(path, exist_ok=True)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    write_member(path, data)
+                    extracted += 1
+                    if extracted % SAVE_EVERY_MEMBERS == 0:
+                        save_offset(reader.position)
+                next_member = reader.position
+                pbar.update(reader.position - pbar.n)
+        except BaseException:
+            save_offset(next_member)
+            raise
+        # the rest of the file is the central directory, which isn't needed
+        reader.drain()
+        pbar.update(reader.position - pbar.n)
+    response.close()
+    if file_size is not None and reader.position != file_size:
+        save_offset(0)
+        raise OSError("Downloaded {} bytes of zip file, expected {}".format(reader.position, file_size))
+    os.remove(state_path)
+    invalidate_state(extract_directory)
+    print("Extraction complete.")
+    return extracted
+
+
+# Zip members handed to an extraction worker at a time
+EXTRACT_BATCH_SIZE = 2000
+
+
+def member_matches(info, path):
+    """
+    Whether a zip member has already been extracted, i.e. a file with the same size and CRC exists
+    :param info: zipfile.ZipInfo of the member
+    :param path: where the member would be extracted to
+    :return: bool
+    """
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+        crc = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+    except OSError:
+        return False
+    return crc & 0xFFFFFFFF == info.CRC
+
+
+def extract_members(file_path, names, extract_directory, skip_existing=False):
+    """
+    Extract some of the members of a zip file; run by each worker process of extract_zip()
+    :param file_path: path to the zip file
+    :param names: names of the members to extract
+    :param extract_directory: directory to extract the files into
+    :param skip_existing: don't rewrite files that already match the member's size and CRC
+    :return: tuple of number of files extracted, number of files skipped
+    """
+    extracted = skipped = 0
+    with zipfile.ZipFile(file_path) as zip_ref:
+        for name in names:
+            info = zip_ref.getinfo(name)
+            path = member_path(name, extract_directory)
+            if skip_existing and member_matches(info, path):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_member(path, zip_ref.read(info))
+            extracted += 1
+    return extracted, skipped
+
+
+def extract_zip(file_path, extract_directory, processes=None, skip_existing=False):
+    """
+    Extract a zip file with several processes at once, each reading its own share of the members
+    :param file_path: path to the zip file
+    :param extract_directory: directory to extract the files into
+    :param processes: number of worker processes, defaults to the number of CPUs;
+    1 extracts in the current process
+    :param skip_existing: don't rewrite files that already match the member's size and CRC,
+    so extracting over a partly extracted directory only writes what is missing or different
+    :return: tuple of number of files extracted, number of files skipped
+    """
+    with zipfile.ZipFile(file_path) as zip_ref:
+        infos = zip_ref.infolist()
+    for info in infos:
+        if info.filename.endswith('/'):
+            os.makedirs(member_path(info.filename, extract_directory), exist_ok=True)
+    names = [info.filename for info in infos if not info.filename.endswith('/')]
+    batches = [names[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(names), EXTRACT_BATCH_SIZE)]
+
+    extracted = skipped = 0
+    with tqdm(total=len(names), unit='files') as pbar:
+        if processes == 1:
+            results = (extract_members(file_path, batch, extract_directory, skip_existing) for batch in batches)
+            for batch_extracted, batch_skipped in results:
+                extracted += batch_extracted
+                skipped += batch_skipped
+                pbar.update(batch_extracted + batch_skipped)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(extract_members, file_path, batch, extract_directory, skip_existing)
+                           for batch in batches]
+                for future in as_completed(futures):
+                    batch_extracted, batch_skipped = future.result()
+                    extracted += batch_extracted
+                    skipped += batch_skipped
+                    pbar.update(batch_extracted + batch_skipped)
+    return extracted, skipped
@@ -33,12 +33,13 @@ Version 0.10, 2014-01-24
 from numpy import median
 from bs4 import BeautifulSoup
 from itertools import chain, compress
-import requests
 from urllib.parse import quote
 import json
 import re
 from multiprocessing import Pool
 
+from allofplos import http_client
+
 
 def soupify(filename):
     '''Opens the given XML file, parses it using Beautiful Soup, and returns the output.'''
@@ -58,7 +59,7 @@ def remote_retrieve(doi, filename=''):
         except IOError:
             pass
     headers = {"Content-Type": "application/xml"}
-    r = requests.get("http://www.plosone.org/article/fetchObjectAttachment.action?uri=info:doi/" + doi + "&representation=XML", headers=headers)
+    r = http_client.get("http://www.plosone.org/article/fetchObjectAttachment.action?uri=info:doi/" + doi + "&representation=XML", headers=headers)
     # Doesn't matter whether it's a PLOS ONE article or not -- this will work for any article in any PLOS journal.
     r.encoding = "UTF-8"  # This is needed to keep the encoding on the papers correct.
     if filename:
@@ -73,7 +74,7 @@ def remote_retrieve(doi, filename=''):
 def remote_soupify(doi):
     '''Given the DOI of a PLOS paper, downloads the XML and parses it using Beautiful Soup.'''
     headers = {"Content-Type": "application/xml"}
-    r = requests.get("http://www.plosone.org/article/fetchObjectAttachment.action?uri=info:doi/" + doi + "&representation=XML", headers=headers)
+    r = http_client.get("http://www.plosone.org/article/fetchObjectAttachment.action?uri=info:doi/" + doi + "&representation=XML", headers=headers)
     # Doesn't matter whether it's a PLOS ONE article or not -- this will work for any article in any PLOS journal.
     r.encoding = "UTF-8"  # This is needed to keep the encoding on the papers correct.
     soup = BeautifulSoup(r.text, features="xml")
@@ -234,7 +235,7 @@ def doi(number, paper, verbose=True):
         url = "http://search.crossref.org/links"
         data = json.dumps([ref])
         headers = {"Content-Type": "application/json"}
-        r = requests.post(url, data=data, headers=headers)
+        r = http_client.post(url, data=data, headers=headers)
         if r.json()["query_ok"]:
             results = r.json()["results"][0]
             if results["match"]:
@@ -299,7 +300,7 @@ def doi_batch(paper, crossref=False):
         url = "http://search.crossref.org/links"
         data = json.dumps(list(cr_queries.values()))
         headers = {"Content-Type": "application/json"}
-        r = requests.post(url, data=data, headers=headers)
+        r = http_client.post(url, data=data, headers=headers)
         if r.json()["query_ok"]:
             results = r.json()["results"]
         else:
@@ -315,7 +316,7 @@ def doi_batch(paper, crossref=False):
                 dois[i] = None
     else:
         paper_url = "http://www.plosone.org/article/info:doi/" + paper_doi
-        paper_request = requests.get(paper_url)
+        paper_request = http_client.get(paper_url)
         paper_html = BeautifulSoup(paper_request.content, "lxml")
         html_references = paper_html.select('.references > li')
 
@@ -625,7 +626,7 @@ def plos_search(query, query_type=None, rows=20, more_parameters=None,
     headers = {'Content-Type': 'application/' + output}
     if verbose:
         print(url)
-    r = requests.get(url, headers=headers)
+    r = http_client.get(url, headers=headers)
     r.encoding = "UTF-8"  # just to be sure
     return r.json()["response"]["docs"]
 
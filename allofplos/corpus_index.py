@@ -0,0 +1,353 @@
+"""Persistent index of the metadata of every article in a local corpus directory.
+
+Questions like "all PLOS Genetics research articles from 2016" or "all corrections" used to
+mean parsing every article file. The corpus index is a SQLite database next to the corpus
+directory (`allofplos_xml_index.db` for `allofplos_xml`) with one row per article: its journal,
+JATS and PLOS article types, DTD, publication and history dates, counts, word count, related
+DOI, uncorrected proof status and the SHA-1 of its file. Queries on it take milliseconds.
+
+build() scans the corpus on all cores (see corpus_scan) the first time, and afterwards only
+the articles that were added, changed or removed since. Rows are saved as the scan goes, so an
+interrupted build continues where it stopped. The sync (plos_corpus.download_check_and_move())
+updates the rows of the articles it moves into the corpus.
+
+Usage:
+```
+with CorpusIndex(corpusdir) as index:
+    index.build()
+    dois = index.query(journal='PLOS Genetics', type_='research-article',
+                       start_date='2016-01-01', end_date='2016-12-31')
+    corrections = index.articles(type_='correction')
+```
+"""
+
+import collections
+import datetime
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from allofplos.article_class import Article, ArticleRecord
+from allofplos.article_fields import extract_fields
+from allofplos.corpus_layout import article_path
+from allofplos.corpus_scan import map_corpus
+from allofplos.corpus_store import article_version
+from allofplos.parsers import parse
+from allofplos.plos_regex import corpusdir
+from allofplos.sync_state import content_sha1, list_article_filenames
+from allofplos.transformations import filename_to_doi
+
+index_suffix = '_index.db'
+# Number of indexed articles saved at a time during a build
+index_batch_size = 1000
+date_format = '%Y-%m-%d'
+
+schema = """
+CREATE TABLE IF NOT EXISTS articles (
+    doi TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    version TEXT,
+    sha1 TEXT,
+    title TEXT,
+    journal TEXT,
+    type TEXT,
+    plostype TEXT,
+    dtd TEXT,
+    pubdate TEXT,
+    word_count INTEGER,
+    related_doi TEXT,
+    proof TEXT,
+    indexed REAL
+);
+CREATE TABLE IF NOT EXISTS dates (
+    doi TEXT,
+    date_type TEXT,
+    date TEXT,
+    PRIMARY KEY (doi, date_type)
+);
+CREATE TABLE IF NOT EXISTS counts (
+    doi TEXT,
+    name TEXT,
+    count INTEGER,
+    PRIMARY KEY (doi, name)
+);
+CREATE INDEX IF NOT EXISTS articles_journal ON articles (journal, pubdate);
+CREATE INDEX IF NOT EXISTS articles_type ON articles (type, pubdate);
+CREATE INDEX IF NOT EXISTS articles_plostype ON articles (plostype, pubdate);
+CREATE INDEX IF NOT EXISTS articles_pubdate ON articles (pubdate);
+CREATE INDEX IF NOT EXISTS articles_related_doi ON articles (related_doi);
+"""
+
+# Fields that query() and count_by() accept, mapped to their columns
+columns = {'journal': 'journal',
+           'type_': 'type',
+           'plostype': 'plostype',
+           'dtd': 'dtd',
+           'related_doi': 'related_doi',
+           'proof': 'proof',
+           }
+
+IndexedArticle = collections.namedtuple('IndexedArticle', ['row', 'dates', 'counts'])
+
+
+def get_index_path(directory=corpusdir):
+    """
+    Where the metadata index of a corpus directory is kept
+    :param directory: corpus directory
+    :return: path to the SQLite database next to the directory
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + index_suffix
+
+
+def format_date(date):
+    """
+    :param date: datetime, 'YYYY-MM-DD' string, or '' for dates that couldn't be parsed
+    :return: date as a 'YYYY-MM-DD' string, or None
+    """
+    if not date:
+        return None
+    if isinstance(date, str):
+        return date
+    return date.strftime(date_format)
+
+
+def parse_with_sha1(source):
+    """
+    For scanning the corpus with corpus_scan: parse a whole article and hash its contents
+    :param source: file-like object with the article XML
+    :return: tuple of hex SHA-1 digest of the contents, lxml element tree
+    """
+    content = source.read()
+    return content_sha1(content), parse(io.BytesIO(content))
+
+
+def index_article(article_file, parsed):
+    """
+    For scanning the corpus with corpus_scan: read everything the index keeps about an article
+    :param article_file: path to the article file
+    :param parsed: tuple of SHA-1 digest, tree from parse_with_sha1()
+    :return: IndexedArticle of the row of the articles table, dict of dates, dict of counts
+    """
+    if isinstance(parsed, str):
+        raise FileNotFoundError("Article file not found: {}".format(article_file))
+    sha1, article_tree = parsed
+    version, _ = article_version(article_file)
+    fields = extract_fields(article_tree, ['title', 'journal', 'type_', 'plostype', 'dtd', 'dates', 'counts',
+                                           'word_count', 'related_doi', 'proof'], label=article_file)
+    dates = {date_type: format_date(date) for date_type, date in fields['dates'].items()}
+    row = (filename_to_doi(article_file), os.path.basename(article_file), repr(version), sha1,
+           fields['title'], fields['journal'], fields['type_'], fields['plostype'], fields['dtd'],
+           dates.get('epub'), fields['word_count'], fields['related_doi'], fields['proof'], time.time())
+    return IndexedArticle(row, dates, fields['counts'])
+
+
+class CorpusIndex():
+    """The metadata of the articles in a corpus directory, as of the last build or sync.
+
+    Usage:
+    ```
+    index = CorpusIndex(corpusdir)
+    index.build()
+    retractions = index.query(type_='retraction')
+    ```
+    A CorpusIndex can be shared between threads.
+    """
+    def __init__(self, directory=corpusdir, index_path=None):
+        """
+        :param directory: corpus directory the index describes
+        :param index_path: path to the database, defaults to get_index_path(directory)
+        """
+        self.directory = directory
+        self.index_path = index_path or get_index_path(directory)
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.connection.executescript(schema)
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _save(self, indexed_articles):
+        with self._lock, self.connection:
+            for row, dates, counts in indexed_articles:
+                doi = row[0]
+                self.connection.execute("INSERT OR REPLACE INTO articles VALUES ({})".format(', '.join('?' * len(row))),
+                                        row)
+                self.connection.execute("DELETE FROM dates WHERE doi = ?", (doi,))
+                self.connection.executemany("INSERT INTO dates (doi, date_type, date) VALUES (?, ?, ?)",
+                                            ((doi, date_type, date) for date_type, date in dates.items()))
+                self.connection.execute("DELETE FROM counts WHERE doi = ?", (doi,))
+                self.connection.executemany("INSERT INTO counts (doi, name, count) VALUES (?, ?, ?)",
+                                            ((doi, name, int(count) if count and count.isdigit() else count)
+                                             for name, count in counts.items()))
+
+    def _index(self, article_files, **kwargs):
+        """
+        Index article files, saving the rows a batch at a time
+        :param article_files: paths to the article files
+        :param kwargs: passed to corpus_scan.map_corpus()
+        :return: number of articles indexed
+        """
+        batch = []
+        indexed = 0
+        for _, indexed_article in map_corpus(index_article, article_files, parse=parse_with_sha1, **kwargs):
+            batch.append(indexed_article)
+            if len(batch) >= index_batch_size:
+                self._save(batch)
+                indexed += len(batch)
+                batch = []
+        self._save(batch)
+        return indexed + len(batch)
+
+    def remove(self, dois):
+        """
+        Remove articles from the index
+        :param dois: DOIs of the articles
+        :return: None
+        """
+        dois = [(doi,) for doi in dois]
+        with self._lock, self.connection:
+            for table in ('articles', 'dates', 'counts'):
+                self.connection.executemany("DELETE FROM {} WHERE doi = ?".format(table), dois)
+
+    def build(self, rebuild=False, processes=None):
+        """
+        Bring the index up to date with the directory
+        Articles whose files were added or changed (see corpus_store.article_version()) since they
+        were indexed are scanned on a pool of processes; articles no longer in the directory are removed.
+        Includes a progress bar
+        :param rebuild: scan every article again, even if it looks unchanged
+        :param processes: number of processes to scan with, defaults to the number of CPUs
+        :return: tuple of number of articles indexed, number of articles removed
+        """
+        filenames = list_article_filenames(self.directory)
+        known = {filename: (doi, version) for doi, filename, version in
+                 self._query("SELECT doi, filename, version FROM articles")}
+        removed = [doi for filename, (doi, _) in known.items() if filename not in filenames]
+        self.remove(removed)
+        to_index = []
+        for filename in filenames:
+            path = article_path(self.directory, filename)
+            if rebuild or filename not in known:
+                to_index.append(path)
+                continue
+            try:
+                version, _ = article_version(path)
+            except FileNotFoundError:
+                continue
+            if repr(version) != known[filename][1]:
+                to_index.append(path)
+        if not to_index:
+            return 0, len(removed)
+        print('Indexing {} articles...'.format(len(to_index)))
+        return self._index(to_index, processes=processes), len(removed)
+
+    def update(self, paths):
+        """
+        Index articles again after their files were written to the corpus directory
+        :param paths: paths to the article files in the corpus directory
+        :return: number of articles indexed
+        """
+        return self._index(list(paths), processes=1, progress=False)
+
+    def _where(self, start_date=None, end_date=None, **filters):
+        unknown_fields = [field for field in filters if field not in columns]
+        if unknown_fields:
+            raise ValueError("Unknown index fields: {}".format(', '.join(unknown_fields)))
+        conditions = []
+        parameters = []
+        for field, value in filters.items():
+            if value is not None:
+                conditions.append('{} = ?'.format(columns[field]))
+                parameters.append(value)
+        if start_date is not None:
+            conditions.append('pubdate >= ?')
+            parameters.append(format_date(start_date))
+        if end_date is not None:
+            conditions.append('pubdate <= ?')
+            parameters.append(format_date(end_date))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return where, parameters
+
+    def query(self, start_date=None, end_date=None, **filters):
+        """
+        DOIs of the articles that match every filter given
+        Example:
+        `index.query(journal='PLOS Genetics', type_='research-article', start_date='2016-01-01', end_date='2016-12-31')`
+        :param start_date: earliest publication date, as a datetime or 'YYYY-MM-DD' string
+        :param end_date: latest publication date, as a datetime or 'YYYY-MM-DD' string
+        :param filters: values of journal, type_, plostype, dtd, related_doi and proof to match,
+        like the Article properties of the same names
+        :return: sorted list of DOIs
+        """
+        where, parameters = self._where(start_date=start_date, end_date=end_date, **filters)
+        return [doi for doi, in self._query("SELECT doi FROM articles{} ORDER BY doi".format(where), parameters)]
+
+    def articles(self, lazy=False, start_date=None, end_date=None, **filters):
+        """
+        Articles that match every filter given, see query()
+        :param lazy: only parse each article up to the end of <front>, see Article()
+        :return: list of Article objects, sorted by DOI; their files aren't read until they're used
+        """
+        return [Article(doi, directory=self.directory, lazy=lazy)
+                for doi in self.query(start_date=start_date, end_date=end_date, **filters)]
+
+    def count_by(self, field, start_date=None, end_date=None, **filters):
+        """
+        Number of articles for each value of a field, like the article type lists in samples/corpus_analysis.py
+        Example:
+        `index.count_by('type_', journal='PLOS ONE')`
+        :param field: journal, type_, plostype, dtd, related_doi or proof
+        :param start_date: earliest publication date
+        :param end_date: latest publication date
+        :param filters: values of other fields to match, see query()
+        :return: list of tuples of value, number of articles, most common first
+        """
+        if field not in columns:
+            raise ValueError("Unknown index field: {}".format(field))
+        where, parameters = self._where(start_date=start_date, end_date=end_date, **filters)
+        return self._query("SELECT {0}, COUNT(*) FROM articles{1} GROUP BY {0} ORDER BY COUNT(*) DESC, {0}"
+                           .format(columns[field], where), parameters)
+
+    def count(self):
+        """:return: number of articles in the index"""
+        return self._query("SELECT COUNT(*) FROM articles")[0][0]
+
+    def get(self, doi):
+        """
+        :param doi: DOI of an article
+        :return: ArticleRecord of the article's indexed metadata; None if it isn't in the index
+        """
+        rows = self._query("SELECT title, journal, type, plostype, dtd, pubdate, word_count, related_doi, proof "
+                           "FROM articles WHERE doi = ?", (doi,))
+        if not rows:
+            return None
+        title, journal, type_, plostype, dtd, pubdate, word_count, related_doi, proof = rows[0]
+        dates = {date_type: datetime.datetime.strptime(date, date_format) if date else ''
+                 for date_type, date in self._query("SELECT date_type, date FROM dates WHERE doi = ?", (doi,))}
+        counts = {name: str(count) for name, count in self._query("SELECT name, count FROM counts WHERE doi = ?",
+                                                                   (doi,))}
+        return ArticleRecord(doi=doi, title=title, journal=journal, type_=type_, plostype=plostype, dtd=dtd,
+                             pubdate=dates.get('epub'), dates=dates, counts=counts, word_count=word_count,
+                             related_doi=related_doi, proof=proof)
+
+    def get_sha1(self, doi):
+        """
+        :param doi: DOI of an article
+        :return: hex SHA-1 digest of the article file when it was indexed; None if it isn't in the index
+        """
+        rows = self._query("SELECT sha1 FROM articles WHERE doi = ?", (doi,))
+        return rows[0][0] if rows else None
@@ -0,0 +1,188 @@
+"""Where article files go in a corpus directory: all in the directory, or sharded into subdirectories.
+
+By default every article file is directly in corpusdir, like `allofplos_xml/journal.pone.0185809.xml`.
+With 230k+ entries, listing the directory, looking files up in it and backing it up get slow
+on most filesystems. In the sharded layout, each file is in a subdirectory for its journal and
+the first four digits of its number, like `allofplos_xml/pone/0185/journal.pone.0185809.xml`,
+so no directory has more than a thousand or so articles. Correction notices
+(`plos.correction.<uuid>.xml`) go in `correction/` and the first two characters of their uuid.
+
+The layout of a directory is recorded in a file next to it (`allofplos_xml.layout`), and
+migrate_layout() moves the files of a directory from one layout to the other in place.
+Subdirectories of a flat corpus directory aren't shards, so their files aren't listed as articles.
+doi_to_path(), url_to_path(), Article.filename and plos_corpus.listdir_nohidden() follow the
+layout; filename_to_doi() works on paths in either layout.
+
+Usage:
+`migrate_layout(corpusdir, 'sharded')`, or `plos_corpus --layout sharded` from the command line
+"""
+
+import os
+
+from tqdm import tqdm
+
+from allofplos.plos_regex import validate_filename
+
+FLAT = 'flat'
+SHARDED = 'sharded'
+layouts = (FLAT, SHARDED)
+layout_suffix = '.layout'
+# digits of an article number, and characters of a correction uuid, in the name of its shard
+number_shard_length = 4
+uuid_shard_length = 2
+
+# layout file path mapped to its modification time and the layout it records
+_layouts = {}
+
+
+def get_layout_path(directory):
+    """
+    :param directory: corpus directory
+    :return: path to the file next to the directory that records its layout
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + layout_suffix
+
+
+def get_layout(directory):
+    """
+    The layout of a corpus directory, read from its layout file again whenever the file changes
+    :param directory: corpus directory
+    :return: FLAT or SHARDED
+    """
+    layout_path = get_layout_path(directory)
+    try:
+        mtime = os.stat(layout_path).st_mtime_ns
+    except FileNotFoundError:
+        return FLAT
+    cached = _layouts.get(layout_path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(layout_path) as f:
+                layout = f.read().strip() or FLAT
+        except FileNotFoundError:
+            return FLAT
+        cached = _layouts[layout_path] = (mtime, layout)
+    return cached[1]
+
+
+def set_layout(directory, layout):
+    """
+    Record the layout of a corpus directory, without moving any files (see migrate_layout())
+    :param directory: corpus directory
+    :param layout: FLAT or SHARDED
+    :return: None
+    """
+    if layout not in layouts:
+        raise ValueError("Unknown corpus layout {}, expected one of {}".format(layout, layouts))
+    layout_path = get_layout_path(directory)
+    _layouts.pop(layout_path, None)
+    if layout == FLAT:
+        try:
+            os.remove(layout_path)
+        except FileNotFoundError:
+            pass
+    else:
+        with open(layout_path, 'w') as f:
+            f.write(layout)
+
+
+def get_shard(filename):
+    """
+    The subdirectory an article file goes in, in the sharded layout
+    Example:
+    get_shard('journal.pone.0185809.xml') = 'pone/0185'
+    :param filename: name of an article file
+    :return: relative path of the shard, or '' for files that aren't named like an article
+    """
+    parts = filename.split('.')
+    if len(parts) >= 3 and parts[0] == 'journal':
+        return os.path.join(parts[1], parts[2][:number_shard_length])
+    if len(parts) >= 3 and parts[0] == 'plos' and parts[1] == 'correction':
+        return os.path.join('correction', parts[2][:uuid_shard_length])
+    return ''
+
+
+def article_path(directory, filename, layout=None):
+    """
+    Where an article file goes in a corpus directory
+    :param directory: corpus directory
+    :param filename: name of the article file, like 'journal.pone.0185809.xml'
+    :param layout: FLAT or SHARDED, defaults to the layout of the directory
+    :return: path to the article file
+    """
+    if (layout or get_layout(directory)) == SHARDED:
+        return os.path.join(directory, get_shard(filename), filename)
+    return os.path.join(directory, filename)
+
+
+def corpus_directory(path):
+    """
+    The corpus directory an article file is in, in either layout
+    :param path: path to an article file
+    :return: path to the corpus directory
+    """
+    directory = os.path.dirname(path)
+    shard = get_shard(os.path.basename(path))
+    if shard and directory.endswith(os.sep + shard):
+        return directory[:-len(shard) - 1]
+    return directory
+
+
+def list_files(directory):
+    """
+    List the files of a corpus directory, and in the sharded layout the files in its shards
+    :param directory: corpus directory
+    :return: list of paths to the files, relative to directory
+    """
+    if get_layout(directory) != SHARDED:
+        return os.listdir(directory)
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_dir() and not entry.name.startswith('.'):
+            for shard_entry in os.scandir(entry.path):
+                if shard_entry.is_dir():
+                    files.extend(os.path.join(entry.name, shard_entry.name, shard_file.name)
+                                 for shard_file in os.scandir(shard_entry.path) if shard_file.is_file())
+        else:
+            files.append(entry.name)
+    return files
+
+
+def migrate_layout(directory, layout):
+    """
+    Move the article files of a corpus directory to another layout, in place
+    Compressed article files are moved with the article they hold. If the migration is interrupted,
+    running it again moves the rest. Articles in the directory shouldn't be read or written meanwhile.
+    :param directory: corpus directory
+    :param layout: FLAT or SHARDED
+    :return: number of files moved
+    """
+    if layout not in layouts:
+        raise ValueError("Unknown corpus layout {}, expected one of {}".format(layout, layouts))
+    if layout == SHARDED:
+        # a sharded directory is listed with the files still at its top, so while the migration
+        # runs (or if it's interrupted) every article is still listed
+        set_layout(directory, SHARDED)
+    moved = 0
+    for file in tqdm(list_files(directory), unit='files'):
+        filename = os.path.basename(file)
+        if not validate_filename(filename):
+            continue
+        destination = article_path(directory, filename, layout=layout)
+        source = os.path.join(directory, file)
+        if source == destination:
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+        moved += 1
+    if layout == FLAT:
+        # remove the emptied shards
+        for entry in os.scandir(directory):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                for shard_entry in os.scandir(entry.path):
+                    if shard_entry.is_dir() and not os.listdir(shard_entry.path):
+                        os.rmdir(shard_entry.path)
+                if not os.listdir(entry.path):
+                    os.rmdir(entry.path)
+    set_layout(directory, layout)
+    return moved
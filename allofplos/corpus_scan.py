@@ -0,0 +1,319 @@
+"""Running a function over every article in the corpus, on all cores.
+
+A corpus scan calls a function on each article file and combines the results, like counting
+article types or collecting metadata. Parsing is CPU-bound, so one process uses one core.
+map_corpus() splits the list of article files into chunks and hands them out to a pool of
+processes as they finish their previous chunk (Pool.imap_unordered), with one progress bar
+for the whole scan. Within each process, files are read ahead of parsing (see
+prefetch.prefetch_trees()), and the function is called with the article file and its tree.
+
+Usage:
+```
+def get_type(article_file, article_tree):
+    return check_article_type(article_tree)
+
+types = scan_corpus(get_type, listdir_nohidden(corpusdir))
+```
+The function is sent to the worker processes, so it needs to be defined at the top level
+of a module, not as a lambda or inside another function.
+
+An article that can't be parsed, or that makes the function raise an exception, doesn't stop
+the scan: the error is collected as a ScanError and the scan goes on with the next article.
+With a checkpoint file, the results of each chunk are saved as it finishes (see ScanCheckpoint),
+so a scan that was interrupted starts again where it stopped. Articles that failed, and articles
+whose file changed since their result was saved, are scanned again when the scan is resumed.
+"""
+
+import collections
+import functools
+import io
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import traceback
+
+import progressbar
+
+from allofplos.corpus_store import article_version
+from allofplos.plos_regex import corpusdir, validate_doi
+from allofplos.prefetch import prefetch_files
+from allofplos.transformations import doi_to_path
+from allofplos.tree_cache import parse_front
+
+# Number of articles handed to a worker process at a time
+default_chunk_size = 500
+# Number of files each worker process reads ahead, and threads reading them
+worker_prefetch_depth = 16
+worker_prefetch_threads = 2
+# Number of errors printed at the end of a scan, if the caller doesn't collect them
+max_errors_to_print = 5
+
+ScanError = collections.namedtuple('ScanError', ['article_file', 'error'])
+
+checkpoint_schema = """
+CREATE TABLE IF NOT EXISTS results (
+    article_file TEXT PRIMARY KEY,
+    version TEXT,
+    result BLOB
+);
+CREATE TABLE IF NOT EXISTS errors (
+    article_file TEXT PRIMARY KEY,
+    error TEXT
+);
+"""
+
+
+def file_version(article_file):
+    """
+    :param article_file: path to an article file, or a DOI, for the article file in corpusdir
+    :return: version of the file as a string (see corpus_store.article_version()), or None if there's no such file
+    """
+    if validate_doi(article_file):
+        article_file = doi_to_path(article_file)
+    try:
+        version, _ = article_version(article_file)
+    except OSError:
+        return None
+    return repr(version)
+
+
+class ScanCheckpoint():
+    """The finished part of a corpus scan, saved to a SQLite file so that the scan can be resumed.
+
+    Results are pickled, so they should be plain values like strings, tuples and datetimes.
+    Each result is saved with the version of its article file (see corpus_store.article_version()),
+    and is only used while the file is unchanged. Results for articles without a file aren't saved. The checkpoint doesn't know which function made
+    the results, or what else they depend on: use a separate file for each scan, and don't
+    checkpoint scans whose results depend on more than the article file, like checks against PLOS.
+
+    Usage:
+    ```
+    with ScanCheckpoint('metadata_scan.db') as checkpoint:
+        errors = checkpoint.errors()
+    ```
+    """
+    def __init__(self, path):
+        """
+        :param path: path to the checkpoint file, which is created if it doesn't exist
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(results)")]
+        if columns and 'version' not in columns:
+            # saved by an older version without file versions, so the results can't be checked
+            self.connection.execute("DROP TABLE results")
+        self.connection.executescript(checkpoint_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def remove(self):
+        """Close the checkpoint and delete its file."""
+        self.close()
+        os.remove(self.path)
+
+    def results(self):
+        """
+        :return: dict of article files that were scanned, and haven't changed since, mapped to the
+        results of the function
+        """
+        return {article_file: pickle.loads(result) for article_file, version, result
+                in self.connection.execute("SELECT article_file, version, result FROM results")
+                if version is not None and version == file_version(article_file)}
+
+    def errors(self):
+        """
+        :return: list of ScanErrors for articles that failed the last time they were scanned
+        """
+        return [ScanError(*row) for row in self.connection.execute("SELECT article_file, error FROM errors")]
+
+    def save(self, results, errors=()):
+        """
+        Record a finished chunk of the scan
+        :param results: tuples of article file, result of the function
+        :param errors: ScanErrors for the articles of the chunk that failed
+        :return: None
+        """
+        results = [(article_file, file_version(article_file), pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+                   for article_file, result in results]
+        with self.connection:
+            # without a version, a result couldn't be told apart from one for a changed file
+            self.connection.executemany("INSERT OR REPLACE INTO results (article_file, version, result) "
+                                        "VALUES (?, ?, ?)", (row for row in results if row[1] is not None))
+            self.connection.executemany("DELETE FROM errors WHERE article_file = ?",
+                                        ((article_file,) for article_file, _, _ in results))
+            self.connection.executemany("INSERT OR REPLACE INTO errors (article_file, error) VALUES (?, ?)",
+                                        errors)
+
+
+def get_checkpoint_path(name, directory=corpusdir):
+    """
+    Where the checkpoint of a scan of a corpus directory is kept by default
+    :param name: name of the scan, like 'metadata'
+    :param directory: corpus directory
+    :return: path to the checkpoint file next to the directory
+    """
+    return '{}_{}_checkpoint.db'.format(os.path.abspath(directory).rstrip(os.sep), name)
+
+
+def scan_article(func, article_file, content, parse=parse_front):
+    """
+    Call a function on one article, catching any error
+    :param func: function called as func(article_file, article_tree)
+    :param article_file: the article file
+    :param content: contents of the file as bytes, or None if it couldn't be read
+    :param parse: function that parses the contents, or None to call func with article_tree=None
+    :return: tuple of article file, result of func (None if it failed), ScanError (None if it didn't fail)
+    """
+    try:
+        if parse is None:
+            article_tree = None
+        elif content is None:
+            article_tree = article_file
+        else:
+            article_tree = parse(io.BytesIO(content))
+        return article_file, func(article_file, article_tree), None
+    except Exception:
+        return article_file, None, ScanError(article_file, traceback.format_exc())
+
+
+def scan_chunk(func, article_files, parse=parse_front):
+    """
+    Call a function on a chunk of articles, reading their files ahead
+    :param func: function called as func(article_file, article_tree)
+    :param article_files: article files in the chunk
+    :param parse: function that parses the prefetched files, or None to call func with article_tree=None
+    :return: tuple of list of tuples of article file, result of func; list of ScanErrors
+    """
+    if parse is None:
+        contents = ((article_file, None) for article_file in article_files)
+    else:
+        contents = prefetch_files(article_files, depth=worker_prefetch_depth, workers=worker_prefetch_threads,
+                                  advise=True)
+    results = []
+    errors = []
+    for article_file, content in contents:
+        article_file, result, error = scan_article(func, article_file, content, parse=parse)
+        if error is None:
+            results.append((article_file, result))
+        else:
+            errors.append(error)
+    return results, errors
+
+
+def print_errors(errors):
+    """Print how many articles failed in a scan, and the first few errors."""
+    print(len(errors), "articles couldn't be scanned.")
+    for error in errors[:max_errors_to_print]:
+        print(error.article_file)
+        print(error.error)
+
+
+def map_corpus(func, article_list, parse=parse_front, processes=None, chunk_size=default_chunk_size,
+               progress=True, checkpoint=None, errors=None):
+    """
+    Call a function on every article on a pool of processes, yielding results as chunks finish
+    :param func: function called as func(article_file, article_tree) for each article; see the module docstring
+    :param article_list: article files to scan
+    :param parse: how to parse each file for func, like tree_cache.parse_front (the default, which
+    is enough for metadata in <front>) or parsers.parse for whole articles; None to not read the
+    files, in which case func gets article_tree=None. If a file can't be read (for instance, a DOI
+    was given instead of a file), func gets the article file again as article_tree
+    :param processes: number of processes, defaults to the number of CPUs; 1 runs the scan in this process
+    :param chunk_size: number of articles handed to a process at a time
+    :param progress: whether to show a progress bar
+    :param checkpoint: path to a checkpoint file (see ScanCheckpoint) to save results to after every chunk;
+    articles it already has results for aren't scanned again, unless their file changed. The file is
+    deleted once every article has been scanned without errors
+    :param errors: list that a ScanError is appended to for each article that failed; if not given,
+    the errors are printed at the end of the scan
+    :return: generator of tuples of article file, result of func, in no particular order; articles that
+    failed are left out
+    """
+    article_list = list(article_list)
+    scan_errors = [] if errors is None else errors
+    error_count = len(scan_errors)
+    if checkpoint is not None:
+        checkpoint = ScanCheckpoint(checkpoint)
+        saved_results = checkpoint.results()
+    else:
+        saved_results = {}
+    to_scan = [article_file for article_file in article_list if article_file not in saved_results]
+    chunks = [to_scan[i:i + chunk_size] for i in range(0, len(to_scan), chunk_size)]
+    scan = functools.partial(scan_chunk, func, parse=parse)
+    if progress:
+        bar = progressbar.ProgressBar(redirect_stdout=True, max_value=len(article_list))
+    done = len(article_list) - len(to_scan)
+    if processes == 1 or len(chunks) <= 1:
+        pool = None
+        results = map(scan, chunks)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(scan, chunks)
+    try:
+        if done:
+            for article_file in article_list:
+                if article_file in saved_results:
+                    yield article_file, saved_results[article_file]
+        for chunk_results, chunk_errors in results:
+            if checkpoint is not None:
+                checkpoint.save(chunk_results, chunk_errors)
+            scan_errors.extend(chunk_errors)
+            for item in chunk_results:
+                yield item
+            done += len(chunk_results) + len(chunk_errors)
+            if progress:
+                bar.update(done)
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if checkpoint is not None and len(scan_errors) == error_count:
+            checkpoint.remove()
+            checkpoint = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if checkpoint is not None:
+            checkpoint.close()
+    if progress:
+        bar.finish()
+    if errors is None and scan_errors:
+        print_errors(scan_errors)
+
+
+def scan_corpus(func, article_list, **kwargs):
+    """
+    Call a function on every article on a pool of processes, see map_corpus()
+    :param func: function called as func(article_file, article_tree) for each article
+    :param article_list: article files to scan
+    :param kwargs: passed to map_corpus(), like checkpoint and errors
+    :return: list of the results of func, in the order of article_list; None for articles that failed
+    """
+    article_list = list(article_list)
+    results = dict(map_corpus(func, article_list, **kwargs))
+    return [results.get(article_file) for article_file in article_list]
+
+
+def reduce_corpus(func, reducer, initial, article_list, **kwargs):
+    """
+    Call a function on every article on a pool of processes, and combine the results as they come in
+    :param func: function called as func(article_file, article_tree) for each article
+    :param reducer: function called as reducer(combined, article_file, result) for each article,
+    returning the new combined result
+    :param initial: combined result to start from
+    :param article_list: article files to scan
+    :param kwargs: passed to map_corpus(), like checkpoint and errors
+    :return: combined result
+    """
+    combined = initial
+    for article_file, result in map_corpus(func, article_list, **kwargs):
+        combined = reducer(combined, article_file, result)
+    return combined
@@ -0,0 +1,727 @@
+"""Keeping the articles of a corpus directory in a pack file or zip file instead of loose files.
+
+A corpus directory holds 230k+ small XML files, which makes listing it, backing it up and
+copying it slow, and uses an inode per article. A pack store keeps the articles in one large
+file next to the directory (`allofplos_xml.pack` for `allofplos_xml`), each one compressed
+with zlib, plus an index of where each article is in the pack (`allofplos_xml.pack.db`, a
+small SQLite database keyed by DOI). The index is loaded into memory when the pack is opened,
+so reading an article by DOI is a dictionary lookup and a single read. Reading every article
+in the order they're stored is a sequential read of the pack file.
+
+A zip store reads articles straight from the zip file of the corpus, kept next to the
+directory (`allofplos_xml.zip` for `allofplos_xml`), instead of extracting it. The zip's
+central directory is read once into an index of its members, and members are read on demand
+from the memory-mapped zip file. This skips extracting 230k+ files, and the zip file is the
+only copy of the corpus on disk.
+
+Article files in a corpus directory can also be compressed one by one, like
+`journal.pone.0185809.xml.gz` or `journal.pone.0185809.xml.zst`. compress_corpus() compresses
+the files of a directory in place and records the compression next to the directory
+(`allofplos_xml.compression`), so that articles moved into the corpus afterwards are compressed
+the same way (see write_article()). zstd needs the zstandard package, and can use a dictionary
+trained on the articles themselves (`allofplos_xml.zstd-dict`), which compresses small files
+much better than compressing each one on its own. zstd articles can only be read with the
+dictionary they were compressed with, so it can't be retrained while there are any.
+
+Articles in a store or a compressed file keep their paths in the corpus directory, like
+`allofplos_xml/journal.pone.0185809.xml`, and the functions here read them from the directory
+if the file is there, then from its compressed file, and from the store otherwise.
+parsers.parse(), prefetch.read_file(),
+the tree cache, Article and plos_corpus.listdir_nohidden() go through these functions,
+so the rest of allofplos works the same on stored and loose articles. Files in the directory
+come first, so articles that were updated since are read from their new files. If a directory
+has both a pack and a zip file, the pack is used.
+
+Usage:
+```
+pack_corpus(corpusdir, remove_files=True)
+article = Article('10.1371/journal.pone.0185809')  # read from allofplos_xml.pack
+```
+"""
+
+import gzip
+import io
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import zipfile
+import zlib
+
+from allofplos.corpus_layout import corpus_directory, list_files
+from allofplos.plos_regex import validate_filename
+from allofplos.transformations import compressed_suffixes, filename_to_doi, strip_compressed_suffix
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+pack_suffix = '.pack'
+zip_suffix = '.zip'
+index_suffix = '.db'
+compression_level = 6
+compression_settings_suffix = '.compression'
+dictionary_suffix = '.zstd-dict'
+zstd_level = 10
+# size of a trained zstd dictionary, and the most articles it's trained on
+dictionary_size = 112640
+dictionary_samples = 10000
+# An XML file is several times the size of its compressed file
+compression_ratio = 6
+# Number of articles packed between commits of the index
+pack_batch_size = 1000
+
+index_schema = """
+CREATE TABLE IF NOT EXISTS articles (
+    doi TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def get_pack_path(directory):
+    """
+    Where the pack store of a corpus directory is kept
+    :param directory: corpus directory
+    :return: path to the pack file next to the directory; its index is this path + index_suffix
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + pack_suffix
+
+
+class PackStore():
+    """Articles stored compressed in one pack file, with an index by DOI.
+
+    Usage:
+    ```
+    store = PackStore(get_pack_path(corpusdir))
+    content = store.read('10.1371/journal.pone.0185809')
+    ```
+    """
+    def __init__(self, pack_path):
+        """
+        :param pack_path: path to the pack file, which is created (empty) if it doesn't exist
+        """
+        self.pack_path = pack_path
+        self.index_path = pack_path + index_suffix
+        with open(pack_path, 'ab'):
+            pass
+        self.version = os.stat(pack_path).st_mtime_ns
+        self._fd = os.open(pack_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self._lock = threading.Lock()
+        connection = sqlite3.connect(self.index_path)
+        try:
+            connection.executescript(index_schema)
+            rows = connection.execute("SELECT doi, filename, offset, length, size FROM articles").fetchall()
+        finally:
+            connection.close()
+        self._index = {doi: (filename, offset, length, size) for doi, filename, offset, length, size in rows}
+        self._filenames = {entry[0]: doi for doi, entry in self._index.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, doi):
+        return doi in self._index
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def dois(self):
+        """:return: set of the DOIs of every article in the pack"""
+        return set(self._index)
+
+    def filenames(self):
+        """:return: list of the file names of the articles in the pack, like 'journal.pone.0185809.xml'"""
+        return list(self._filenames)
+
+    def find(self, filename):
+        """
+        :param filename: file name of an article, like 'journal.pone.0185809.xml'
+        :return: DOI of the article if it's in the pack, otherwise None
+        """
+        return self._filenames.get(filename)
+
+    def offset(self, doi):
+        """:return: where an article starts in the pack file"""
+        return self._index[doi][1]
+
+    def size(self, doi):
+        """:return: size in bytes of an article's XML, uncompressed"""
+        return self._index[doi][3]
+
+    def entry_version(self, doi):
+        """
+        :return: what changes when an article is packed again: where its copy starts in the pack, and its
+        length. Articles are only ever appended, so this stays the same when other articles are packed.
+        """
+        _, offset, length, _ = self._index[doi]
+        return offset, length
+
+    def _read_at(self, offset, length):
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, length, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, length)
+
+    def read(self, doi):
+        """
+        Read an article from the pack
+        :param doi: DOI of the article
+        :return: the article's XML as bytes
+        """
+        _, offset, length, _ = self._index[doi]
+        return zlib.decompress(self._read_at(offset, length))
+
+    def iter_articles(self, buffer_size=16 * 1024 * 1024):
+        """
+        Read every article in the order they're stored, reading the pack file sequentially
+        :param buffer_size: size of the reads from the pack file
+        :return: generator of tuples of DOI, the article's XML as bytes
+        """
+        entries = sorted(self._index.items(), key=lambda item: item[1][1])
+        with open(self.pack_path, 'rb', buffering=buffer_size) as pack:
+            for doi, (_, offset, length, _) in entries:
+                if pack.tell() != offset:
+                    pack.seek(offset)
+                yield doi, zlib.decompress(pack.read(length))
+
+
+def get_zip_path(directory):
+    """
+    Where the zip file of a corpus directory is kept, for reading articles from it without extracting them
+    :param directory: corpus directory
+    :return: path to the zip file next to the directory
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + zip_suffix
+
+
+# local file header: signature, then fixed fields up to the lengths of the name and extra field
+LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+
+class ZipStore():
+    """Articles read from a zip file as they're needed, without extracting it.
+
+    Usage:
+    ```
+    store = ZipStore(get_zip_path(corpusdir))
+    content = store.read('10.1371/journal.pone.0185809')
+    ```
+    """
+    def __init__(self, zip_path):
+        """
+        :param zip_path: path to the zip file
+        """
+        self.zip_path = zip_path
+        self.version = os.stat(zip_path).st_mtime_ns
+        with zipfile.ZipFile(zip_path) as zip_file:
+            infos = [info for info in zip_file.infolist()
+                     if info.filename.endswith('.xml') and validate_filename(os.path.basename(info.filename))]
+        self._index = {}
+        self._filenames = {}
+        for info in infos:
+            filename = os.path.basename(info.filename)
+            doi = filename_to_doi(filename)
+            self._index[doi] = (filename, info)
+            self._filenames[filename] = doi
+        with open(zip_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._index else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, doi):
+        return doi in self._index
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def dois(self):
+        """:return: set of the DOIs of every article in the zip file"""
+        return set(self._index)
+
+    def filenames(self):
+        """:return: list of the file names of the articles in the zip file, like 'journal.pone.0185809.xml'"""
+        return list(self._filenames)
+
+    def find(self, filename):
+        """
+        :param filename: file name of an article, like 'journal.pone.0185809.xml'
+        :return: DOI of the article if it's in the zip file, otherwise None
+        """
+        return self._filenames.get(filename)
+
+    def offset(self, doi):
+        """:return: where an article starts in the zip file"""
+        return self._index[doi][1].header_offset
+
+    def size(self, doi):
+        """:return: size in bytes of an article's XML, uncompressed"""
+        return self._index[doi][1].file_size
+
+    def entry_version(self, doi):
+        """:return: what changes when an article changes in the zip file: its offset, compressed size, and CRC"""
+        info = self._index[doi][1]
+        return info.header_offset, info.compress_size, info.CRC
+
+    def read(self, doi):
+        """
+        Read an article from the zip file
+        :param doi: DOI of the article
+        :return: the article's XML as bytes
+        """
+        _, info = self._index[doi]
+        offset = info.header_offset
+        signature, name_length, extra_length = LOCAL_HEADER.unpack_from(self._map, offset)
+        if signature != b'PK\x03\x04':
+            raise OSError("Bad zip member header for {} in {}".format(info.filename, self.zip_path))
+        start = offset + LOCAL_HEADER.size + name_length + extra_length
+        data = self._map[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_STORED:
+            content = data
+        elif info.compress_type == zipfile.ZIP_DEFLATED:
+            content = zlib.decompress(data, -15)
+        else:
+            with zipfile.ZipFile(self.zip_path) as zip_file:
+                content = zip_file.read(info)
+        if zlib.crc32(content) != info.CRC:
+            raise OSError("CRC check failed for {} in {}".format(info.filename, self.zip_path))
+        return content
+
+    def iter_articles(self):
+        """
+        Read every article in the order they're stored in the zip file
+        :return: generator of tuples of DOI, the article's XML as bytes
+        """
+        for doi in sorted(self._index, key=self.offset):
+            yield doi, self.read(doi)
+
+
+def pack_articles(article_files, pack_path):
+    """
+    Add article files to a pack, or replace the articles that are already in it
+    Replaced articles stay in the pack file as unused space.
+    :param article_files: paths to the article files
+    :param pack_path: path to the pack file, which is created if it doesn't exist
+    :return: number of articles packed
+    """
+    # open (and create) the pack and its index before appending to it
+    PackStore(pack_path).close()
+    connection = sqlite3.connect(pack_path + index_suffix)
+    count = 0
+    try:
+        with open(pack_path, 'ab') as pack:
+            offset = pack.tell()
+            for article_file in article_files:
+                content = read_article(article_file)
+                blob = zlib.compress(content, compression_level)
+                pack.write(blob)
+                filename = os.path.basename(article_file)
+                connection.execute("INSERT OR REPLACE INTO articles (doi, filename, offset, length, size) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   (filename_to_doi(filename), filename, offset, len(blob), len(content)))
+                offset += len(blob)
+                count += 1
+                if count % pack_batch_size == 0:
+                    # the index never points past what's been written to the pack
+                    pack.flush()
+                    os.fsync(pack.fileno())
+                    connection.commit()
+            pack.flush()
+            os.fsync(pack.fileno())
+        connection.commit()
+    finally:
+        connection.close()
+    return count
+
+
+def pack_corpus(directory, remove_files=False):
+    """
+    Pack the article files (compressed or not) of a corpus directory into its pack store, see get_pack_path()
+    :param directory: corpus directory
+    :param remove_files: delete the article files from the directory once they're packed
+    :return: number of articles packed
+    """
+    files = [file for file in list_files(directory) if strip_compressed_suffix(file).endswith('.xml')]
+    article_files = [os.path.join(directory, file)
+                     for file in dict.fromkeys(strip_compressed_suffix(file) for file in files)]
+    count = pack_articles(article_files, get_pack_path(directory))
+    if remove_files:
+        for file in files:
+            os.remove(os.path.join(directory, file))
+    return count
+
+
+def get_compression_settings_path(directory):
+    """
+    :param directory: corpus directory
+    :return: path to the file next to the directory that records how its articles are compressed
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + compression_settings_suffix
+
+
+def get_dictionary_path(directory):
+    """
+    :param directory: corpus directory
+    :return: path to the zstd dictionary of the directory's compressed articles, next to the directory
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + dictionary_suffix
+
+
+def get_compression(directory):
+    """
+    :param directory: corpus directory
+    :return: how articles are compressed in the directory: one of compressed_suffixes, or None
+    """
+    try:
+        with open(get_compression_settings_path(directory)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def check_zstandard():
+    if zstandard is None:
+        raise ImportError("zstd compressed articles need the zstandard package: pip install allofplos[zstd]")
+
+
+_dictionaries = {}
+# zstd compressors and decompressors aren't thread-safe, so each thread keeps its own
+_codecs = threading.local()
+
+
+def get_dictionary(directory):
+    """
+    :param directory: corpus directory
+    :return: the directory's zstd dictionary as a zstandard.ZstdCompressionDict, or None if it doesn't have one
+    """
+    path = get_dictionary_path(directory)
+    try:
+        version = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _dictionaries.get(path)
+    if cached is None or cached[0] != version:
+        check_zstandard()
+        with open(path, 'rb') as f:
+            cached = _dictionaries[path] = (version, zstandard.ZstdCompressionDict(f.read()))
+    return cached[1]
+
+
+def get_zstd_codec(codec_type, dictionary):
+    """
+    :param codec_type: zstandard.ZstdCompressor or zstandard.ZstdDecompressor
+    :param dictionary: zstandard.ZstdCompressionDict, or None
+    :return: this thread's compressor or decompressor for the dictionary, created the first time
+    """
+    codecs = _codecs.__dict__.setdefault('codecs', {})
+    codec = codecs.get((codec_type, dictionary))
+    if codec is None:
+        if codec_type is zstandard.ZstdCompressor:
+            codec = codec_type(level=zstd_level, dict_data=dictionary)
+        else:
+            codec = codec_type(dict_data=dictionary)
+        codecs[(codec_type, dictionary)] = codec
+    return codec
+
+
+def has_zstd_articles(directory):
+    """
+    :param directory: corpus directory
+    :return: whether any article in the directory is in a zstd compressed file
+    """
+    return any(file.endswith('.zst') for file in list_files(directory))
+
+
+def train_dictionary(directory, article_files):
+    """
+    Train a zstd dictionary on a sample of articles and save it next to the directory
+    A zstd article can only be read with the dictionary it was compressed with, so this refuses to
+    replace the dictionary while the directory has zstd articles.
+    :param directory: corpus directory
+    :param article_files: paths to article files to sample
+    :return: None
+    """
+    check_zstandard()
+    if has_zstd_articles(directory):
+        raise ValueError("{} already has zstd compressed articles, which need the dictionary they were "
+                         "compressed with; decompress them before training a new one".format(directory))
+    article_files = list(article_files)
+    if not article_files:
+        raise ValueError("No articles in {} to train a zstd dictionary on".format(directory))
+    step = max(1, len(article_files) // dictionary_samples)
+    samples = [read_article(article_file) for article_file in article_files[::step]]
+    dictionary = zstandard.train_dictionary(dictionary_size, samples, level=zstd_level)
+    with open(get_dictionary_path(directory), 'wb') as f:
+        f.write(dictionary.as_bytes())
+
+
+def compress_article(content, compression, directory):
+    """
+    :param content: an article's XML as bytes
+    :param compression: one of compressed_suffixes
+    :param directory: corpus directory, for its zstd dictionary
+    :return: the compressed bytes
+    """
+    if compression == '.gz':
+        return gzip.compress(content, compresslevel=compression_level)
+    check_zstandard()
+    return get_zstd_codec(zstandard.ZstdCompressor, get_dictionary(directory)).compress(content)
+
+
+def decompress_article(data, compression, directory):
+    """
+    :param data: a compressed article file's contents
+    :param compression: one of compressed_suffixes
+    :param directory: corpus directory, for its zstd dictionary
+    :return: the article's XML as bytes
+    """
+    if compression == '.gz':
+        return gzip.decompress(data)
+    check_zstandard()
+    return get_zstd_codec(zstandard.ZstdDecompressor, get_dictionary(directory)).decompress(data)
+
+
+def find_compressed(path):
+    """
+    :param path: path of an article file
+    :return: tuple of the path of its compressed file, the compression; None if there isn't one
+    """
+    for compression in compressed_suffixes:
+        if os.path.isfile(path + compression):
+            return path + compression, compression
+    return None
+
+
+def read_compressed(path):
+    """
+    :param path: path of an article file
+    :return: the article's XML from its compressed file, or None if there isn't one
+    """
+    compressed = find_compressed(path)
+    if compressed is None:
+        return None
+    compressed_path, compression = compressed
+    with open(compressed_path, 'rb') as f:
+        return decompress_article(f.read(), compression, corpus_directory(path) or os.curdir)
+
+
+def write_article(path, content, compression=None):
+    """
+    Write an article file, replacing the article's file (compressed or not) if it has one
+    The file is written under a temporary name and renamed into place, so readers never see part of it.
+    :param path: path of the article file, like 'allofplos_xml/journal.pone.0185809.xml'
+    :param content: the article's XML as bytes
+    :param compression: one of compressed_suffixes to write a compressed file, or None for the XML file
+    :return: path of the file written
+    """
+    file_path = path
+    if compression is not None:
+        content = compress_article(content, compression, corpus_directory(path) or os.curdir)
+        file_path = path + compression
+    with open(file_path + '.part', 'wb') as f:
+        f.write(content)
+    os.replace(file_path + '.part', file_path)
+    for old_path in (path,) + tuple(path + suffix for suffix in compressed_suffixes):
+        if old_path != file_path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+    return file_path
+
+
+def compress_corpus(directory, compression='.gz', dictionary=False):
+    """
+    Compress the article files of a corpus directory in place, and compress articles moved into it from now on
+    :param directory: corpus directory
+    :param compression: one of compressed_suffixes
+    :param dictionary: for zstd, first train a dictionary on the articles (see train_dictionary()); not
+    possible once the directory has zstd articles
+    :return: number of articles compressed. Articles already compressed another way are recompressed
+    """
+    if compression not in compressed_suffixes:
+        raise ValueError("Unknown compression {}, expected one of {}".format(compression, compressed_suffixes))
+    files = list_files(directory)
+    article_files = [os.path.join(directory, strip_compressed_suffix(file)) for file in files
+                     if not file.endswith(compression) and strip_compressed_suffix(file).endswith('.xml')]
+    if dictionary and compression == '.zst':
+        train_dictionary(directory, article_files)
+    with open(get_compression_settings_path(directory), 'w') as f:
+        f.write(compression)
+    for article_file in article_files:
+        write_article(article_file, read_article(article_file), compression)
+    return len(article_files)
+
+
+# Kinds of store a corpus directory can have, in order of preference
+store_types = [(get_pack_path, PackStore),
+               (get_zip_path, ZipStore),
+               ]
+
+_stores = {}
+_stores_lock = threading.Lock()
+# versions of store files that couldn't be opened, so they're only reported once
+_bad_stores = {}
+
+
+def get_store(directory):
+    """
+    Get the store of a corpus directory, opening it the first time, and again if its file has changed
+    :param directory: corpus directory
+    :return: PackStore or ZipStore, or None if the directory doesn't have one. A zip file that isn't
+    a valid zip file (such as a partial download) is reported once and skipped
+    """
+    for get_path, store_type in store_types:
+        store_path = get_path(directory)
+        try:
+            version = os.stat(store_path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if _bad_stores.get(store_path) == version:
+            continue
+        store = _stores.get(store_path)
+        if store is None or store.version != version:
+            with _stores_lock:
+                store = _stores.get(store_path)
+                if store is None or store.version != version:
+                    try:
+                        store = _stores[store_path] = store_type(store_path)
+                    except zipfile.BadZipFile as e:
+                        print("Skipping corpus store {}: {}".format(store_path, e))
+                        _stores.pop(store_path, None)
+                        _bad_stores[store_path] = version
+                        continue
+        return store
+    return None
+
+
+def close_stores():
+    """Close every store opened by get_store()."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+        _bad_stores.clear()
+
+
+def find_article(path):
+    """
+    Find an article in the store of its directory
+    :param path: path of an article file in a corpus directory
+    :return: tuple of the store, DOI if the article is in it; otherwise None
+    """
+    store = get_store(corpus_directory(path) or os.curdir)
+    if store is None:
+        return None
+    doi = store.find(os.path.basename(path))
+    if doi is None:
+        return None
+    return store, doi
+
+
+def article_exists(path):
+    """
+    :param path: path of an article file
+    :return: whether the article is a file or a compressed file, or in the store of its directory
+    """
+    return os.path.isfile(path) or find_compressed(path) is not None or find_article(path) is not None
+
+
+def read_article(path):
+    """
+    Read an article from its file, its compressed file, or the store of its directory, in that order
+    :param path: path of an article file
+    :return: the article's XML as bytes
+    :raises FileNotFoundError: if the article is in none of them
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        content = read_compressed(path)
+        if content is not None:
+            return content
+        found = find_article(path)
+        if found is None:
+            raise
+        store, doi = found
+        return store.read(doi)
+
+
+def article_source(path):
+    """
+    Something to parse an article from: the path itself if it's a file, otherwise the article
+    from its compressed file or the store of its directory
+    :param path: path of an article file
+    :return: the path, or a file-like object
+    """
+    if os.path.isfile(path):
+        return path
+    content = read_compressed(path)
+    if content is not None:
+        return io.BytesIO(content)
+    found = find_article(path)
+    if found is None:
+        return path
+    store, doi = found
+    return io.BytesIO(store.read(doi))
+
+
+def article_version(path):
+    """
+    What changes when an article is written again, for noticing that a cached copy is out of date
+    Articles in a store get a version of their own, so adding to the store doesn't change the others.
+    :param path: path of an article file
+    :return: tuple of a version (comparable with ==), size of the article in bytes (estimated for
+    compressed files)
+    :raises FileNotFoundError: if the article is neither a file nor in the store of its directory
+    """
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size), stat.st_size
+    except FileNotFoundError:
+        compressed = find_compressed(path)
+        if compressed is not None:
+            stat = os.stat(compressed[0])
+            return (stat.st_mtime_ns, stat.st_size), stat.st_size * compression_ratio
+        found = find_article(path)
+        if found is None:
+            raise
+        store, doi = found
+        return store.entry_version(doi), store.size(doi)
+
+
+def list_articles(directory):
+    """
+    :param directory: corpus directory
+    :return: file names of the articles in the store of the directory; empty if there isn't one
+    """
+    store = get_store(directory)
+    if store is None:
+        return []
+    return store.filenames()
@@ -0,0 +1,194 @@
+"""Concurrent downloading of article XML files.
+
+Articles are fetched from journals.plos.org (or from content-repo when inside the PLOS network)
+by a bounded pool of worker threads. Each host gets its own limiter, which caps how many requests
+are in flight and how many are started per second, so the external site is never hit harder than
+configured. Failed requests are retried with exponential backoff, and anything that still fails
+is collected and reported at the end instead of stopping the whole download.
+"""
+
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import lxml.etree as et
+import progressbar
+import requests
+
+from allofplos import http_client
+from allofplos.parsers import parse
+from allofplos.transformations import EXT_URL_TMP, INT_URL_TMP, doi_to_url, doi_to_path
+
+# How many articles to download at the same time
+max_download_workers = 8
+
+# Per-host limits: (requests started per second, requests in flight). None means no rate limit.
+# journals.plos.org is a public site, so keep it polite; content-repo is internal.
+host_limits = {urlparse(EXT_URL_TMP).netloc: (2, 4),
+               urlparse(INT_URL_TMP).netloc: (None, 16),
+               }
+default_host_limit = (1, 2)
+
+# HTTP status codes worth trying again; anything else (e.g. 404) fails immediately
+retry_statuses = (429, 500, 502, 503, 504)
+
+
+class HostLimiter():
+    """Throttles the requests made to a single host.
+
+    Use as a context manager around each request. At most `max_concurrent` requests are in flight
+    at once, and new requests are spaced so that no more than `rate` start per second.
+    """
+    def __init__(self, rate=None, max_concurrent=4):
+        """
+        :param rate: maximum number of requests started per second, None for no limit
+        :param max_concurrent: maximum number of requests in flight at the same time
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        if self.interval:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self.interval
+            if wait > 0:
+                time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._semaphore.release()
+        return False
+
+
+def get_host_limiters(urls, limits=None):
+    """
+    Make one HostLimiter for every host in a list of URLs
+    :param urls: iterable of URLs that will be requested
+    :param limits: dict of host to (rate, max_concurrent), overrides the defaults in host_limits
+    :return: dict of host to HostLimiter
+    """
+    all_limits = dict(host_limits)
+    if limits:
+        all_limits.update(limits)
+    limiters = {}
+    for url in urls:
+        host = urlparse(url).netloc
+        if host not in limiters:
+            rate, max_concurrent = all_limits.get(host, default_host_limit)
+            limiters[host] = HostLimiter(rate=rate, max_concurrent=max_concurrent)
+    return limiters
+
+
+def fetch_with_retries(url, limiter, retries=3, backoff=1.0):
+    """
+    Download the content at a URL, retrying with exponential backoff
+    Connection errors, timeouts and the statuses in retry_statuses are retried; other errors are raised
+    Requests use the shared connection pool in allofplos.http_client, but retry here rather than in
+    the pool so that every attempt goes through the host's limiter
+    :param url: URL to download
+    :param limiter: HostLimiter for the host of the URL
+    :param retries: how many times to try again after the first failure
+    :param backoff: seconds to wait before the first retry, doubled after each one
+    :return: bytes of the response body
+    """
+    for attempt in range(retries + 1):
+        try:
+            with limiter:
+                response = http_client.get(url, retry=False)
+            if response.status_code not in retry_statuses or attempt == retries:
+                response.raise_for_status()
+                return response.content
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+
+def download_article(doi, directory, limiter, plos_network=False, retries=3, backoff=1.0):
+    """
+    Download a single article and save its XML to directory
+    The XML is parsed before saving, so a truncated or malformed response counts as a failure
+    :param doi: DOI of the article to download
+    :param directory: directory where the article file is written
+    :param limiter: HostLimiter for the article's host
+    :param plos_network: whether to download from content-repo inside the PLOS network
+    :param retries: passed to fetch_with_retries
+    :param backoff: passed to fetch_with_retries
+    :return: path to the downloaded article file
+    """
+    url = doi_to_url(doi, plos_network=plos_network)
+    content = fetch_with_retries(url, limiter, retries=retries, backoff=backoff)
+    article_tree = parse(io.BytesIO(content))
+    article_path = doi_to_path(doi, directory=directory)
+    with open(article_path, 'w') as file:
+        file.write(et.tostring(article_tree, method='xml', encoding='unicode'))
+    return article_path
+
+
+def download_articles(dois, directory, plos_network=False, max_workers=None, limits=None,
+                      retries=3, backoff=1.0):
+    """
+    Download many articles at the same time, with per-host rate and concurrency limits
+    Articles that fail after all retries are reported at the end rather than stopping the download
+    :param dois: iterable of DOIs of articles to download
+    :param directory: directory where the article files are written
+    :param plos_network: whether to download from content-repo inside the PLOS network
+    :param max_workers: size of the worker pool, defaults to max_download_workers
+    :param limits: dict of host to (rate, max_concurrent), overrides the defaults in host_limits
+    :param retries: how many times to retry each article
+    :param backoff: seconds to wait before the first retry, doubled after each one
+    :return: tuple of list of downloaded DOIs, dict of failed DOIs mapped to their error
+    """
+    dois = sorted(dois)
+    if max_workers is None:
+        max_workers = max_download_workers
+    urls = {doi: doi_to_url(doi, plos_network=plos_network) for doi in dois}
+    limiters = get_host_limiters(urls.values(), limits=limits)
+
+    downloaded = []
+    failed = {}
+    bar = progressbar.ProgressBar(redirect_stdout=True, max_value=len(dois))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(download_article,
+                                   doi,
+                                   directory,
+                                   limiters[urlparse(urls[doi]).netloc],
+                                   plos_network=plos_network,
+                                   retries=retries,
+                                   backoff=backoff): doi
+                   for doi in dois}
+        for i, future in enumerate(as_completed(futures)):
+            doi = futures[future]
+            try:
+                future.result()
+                downloaded.append(doi)
+            except (requests.RequestException, et.XMLSyntaxError, OSError) as e:
+                failed[doi] = e
+            bar.update(i+1)
+    bar.finish()
+    if failed:
+        print_failure_summary(failed)
+    return downloaded, failed
+
+
+def print_failure_summary(failed):
+    """
+    Print and log the articles that could not be downloaded, grouped by type of error
+    :param failed: dict of DOIs mapped to the exception raised when downloading them
+    :return: None
+    """
+    errors = {}
+    for doi, error in failed.items():
+        errors.setdefault(type(error).__name__, []).append(doi)
+    print("{} articles failed to download:".format(len(failed)))
+    for error_type, dois in sorted(errors.items()):
+        print("  {}: {}".format(error_type, ', '.join(sorted(dois))))
+    logging.warning("Failed downloads: {}".format(sorted(failed)))
@@ -0,0 +1,159 @@
+"""Shared HTTP client for every network call in allofplos.
+
+All requests go through one pool of keep-alive connections, so checking thousands of articles
+reuses a handful of TCP/TLS connections instead of opening a new one per article.
+Responses are requested gzip-compressed, every request has a timeout, and failed connections
+and temporary server errors are retried with backoff.
+Each thread gets its own requests.Session (sessions hold cookies and are not thread-safe),
+but all of the sessions share the same connection pool, which is.
+"""
+
+import io
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from allofplos.parsers import parse
+
+# Number of hosts to keep pools for, and connections kept open per host
+pool_connections = 10
+pool_maxsize = 32
+# Seconds to wait for a connection, and for data from the server
+timeout = (10, 60)
+# Retries after connection errors and temporary server errors, with exponential backoff
+retries = 3
+backoff_factor = 0.5
+retry_statuses = (429, 500, 502, 503, 504)
+
+default_headers = {'Accept-Encoding': 'gzip, deflate',
+                   'User-Agent': 'allofplos',
+                   }
+
+_lock = threading.Lock()
+_adapters = {}
+_local = threading.local()
+
+
+def configure(**settings):
+    """
+    Change the connection pool, timeout or retry settings used by every request.
+    Takes the names of the module-level settings as keyword arguments, e.g.
+    `configure(pool_maxsize=64, timeout=(5, 30), retries=5)`
+    Sessions created before the change are replaced the next time they are used.
+    :return: None
+    """
+    global _adapters
+    for name, value in settings.items():
+        if name not in ('pool_connections', 'pool_maxsize', 'timeout', 'retries', 'backoff_factor',
+                        'retry_statuses'):
+            raise TypeError("Unknown HTTP client setting: {}".format(name))
+        globals()[name] = value
+    with _lock:
+        _adapters = {}
+
+
+def get_adapter(retry=True):
+    """
+    The transport adapter that holds the shared connection pool.
+    :param retry: whether the adapter retries failed requests itself. Callers that run their own
+    retry loop (like allofplos.download) use retry=False so requests aren't retried twice.
+    :return: requests HTTPAdapter
+    """
+    with _lock:
+        if retry not in _adapters:
+            if retry:
+                max_retries = Retry(total=retries,
+                                    backoff_factor=backoff_factor,
+                                    status_forcelist=retry_statuses,
+                                    raise_on_status=False)
+            else:
+                max_retries = 0
+            _adapters[retry] = HTTPAdapter(pool_connections=pool_connections,
+                                           pool_maxsize=pool_maxsize,
+                                           max_retries=max_retries)
+        return _adapters[retry]
+
+
+def get_session(retry=True):
+    """
+    The requests session for the current thread, mounted on the shared connection pool.
+    :param retry: see get_adapter()
+    :return: requests Session
+    """
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    adapter = get_adapter(retry=retry)
+    session = sessions.get(retry)
+    if session is None or session.get_adapter('http://') is not adapter:
+        session = requests.Session()
+        session.headers.update(default_headers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        sessions[retry] = session
+    return session
+
+
+def get(url, retry=True, **kwargs):
+    """
+    Make a GET request through the shared session, with the default timeout.
+    :param url: URL to request
+    :param retry: see get_adapter()
+    :param kwargs: passed on to requests.Session.get
+    :return: requests Response
+    """
+    kwargs.setdefault('timeout', timeout)
+    return get_session(retry=retry).get(url, **kwargs)
+
+
+def post(url, retry=True, **kwargs):
+    """
+    Make a POST request through the shared session, with the default timeout.
+    :param url: URL to request
+    :param retry: see get_adapter()
+    :param kwargs: passed on to requests.Session.post
+    :return: requests Response
+    """
+    kwargs.setdefault('timeout', timeout)
+    return get_session(retry=retry).post(url, **kwargs)
+
+
+def get_if_modified(url, etag=None, last_modified=None, **kwargs):
+    """
+    Make a conditional GET request, which the server can answer with an empty 304 Not Modified
+    if the resource still matches the validators from an earlier response
+    :param url: URL to request
+    :param etag: ETag header of the earlier response
+    :param last_modified: Last-Modified header of the earlier response
+    :param kwargs: passed on to get()
+    :return: requests Response; check for response.status_code == 304 before using the body
+    """
+    headers = dict(kwargs.pop('headers', None) or {})
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return get(url, headers=headers, **kwargs)
+
+
+def get_content(url, **kwargs):
+    """
+    Download the body of a URL, raising an exception for HTTP error statuses.
+    :param url: URL to download
+    :return: bytes of the (decompressed) response body
+    """
+    response = get(url, **kwargs)
+    response.raise_for_status()
+    return response.content
+
+
+def get_tree(url, **kwargs):
+    """
+    Download and parse the XML at a URL.
+    Replaces et.parse(url), which opens a new connection every time and can't use gzip.
+    :param url: URL of an XML file, such as an article's URL
+    :return: lxml element tree of the XML
+    """
+    return parse(io.BytesIO(get_content(url, **kwargs)))
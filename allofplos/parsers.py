@@ -0,0 +1,90 @@
+"""Shared XML parsers for reading articles.
+
+Calling et.parse() without a parser uses lxml's default settings, and building an XMLParser
+for every file costs a little each time. get_parser() hands out parsers configured for a
+purpose, created once per thread (an lxml parser can't be used by two threads at once) and
+reused afterwards.
+
+Every parser reads articles as they are: the DTD named in the DOCTYPE isn't loaded, nothing
+is fetched over the network and entities aren't expanded. Large articles are allowed
+(huge_tree), which is safe because entities are never expanded. Element IDs are still
+collected: with collect_ids=False, libxml2 tries to load the external DTD named in every PLOS
+article's DOCTYPE, which fails without network access.
+
+Article paths are read through corpus_store, so articles in a corpus directory's pack store
+are parsed the same way as article files.
+
+Usage:
+`tree = parse(article_file)` or `et.parse(article_file, get_parser('view'))`
+"""
+
+import threading
+
+import lxml.etree as et
+
+from allofplos.corpus_store import article_source
+
+# Settings shared by every parser, which et.iterparse() takes as well
+base_options = {'load_dtd': False,
+                'no_network': True,
+                'resolve_entities': False,
+                'huge_tree': True,
+                }
+
+# Settings for each purpose, on top of base_options
+parser_options = {
+    # article files as they are, for reading metadata, comparing and saving
+    'article': {},
+    # for printing an article: whitespace between elements and comments are dropped
+    'view': {'remove_blank_text': True, 'remove_comments': True},
+}
+
+_local = threading.local()
+
+
+def get_parser_options(purpose='article'):
+    """
+    :param purpose: key of parser_options
+    :return: dict of keyword arguments for et.XMLParser() or et.iterparse()
+    """
+    return dict(base_options, **parser_options[purpose])
+
+
+def get_parser(purpose='article'):
+    """
+    Get this thread's parser for a purpose, creating it the first time
+    :param purpose: key of parser_options
+    :return: lxml XMLParser
+    """
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(purpose)
+    if parser is None:
+        parser = parsers[purpose] = et.XMLParser(**get_parser_options(purpose))
+    return parser
+
+
+def parse(source, purpose='article'):
+    """
+    Parse XML with this thread's parser for a purpose
+    :param source: path to an XML file (or an article in a pack store, see corpus_store), or a file-like object
+    :param purpose: key of parser_options
+    :return: lxml element tree
+    """
+    if isinstance(source, str):
+        source = article_source(source)
+    return et.parse(source, get_parser(purpose))
+
+
+def iterparse(source, purpose='article', **kwargs):
+    """
+    et.iterparse() with the settings of a purpose
+    :param source: path to an XML file (or an article in a pack store, see corpus_store), or a file-like object
+    :param purpose: key of parser_options
+    :param kwargs: other arguments of et.iterparse(), like events and tag
+    :return: lxml iterparse iterator
+    """
+    if isinstance(source, str):
+        source = article_source(source)
+    return et.iterparse(source, **dict(get_parser_options(purpose), **kwargs))
@@ -22,27 +22,37 @@ import argparse
 import datetime
 import errno
 import gzip
+import io
 import logging
 import os
 import shutil
-import time
 import tarfile
 import zipfile
 
 import lxml.etree as et
 import progressbar
-import requests
 from tqdm import tqdm
 
-from allofplos.plos_regex import (validate_doi, corpusdir, newarticledir)
+from allofplos import http_client
+from allofplos.article_fields import parse_article_file
+from allofplos.bulk_download import extract_zip, resumable_download, ranges_suffix, stream_unzip
+from allofplos.corpus_index import CorpusIndex, get_index_path
+from allofplos.corpus_layout import SHARDED, article_path, get_layout, list_files, migrate_layout, layouts
+from allofplos.corpus_scan import scan_corpus
+from allofplos.corpus_store import (article_exists, get_compression, get_zip_path, list_articles, read_article,
+                                    write_article)
+from allofplos.download import download_articles
+from allofplos.parsers import parse
+from allofplos.plos_regex import (corpusdir, newarticledir)
+from allofplos.prefetch import prefetch_trees
+from allofplos.sync_state import SyncState, content_sha1, file_sha1, invalidate_state
 from allofplos.transformations import (BASE_URL_API, EXT_URL_TMP, INT_URL_TMP, URL_TMP, filename_to_doi,
-                                       doi_to_path)
+                                       doi_to_path, strip_compressed_suffix)
+from allofplos.tree_cache import is_front_path, parse_front
+from allofplos.xpaths import XPATHS, get_xpath
 
 help_str = "This program downloads a zip file with all PLOS articles and checks for updates"
 
-# Making sure DS.Store not included as file
-ignore_func = shutil.ignore_patterns('.DS_Store')
-
 # List of uncorrected proof articles to check for updates
 uncorrected_proofs_text_list = 'uncorrected_proofs_list.txt'
 
@@ -66,7 +76,10 @@ zip_metadata = 'zip_info.txt'
 time_formatting = "%Y_%b_%d_%Hh%Mm%Ss"
 min_files_for_valid_corpus = 200000
 test_zip_id = '12VomS72LdTI3aYn4cphYAShv13turbX3'
+google_drive_url = "https://docs.google.com/uc?export=download"
 local_test_zip = 'sample_corpus.zip'
+# added to the name of a zip store while it downloads
+partial_zip_suffix = '.part'
 
 
 def listdir_nohidden(path, extension='.xml', include_dir=True):
@@ -76,14 +89,22 @@ def listdir_nohidden(path, extension='.xml', include_dir=True):
     :param path: String with a path where to search files
     :param extension: String with the extension that we are looking for, xml is the default value
     :param include_dir: By default, include the directory in the filename
-    :return: A list with all the file names inside this directory, without the DS_Store file
+    :return: A list with all the file names inside this directory, without the DS_Store file.
+    Files in the shards of a sharded directory are included (see corpus_layout), with their shard
+    when include_dir is False. Compressed article files are listed by the name of the XML file they
+    hold, and the articles in the directory's store are included, if it has one (see corpus_store)
     """
-
+    files = list(dict.fromkeys(strip_compressed_suffix(file) for file in list_files(path)))
+    stored_files = list_articles(path)
+    if stored_files:
+        listed = set(files)
+        files.extend(file for file in (os.path.relpath(article_path(path, file), path) for file in stored_files)
+                     if file not in listed)
     if include_dir:
-        file_list = [os.path.join(path, file) for file in os.listdir(path)
+        file_list = [os.path.join(path, file) for file in files
                      if file.endswith(extension) and 'DS_Store' not in file]
     else:
-        file_list = [file for file in os.listdir(path) if file.endswith(extension) and
+        file_list = [file for file in files if file.endswith(extension) and
                      'DS_Store' not in file]
     return file_list
 
@@ -96,7 +117,7 @@ def extract_filenames(directory, extension='.xml'):
     :return: A list with all the file names inside this directory, excluding extensions
     """
     filenames = [os.path.basename(article_file).rstrip(extension) for article_file in
-                 listdir_nohidden(directory, extension) if os.path.isfile(article_file)]
+                 listdir_nohidden(directory, extension) if article_exists(article_file)]
     return filenames
 
 
@@ -134,12 +155,12 @@ def search_solr_records(days_ago=14, start=0, rows=1000, start_date=None, end_da
                                 ]
     howmanyarticles_url = ''.join(howmanyarticles_url_base) + '&rows=1000'
     # if include_uncorrected is False:
-    num_results = requests.get(howmanyarticles_url).json()["response"]["numFound"]
+    num_results = http_client.get(howmanyarticles_url).json()["response"]["numFound"]
 
     # Create solr_search_results & paginate through results
     while(start < num_results):
         query_url = ''.join(howmanyarticles_url_base) + '&start=' + str(start) + '&rows=' + str(rows)
-        article_search = requests.get(query_url).json()
+        article_search = http_client.get(query_url).json()
         solr_search_results = [x[item] for x in article_search["response"]["docs"]]
         start = start + rows
         if start + rows > num_results:
@@ -164,24 +185,29 @@ def get_all_solr_dois():
                       '10%5C.1371%5C/(journal%5C.p%5Ba-zA-Z%5D%7B3%7D%5C.%5B%5Cd%5D%7B7%7D$%7Cannotation%5C/'
                       '%5Ba-zA-Z0-9%5D%7B8%7D-%5Ba-zA-Z0-9%5D%7B4%7D-%5Ba-zA-Z0-9%5D%7B4%7D-%5Ba-zA-Z0-9%5D'
                       '%7B4%7D-%5Ba-zA-Z0-9%5D%7B12%7D$)')
-    results = requests.get(solr_magic_url).json()
+    results = http_client.get(solr_magic_url).json()
     solr_dois = [id for id in results['terms']['id'] if isinstance(id, str)]
 
     return solr_dois
 
 
-def get_dois_needed_list(comparison_list=None, directory=corpusdir):
+def get_dois_needed_list(comparison_list=None, directory=corpusdir, state=None):
     """
     Takes result of query from get_all_solr_dois and compares to local article directory.
     :param comparison_list: Defaults to creating a full list of local article files.
     :param directory: An int value indicating the first row of results to return
+    :param state: SyncState of directory; if given, local articles are looked up there instead of listing directory
     :return: A list of DOIs for articles that are not in the local article directory.
     """
     if comparison_list is None:
         comparison_list = get_all_solr_dois()
 
     # Transform local files to DOIs
-    local_article_list = [filename_to_doi(article) for article in listdir_nohidden(directory, '.xml')]
+    if state is not None:
+        state.refresh()
+        local_article_list = state.dois()
+    else:
+        local_article_list = [filename_to_doi(article) for article in listdir_nohidden(directory, '.xml')]
 
     dois_needed_list = list(set(comparison_list) - set(local_article_list))
     if dois_needed_list:
@@ -191,31 +217,21 @@ def get_dois_needed_list(comparison_list=None, directory=corpusdir):
     return dois_needed_list
 
 
-def copytree(source, destination, symlinks=False, ignore=None):
-    """
-    Copies all the files in one directory to another
-    :param source: Original directory of files
-    :param destination: Directory where files are copied to
-    :param symlinks: param from the shutil.copytree function
-    :param ignore: param from the shutil.copytree function; default is include all files
-    :return: None
-    """
-    for item in listdir_nohidden(source, include_dir=False):
-        s = os.path.join(source, item)
-        d = os.path.join(destination, item)
-        if os.path.isdir(s):
-            shutil.copytree(s, d, symlinks, ignore)
-        else:
-            shutil.copy2(s, d)
-
-
-def repo_download(dois, tempdir, ignore_existing=True, plos_network=False):
+def repo_download(dois, tempdir, ignore_existing=True, plos_network=False, max_workers=None, limits=None,
+                  retries=3, state=None):
     """
     Downloads a list of articles by DOI from PLOS's content-repo (crepo) to a temporary directory
     Use in conjunction with get_dois_needed_list
+    Articles are downloaded concurrently; see allofplos.download for the per-host rate limits
     :param dois: Iterable with DOIs for articles to obtain
     :param tempdir: Temporary directory where files are copied to
     :param ignore_existing: Don't re-download to tempdir if already downloaded
+    :param plos_network: whether to download from content-repo inside the PLOS network
+    :param max_workers: number of articles to download at the same time, defaults to max_download_workers
+    :param limits: dict of host to (requests per second, requests in flight), overrides download.host_limits
+    :param retries: how many times to retry an article before counting it as failed
+    :param state: SyncState of the corpus directory; articles already in the corpus aren't downloaded again
+    :return: dict of DOIs that failed to download mapped to their error
     """
     # make temporary directory, if needed
     try:
@@ -226,39 +242,84 @@ def repo_download(dois, tempdir, ignore_existing=True, plos_network=False):
     if ignore_existing:
         existing_articles = [filename_to_doi(file) for file in listdir_nohidden(tempdir)]
         dois = set(dois) - set(existing_articles)
-
-    max_value = len(dois)
-    bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
-    for i, doi in enumerate(sorted(dois)):
-        url = URL_TMP.format(doi)
-        articleXML = et.parse(url)
-        article_path = doi_to_path(doi, directory=tempdir)
-        # create new local XML files
-        if ignore_existing is False or ignore_existing and os.path.isfile(article_path) is False:
-            with open(article_path, 'w') as file:
-                file.write(et.tostring(articleXML, method='xml', encoding='unicode'))
-            if not plos_network:
-                time.sleep(1)
-        bar.update(i+1)
-    bar.finish()
-    print(len(listdir_nohidden(tempdir)), "new articles downloaded.")
-    logging.info(len(listdir_nohidden(tempdir)))
+    if state is not None:
+        dois = set(dois) - state.dois()
+
+    downloaded, failed = download_articles(dois,
+                                           tempdir,
+                                           plos_network=plos_network,
+                                           max_workers=max_workers,
+                                           limits=limits,
+                                           retries=retries)
+    num_downloaded = len(listdir_nohidden(tempdir))
+    print(num_downloaded, "new articles downloaded.")
+    logging.info(num_downloaded)
+    return failed
+
+
+def move_file(source, destination):
+    """
+    Move a file, replacing any file already at destination, so that readers of destination only ever
+    see the old file or the complete new one
+    On the same filesystem this is a single rename. Across filesystems the file is copied next to
+    destination under a temporary name, renamed into place and then removed from source.
+    :param source: path of the file to move
+    :param destination: path to move it to
+    :return: None
+    """
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        temp_destination = destination + '.part'
+        with open(source, 'rb') as source_file, open(temp_destination, 'wb') as destination_file:
+            shutil.copyfileobj(source_file, destination_file)
+        shutil.copystat(source, temp_destination)
+        os.replace(temp_destination, destination)
+        os.remove(source)
 
 
-def move_articles(source, destination):
+def move_articles(source, destination, state=None):
     """
     Move articles from one folder to another
+    Articles are renamed into place rather than copied when both folders are on the same filesystem.
+    If the articles in destination are compressed (see corpus_store.compress_corpus()), the moved
+    articles are compressed the same way instead.
     :param source: Temporary directory of new article files
-    :param destination: Directory where files are copied to
+    :param destination: Directory where files are moved to
+    :param state: SyncState of destination, which is updated with the moved articles instead of
+    listing destination before and after
     :return: None
     """
-    oldnum_destination = len(listdir_nohidden(destination))
-    oldnum_source = len(listdir_nohidden(source))
+    if state is not None:
+        state.refresh()
+        oldnum_destination = state.count()
+    else:
+        oldnum_destination = len(listdir_nohidden(destination))
+    source_files = listdir_nohidden(source, include_dir=False)
+    oldnum_source = len(source_files)
+    compression = get_compression(destination)
     if oldnum_source > 0:
         print('Corpus started with {0} articles.\n'
               'Moving new and updated files...'.format(oldnum_destination))
-        copytree(source, destination, ignore=ignore_func)
-        newnum_destination = len(listdir_nohidden(destination))
+        new_articles = 0
+        for file in source_files:
+            destination_file = article_path(destination, os.path.basename(file))
+            if not article_exists(destination_file):
+                new_articles += 1
+            os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+            if compression is None:
+                move_file(os.path.join(source, file), destination_file)
+            else:
+                write_article(destination_file, read_article(os.path.join(source, file)), compression)
+                os.remove(os.path.join(source, file))
+        if state is not None:
+            state.record(article_path(destination, os.path.basename(file)) for file in source_files)
+            state.mark_synced()
+            newnum_destination = state.count()
+        else:
+            newnum_destination = oldnum_destination + new_articles
         print('{0} files moved. Corpus now has {1} articles.'
               .format(oldnum_source, newnum_destination))
         logging.info("New article files moved successfully")
@@ -270,43 +331,20 @@ def move_articles(source, destination):
         shutil.rmtree(source)
 
 
-def get_article_xml(article_file, tag_path_elements=None):
+def get_article_xml(article_file, tag_path_elements=None, location=None):
     """
     For a local article file, read its XML tree
     Can also interpret DOIs
     Defaults to reading the tree location for uncorrected proofs/versions of record
-    :param article_file: the xml file for a single article
+    Locations in <front> only need the file to be read as far as the end of <front>
+    :param article_file: the xml file for a single article, or its already parsed tree
     :param tag_path_elements: xpath location in the XML tree of the article file
+    :param location: name of a location in xpaths.article_paths, instead of tag_path_elements
     :return: content of article file at that xpath location
     """
-    if tag_path_elements is None:
-        tag_path_elements = ('/',
-                             'article',
-                             'front',
-                             'article-meta',
-                             'custom-meta-group',
-                             'custom-meta',
-                             'meta-value')
-
-    try:
-        article_tree = et.parse(article_file)
-    except OSError:
-        if validate_doi(article_file):
-            article_file = doi_to_path(article_file)
-        elif article_file.endswith('xml'):
-            article_file = article_file[:-3] + 'XML'
-        elif article_file.endswith('XML'):
-            article_file = article_file[:-3] + 'xml'
-        elif article_file.endswith('nxml'):
-            article_file = article_file[:-3] + 'nxml'
-        elif not article_file.endswith('.'):
-            article_file = article_file + '.xml'
-        else:
-            article_file = article_file + 'xml'
-        article_tree = et.parse(article_file)
-    articleXML = article_tree.getroot()
-    tag_location = '/'.join(tag_path_elements)
-    return articleXML.xpath(tag_location)
+    xpath = get_xpath(tag_path_elements, name=location)
+    article_tree = parse_article_file(article_file, parse=parse_front if is_front_path(xpath.path) else parse)
+    return xpath(article_tree)
 
 
 def check_article_type(article_file):
@@ -316,9 +354,7 @@ def check_article_type(article_file):
     :param article_file: the xml file for a single article
     :return: JATS article_type at that xpath location
     """
-    article_type = get_article_xml(article_file=article_file,
-                                   tag_path_elements=["/",
-                                                      "article"])
+    article_type = get_article_xml(article_file=article_file, location='article')
     return article_type[0].attrib['article-type']
 
 
@@ -331,12 +367,7 @@ def get_related_article_doi(article_file, corrected=True):
     :param corrected: default true, part of the Corrections workflow, more strict in tag search
     :return: tuple of partial doi string at that xpath location, related_article_type
     """
-    r = get_article_xml(article_file=article_file,
-                        tag_path_elements=["/",
-                                           "article",
-                                           "front",
-                                           "article-meta",
-                                           "related-article"])
+    r = get_article_xml(article_file=article_file, location='related_article')
     related_article = ''
     if corrected:
         for x in r:
@@ -364,12 +395,7 @@ def get_article_pubdate(article_file, date_format='%d %m %Y'):
     day = ''
     month = ''
     year = ''
-    raw_xml = get_article_xml(article_file=article_file,
-                              tag_path_elements=["/",
-                                                 "article",
-                                                 "front",
-                                                 "article-meta",
-                                                 "pub-date"])
+    raw_xml = get_article_xml(article_file=article_file, location='pub_date')
     for x in raw_xml:
         for name, value in x.items():
             if value == 'epub':
@@ -413,13 +439,19 @@ def compare_article_pubdate(article, days=22):
 
 def download_updated_xml(article_file,
                          tempdir=newarticledir,
-                         vor_check=False):
+                         vor_check=False,
+                         state=None):
     """
     For an article file, compare local XML to remote XML
     If they're different, download new version of article
+    With a sync state, the request is conditional on the ETag/Last-Modified of the last check, so an
+    unchanged article comes back as an empty 304 response. Otherwise the digest of the downloaded XML
+    is compared with the digest stored the last time, and the XML is only parsed if the article may
+    have changed
     :param article_file: the filename for a single article
     :param tempdir: directory where files are downloaded to
     :param vor_check: whether checking to see if uncorrected proof is updated
+    :param state: SyncState in which the digests of checked articles are stored
     :return: boolean for whether update was available & downloaded
     """
     doi = filename_to_doi(article_file)
@@ -428,42 +460,68 @@ def download_updated_xml(article_file,
     except FileExistsError:
         pass
     url = URL_TMP.format(doi)
-    articletree_remote = et.parse(url)
-    articleXML_remote = et.tostring(articletree_remote, method='xml', encoding='unicode')
     if not article_file.endswith('.xml'):
         article_file += '.xml'
-    try:
-        articletree_local = et.parse(os.path.join(corpusdir, os.path.basename(article_file)))
-    except OSError:
-        article_file_alt = os.path.join(tempdir, os.path.basename(doi_to_path(article_file)))
-        articletree_local = et.parse(article_file_alt)
-    articleXML_local = et.tostring(articletree_local, method='xml', encoding='unicode')
+    local_file = article_path(corpusdir, os.path.basename(article_file))
+    if not article_exists(local_file):
+        local_file = os.path.join(tempdir, os.path.basename(doi_to_path(article_file)))
+    local_content = read_article(local_file)
+
+    remote_sha1 = local_sha1 = etag = last_modified = None
+    if state is not None:
+        local_sha1 = content_sha1(local_content)
+        remote = state.get_remote(doi) or {}
+        response = http_client.get_if_modified(url, etag=remote.get('etag'), last_modified=remote.get('last_modified'))
+        if response.status_code == 304:
+            if remote.get('local_sha1') == local_sha1:
+                return False
+            # the local file isn't the one the validators were stored for, so get the whole article
+            response = http_client.get(url)
+        response.raise_for_status()
+        content = response.content
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        remote_sha1 = content_sha1(content)
+        if state.is_unchanged(doi, remote_sha1, local_sha1):
+            state.record_remote(doi, remote_sha1, local_sha1, etag=etag, last_modified=last_modified)
+            return False
+    else:
+        content = http_client.get_content(url)
+
+    articletree_remote = parse(io.BytesIO(content))
+    articleXML_remote = et.tostring(articletree_remote, method='xml', encoding='unicode')
+    # article files are saved already serialized this way, so usually the local file needn't be parsed
+    articleXML_local = local_content.decode('utf-8')
+    if articleXML_remote != articleXML_local:
+        articletree_local = parse(io.BytesIO(local_content))
+        articleXML_local = et.tostring(articletree_local, method='xml', encoding='unicode')
 
     if articleXML_remote == articleXML_local:
         updated = False
         get_new = False
+        if state is not None:
+            state.record_remote(doi, remote_sha1, local_sha1, etag=etag, last_modified=last_modified)
     else:
         get_new = True
         if vor_check:
             # make sure that update is to a VOR for uncorrected proof
             get_new = False
-            path_parts = ['/',
-                          'article',
-                          'front',
-                          'article-meta',
-                          'custom-meta-group',
-                          'custom-meta',
-                          'meta-value']
-            r = articletree_remote.xpath("/".join(path_parts))
+            r = XPATHS['proof'](articletree_remote)
             for x in r:
                 if x.text == 'vor-update-to-uncorrected-proof':
                     get_new = True
                     break
         if get_new:
-            article_path = os.path.join(tempdir, os.path.basename(article_file))
-            with open(article_path, 'w') as file:
+            new_file = os.path.join(tempdir, os.path.basename(article_file))
+            with open(new_file, 'w') as file:
                 file.write(articleXML_remote)
             updated = True
+            if state is not None:
+                # matches the corpus once the new file has been moved there
+                state.record_remote(doi, remote_sha1, file_sha1(new_file), etag=etag,
+                                    last_modified=last_modified)
+        else:
+            updated = False
     return updated
 
 
@@ -479,18 +537,18 @@ def check_for_corrected_articles(directory=newarticledir, article_list=None):
     corrected_doi_list = []
     if article_list is None:
         article_list = listdir_nohidden(directory)
-    for article_file in article_list:
-        article_type = check_article_type(article_file=article_file)
+    for article_file, article_tree in prefetch_trees(article_list, parse=parse_front, advise=True):
+        article_type = check_article_type(article_file=article_tree)
         if article_type == 'correction':
-            corrected_article = get_related_article_doi(article_file)[0]
+            corrected_article = get_related_article_doi(article_tree)[0]
             corrected_doi_list.append(corrected_article)
-    corrected_article_list = [doi_to_path(doi) if os.path.exists(doi_to_path(doi)) else
+    corrected_article_list = [doi_to_path(doi) if article_exists(doi_to_path(doi)) else
                               doi_to_path(doi, directory=newarticledir) for doi in list(corrected_doi_list)]
     print(len(corrected_article_list), 'corrected articles found.')
     return corrected_article_list
 
 
-def download_corrected_articles(directory=corpusdir, tempdir=newarticledir, corrected_article_list=None):
+def download_corrected_articles(directory=corpusdir, tempdir=newarticledir, corrected_article_list=None, state=None):
     """
     For a list of articles that have been corrected, check if the xml was updated
     Many corrections don't result in XML changes
@@ -499,6 +557,7 @@ def download_corrected_articles(directory=corpusdir, tempdir=newarticledir, corr
     :param article: the filename for a single article
     :param directory: directory where the article file is, default is newarticledir
     :param tempdir: where new articles are downloaded to-
+    :param state: SyncState passed on to download_updated_xml
     :return: list of DOIs for articles downloaded with new XML versions
     """
     if corrected_article_list is None:
@@ -508,7 +567,7 @@ def download_corrected_articles(directory=corpusdir, tempdir=newarticledir, corr
     max_value = len(corrected_article_list)
     bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
     for i, article in enumerate(corrected_article_list):
-        updated = download_updated_xml(article)
+        updated = download_updated_xml(article, state=state)
         if updated:
             corrected_updated_article_list.append(article)
         bar.update(i+1)
@@ -530,28 +589,37 @@ def check_if_uncorrected_proof(article_file):
     return False
 
 
-def get_uncorrected_proofs_list():
+def scan_uncorrected_proof(article_file, article_tree):
+    """
+    For scanning the corpus with corpus_scan, check whether an article is an uncorrected proof
+    :param article_file: the xml file for a single article
+    :param article_tree: its parsed tree
+    :return: DOI of the article if it's an uncorrected proof, otherwise None
+    """
+    if check_if_uncorrected_proof(article_tree):
+        return filename_to_doi(article_file)
+    return None
+
+
+def get_uncorrected_proofs_list(processes=1, text_list=uncorrected_proofs_text_list):
     """
     Loads the uncorrected proofs txt file.
     Failing that, creates new txt file from scratch using corpusdir.
+    :param processes: number of processes to scan corpusdir with; None for one per CPU. Defaults to
+    scanning in this process, since the sync calls this, sometimes from worker threads
+    :param text_list: path to the txt file
     :return: list of DOIs of uncorrected proofs from text list
     """
     try:
-        with open(uncorrected_proofs_text_list) as file:
+        with open(text_list) as file:
             uncorrected_proofs_list = file.read().splitlines()
     except FileNotFoundError:
         print("Creating new text list of uncorrected proofs from scratch.")
         article_files = listdir_nohidden(corpusdir)
-        uncorrected_proofs_list = []
-        max_value = len(article_files)
-        bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
-        for i, article_file in enumerate(article_files):
-            bar.update(i+1)
-            if check_if_uncorrected_proof(article_file):
-                uncorrected_proofs_list.append(filename_to_doi(article_file))
-        bar.finish()
+        uncorrected_proofs_list = [doi for doi in scan_corpus(scan_uncorrected_proof, article_files,
+                                                              processes=processes) if doi]
         print("Saving uncorrected proofs.")
-        with open(uncorrected_proofs_text_list, 'w') as file:
+        with open(text_list, 'w') as file:
             max_value = len(uncorrected_proofs_list)
             bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
             for i, item in enumerate(sorted(uncorrected_proofs_list)):
@@ -572,7 +640,7 @@ def check_for_uncorrected_proofs(directory=newarticledir, text_list=uncorrected_
 
     # Read in uncorrected proofs from uncorrected_proofs_text_list txt file
     # If uncorrected_proofs_list txt file doesn't exist, build that list from scratch from main article directory
-    uncorrected_proofs_list = get_uncorrected_proofs_list()
+    uncorrected_proofs_list = get_uncorrected_proofs_list(text_list=text_list)
 
     # Check directory for uncorrected proofs
     # Append uncorrected proofs to running list
@@ -622,7 +690,7 @@ def check_for_vor_updates(uncorrected_list=None):
                               ')&fq=publication_stage:vor-update-to-uncorrected-proof&',
                               'fl=publication_stage,+id&wt=json&indent=true']
         VOR_check_url = ''.join(VOR_check_url_base)
-        vor_check = requests.get(VOR_check_url).json()['response']['docs']
+        vor_check = http_client.get(VOR_check_url).json()['response']['docs']
         vor_chunk_results = [x['id'] for x in vor_check]
         vor_updates_available.extend(vor_chunk_results)
 
@@ -636,7 +704,7 @@ def check_for_vor_updates(uncorrected_list=None):
 
 
 def download_vor_updates(directory=corpusdir, tempdir=newarticledir,
-                         vor_updates_available=None, plos_network=False):
+                         vor_updates_available=None, plos_network=False, state=None):
     """
     For existing uncorrected proofs list, check whether a vor is available to download
     Used in conjunction w/check_for_vor_updates
@@ -645,6 +713,7 @@ def download_vor_updates(directory=corpusdir, tempdir=newarticledir,
     :param directory: Directory containing the article files
     :param tempdir: Directory where updated VORs to be downloaded to
     :param vor_updates_available: Partial DOI/filenames of uncorrected articles, default None
+    :param state: SyncState passed on to download_updated_xml
     :return: List of articles from uncorrected_list for which new version successfully downloaded
     """
     if vor_updates_available is None:
@@ -652,7 +721,7 @@ def download_vor_updates(directory=corpusdir, tempdir=newarticledir,
     vor_updated_article_list = []
     if vor_updates_available:
         for article in vor_updates_available:
-            updated = download_updated_xml(article, vor_check=True)
+            updated = download_updated_xml(article, vor_check=True, state=state)
             if updated:
                 vor_updated_article_list.append(article)
 
@@ -662,7 +731,8 @@ def download_vor_updates(directory=corpusdir, tempdir=newarticledir,
     # direct remote XML check; add their totals to totals above
     if new_uncorrected_proofs_list:
         proofs_download_list = remote_proofs_direct_check(article_list=new_uncorrected_proofs_list,
-                                                          plos_network=plos_network)
+                                                          plos_network=plos_network,
+                                                          state=state)
         vor_updated_article_list.extend(proofs_download_list)
         new_uncorrected_proofs_list = list(set(new_uncorrected_proofs_list) - set(vor_updated_article_list))
         too_old_proofs = [proof for proof in new_uncorrected_proofs_list if compare_article_pubdate(proof)]
@@ -683,7 +753,7 @@ def download_vor_updates(directory=corpusdir, tempdir=newarticledir,
     return vor_updated_article_list
 
 
-def remote_proofs_direct_check(tempdir=newarticledir, article_list=None, plos_network=False):
+def remote_proofs_direct_check(tempdir=newarticledir, article_list=None, plos_network=False, state=None):
     """
     Takes list of of DOIs of uncorrected proofs and compared to raw XML of the article online
     If article status is now 'vor-update-to-uncorrected-proof', download new copy
@@ -691,6 +761,7 @@ def remote_proofs_direct_check(tempdir=newarticledir, article_list=None, plos_ne
     https://developer.plos.org/jira/browse/DPRO-3418
     :param tempdir: temporary directory for downloading articles
     :param article-list: list of uncorrected proofs to check for updates.
+    :param state: SyncState passed on to download_updated_xml
     :return: list of all articles with updated vor
     """
     try:
@@ -702,7 +773,7 @@ def remote_proofs_direct_check(tempdir=newarticledir, article_list=None, plos_ne
         article_list = get_uncorrected_proofs_list()
     for doi in list(set(article_list)):
         file = doi_to_path(doi)
-        updated = download_updated_xml(file, vor_check=True)
+        updated = download_updated_xml(file, vor_check=True, state=state)
         if updated:
             proofs_download_list.append(doi)
     if proofs_download_list:
@@ -714,7 +785,7 @@ def remote_proofs_direct_check(tempdir=newarticledir, article_list=None, plos_ne
 
 
 def download_check_and_move(article_list, text_list, tempdir, destination,
-                            plos_network=False):
+                            plos_network=False, pipeline=False, state=None, index=None):
     """
     For a list of new articles to get, first download them from content-repo to the temporary directory
     Next, check these articles for uncorrected proofs and article_type corrections
@@ -724,17 +795,35 @@ def download_check_and_move(article_list, text_list, tempdir, destination,
     :param text_list: List of uncorrected proofs to check for vor updates
     :param tempdir: Directory where articles to be downloaded to
     :param destination: Directory where new articles are to be moved to
+    :param plos_network: whether to download from content-repo inside the PLOS network
+    :param pipeline: run the downloads and checks concurrently (see sync_pipeline.py) instead of one step at a time
+    :param state: SyncState of destination, updated with the moved articles and the uncorrected proofs,
+    and used to skip parsing articles that haven't changed
+    :param index: CorpusIndex of destination, updated with the metadata of the moved articles
     """
-    repo_download(article_list, tempdir, plos_network=plos_network)
-    corrected_articles = check_for_corrected_articles(directory=tempdir)
-    download_corrected_articles(corrected_article_list=corrected_articles)
-    download_vor_updates(plos_network=plos_network)
-    check_for_uncorrected_proofs(directory=tempdir)
-    move_articles(tempdir, destination)
+    if pipeline:
+        from allofplos.sync_pipeline import SyncPipeline
+        SyncPipeline(tempdir=tempdir, text_list=text_list, plos_network=plos_network, state=state).run(article_list)
+    else:
+        repo_download(article_list, tempdir, plos_network=plos_network, state=state)
+        corrected_articles = check_for_corrected_articles(directory=tempdir)
+        download_corrected_articles(corrected_article_list=corrected_articles, state=state)
+        download_vor_updates(plos_network=plos_network, state=state)
+        check_for_uncorrected_proofs(directory=tempdir, text_list=text_list)
+    if state is not None:
+        # every proof in the corpus was just checked for a VOR update
+        state.mark_checked(state.proofs())
+    new_files = listdir_nohidden(tempdir, include_dir=False)
+    move_articles(tempdir, destination, state=state)
+    if index is not None:
+        index.update(article_path(destination, os.path.basename(file)) for file in new_files)
+    if state is not None:
+        with open(text_list) as file:
+            state.set_proofs(file.read().splitlines())
 
 
 def download_file_from_google_drive(id, filename, destination=corpusdir,
-                                    file_size=None):
+                                    file_size=None, checksum=None, resume=False, segments=1):
     """
     General method for downloading from Google Drive.
     Doesn't require using API or having credentials
@@ -742,25 +831,68 @@ def download_file_from_google_drive(id, filename, destination=corpusdir,
     :param filename: name of the zip file
     :param destination: directory where to download the zip file, defaults to corpusdir
     :param file_size: size of the file being downloaded
+    :param checksum: expected checksum of the file ('algorithm:hexdigest'), checked if resume is True
+    :param resume: download with Range requests, continuing any earlier partial download (see bulk_download.py)
+    :param segments: with resume, how many parts of the file to download at the same time
     :return: None
     """
-    URL = "https://docs.google.com/uc?export=download"
+    URL = google_drive_url
 
     file_path = os.path.join(destination, filename)
-    if not os.path.isfile(file_path):
-        session = requests.Session()
-
-        response = session.get(URL, params={'id': id}, stream=True)
+    partial_download = os.path.isfile(file_path + ranges_suffix) or \
+        (file_size is not None and os.path.isfile(file_path) and os.path.getsize(file_path) != file_size)
+    if resume and (partial_download or not os.path.isfile(file_path)):
+        resumable_download(URL, file_path, params=get_google_drive_params(id), file_size=file_size,
+                           checksum=checksum, segments=segments)
+    elif not os.path.isfile(file_path):
+        session = http_client.get_session()
+
+        response = session.get(URL, params={'id': id}, stream=True, timeout=http_client.timeout)
         token = get_confirm_token(response)
 
         if token:
             params = {'id': id, 'confirm': token}
-            response = session.get(URL, params=params, stream=True)
-            r = requests.get(URL, params=params, stream=True)
+            response = session.get(URL, params=params, stream=True, timeout=http_client.timeout)
         save_response_content(response, file_path, file_size=file_size)
     return file_path
 
 
+def download_zip_store(id, corpusdir=corpusdir, **kwargs):
+    """
+    Download a zip file from Google Drive to be read as the store of a corpus directory (see corpus_store.ZipStore)
+    The file is downloaded under a temporary name, and only renamed to where get_store() looks for it
+    once it's complete, so a partial download is never opened as the corpus.
+    :param id: Google Drive id for the zip file
+    :param corpusdir: corpus directory
+    :param kwargs: passed to download_file_from_google_drive(), like file_size, checksum and resume
+    :return: path to the zip file
+    """
+    zip_path = get_zip_path(corpusdir)
+    if not os.path.isfile(zip_path):
+        temp_path = download_file_from_google_drive(id, os.path.basename(zip_path) + partial_zip_suffix,
+                                                    destination=os.path.dirname(zip_path), **kwargs)
+        if not zipfile.is_zipfile(temp_path):
+            os.remove(temp_path)
+            raise OSError("Downloaded file for {} isn't a complete zip file".format(zip_path))
+        os.replace(temp_path, zip_path)
+    return zip_path
+
+
+def get_google_drive_params(id):
+    """
+    Query parameters for downloading a file from Google Drive, including the token
+    Google Drive asks for to confirm downloading large files
+    :param id: Google Drive id for file (constant even if filename change)
+    :return: dict of query parameters for google_drive_url
+    """
+    response = http_client.get(google_drive_url, params={'id': id}, stream=True)
+    token = get_confirm_token(response)
+    response.close()
+    if token:
+        return {'id': id, 'confirm': token}
+    return {'id': id}
+
+
 def get_confirm_token(response):
     """
     Part of keep-alive method for downloading large files from Google Drive
@@ -785,7 +917,7 @@ def save_response_content(response, download_path, file_size=None):
     """
     CHUNK_SIZE = 32768
     # for downloading zip file
-    if os.path.basename(download_path) == local_zip:
+    if os.path.basename(download_path) == local_zip and file_size is not None:
         with open(download_path, "wb") as f:
             size = file_size
             pieces = round(size / CHUNK_SIZE)
@@ -820,10 +952,26 @@ def get_zip_metadata(method='initial'):
     return zip_date, zip_size, metadata_path
 
 
+def get_zip_checksum(metadata_path):
+    """
+    Reads the checksum of the zip file from the metadata txt file, if it has one
+    The checksum is on the line after the zip size, as 'algorithm:hexdigest' or a bare md5 hexdigest
+    :param metadata_path: location of the metadata txt file
+    :return: checksum string, or None if the metadata doesn't include one
+    """
+    with open(metadata_path) as f:
+        zip_stats = f.read().splitlines()
+    if len(zip_stats) > 2 and zip_stats[2].strip():
+        return zip_stats[2].strip()
+    return None
+
+
 def unzip_articles(file_path,
                    extract_directory=corpusdir,
                    filetype='zip',
-                   delete_file=True
+                   delete_file=True,
+                   processes=1,
+                   skip_existing=False
                    ):
     """
     Unzips zip file of all of PLOS article XML to specified directory
@@ -831,6 +979,10 @@ def unzip_articles(file_path,
     :param extract_directory: directory where articles are copied to
     :param filetype: whether a 'zip' or 'tar' file (tarball), which use different decompression libraries
     :param delete_file: whether to delete the compressed archive after extracting articles
+    :param processes: for zip files, how many processes extract articles at the same time.
+    None uses every CPU.
+    :param skip_existing: for zip files, don't rewrite articles already in extract_directory with the
+    same size and CRC, so extracting over a partly populated directory only writes what's missing
     :return: None
     """
     try:
@@ -839,57 +991,91 @@ def unzip_articles(file_path,
         if e.errno != errno.EEXIST:
             raise
 
-    if filetype == 'zip':
-        with zipfile.ZipFile(file_path, "r") as zip_ref:
+    try:
+        if filetype == 'zip':
+            # extract_zip() puts articles where the layout of extract_directory has them
             print("Extracting zip file...")
-            zip_ref.extractall(extract_directory)
+            extracted, skipped = extract_zip(file_path, extract_directory, processes=processes,
+                                             skip_existing=skip_existing)
+            if skipped:
+                print("{} files already extracted.".format(skipped))
             print("Extraction complete.")
-    elif filetype == 'tar':
-        tar = tarfile.open(file_path)
-        print("Extracting tar file...")
-        tar.extractall(path=extract_directory)
-        tar.close()
-        print("Extraction complete.")
+        elif filetype == 'tar':
+            tar = tarfile.open(file_path)
+            print("Extracting tar file...")
+            tar.extractall(path=extract_directory)
+            tar.close()
+            if get_layout(extract_directory) == SHARDED:
+                migrate_layout(extract_directory, SHARDED)
+            print("Extraction complete.")
+    finally:
+        # files added to existing shards don't change the directory, so the sync state has to list it again
+        invalidate_state(extract_directory)
 
     if delete_file:
         os.remove(file_path)
 
 
-def create_local_plos_corpus(corpusdir=corpusdir, rm_metadata=True):
+def create_local_plos_corpus(corpusdir=corpusdir, rm_metadata=True, segments=1, stream=False, processes=None,
+                             zip_store=False):
     """
     Downloads a fresh copy of the PLOS corpus by:
     1) creating corpusdir if it doesn't exist
     2) downloading metadata about the .zip of all PLOS XML
-    2) downloading the zip file (defaults to corpus directory)
+    2) downloading the zip file (defaults to corpus directory), resuming an interrupted download,
+    and checking its size (and checksum, if in the metadata) against the metadata
     3) extracting the individual XML files into the corpus directory
     :param corpusdir: directory where the corpus is to be downloaded and extracted
     :param rm_metadata: COMPLETE HERE
+    :param segments: how many parts of the zip file to download at the same time
+    :param stream: extract the articles while the zip file downloads, without saving the zip file.
+    Needs about half the disk space, and articles can be used before the download finishes.
+    :param processes: how many processes extract the zip file at the same time, defaults to every CPU
+    :param zip_store: don't extract the zip file, but keep it next to corpusdir and read articles
+    from it as they're needed (see corpus_store.ZipStore). Updated articles are still saved in corpusdir
     :return: None
     """
+    if stream and zip_store:
+        raise ValueError("A streamed download isn't saved, so it can't be used as a zip store")
     if os.path.isdir(corpusdir) is False:
         os.mkdir(corpusdir)
         print('Creating folder for article xml')
     zip_date, zip_size, metadata_path = get_zip_metadata()
-    zip_path = download_file_from_google_drive(zip_id, local_zip, file_size=zip_size)
-    unzip_articles(file_path=zip_path)
+    if zip_store:
+        zip_checksum = get_zip_checksum(metadata_path)
+        download_zip_store(zip_id, corpusdir, file_size=zip_size, checksum=zip_checksum, resume=True,
+                           segments=segments)
+    elif stream:
+        stream_unzip(google_drive_url, corpusdir, params=get_google_drive_params(zip_id), file_size=zip_size)
+    else:
+        zip_checksum = get_zip_checksum(metadata_path)
+        zip_path = download_file_from_google_drive(zip_id, local_zip, file_size=zip_size, checksum=zip_checksum,
+                                                   resume=True, segments=segments)
+        # articles already in corpusdir from an earlier, interrupted extraction are skipped
+        unzip_articles(file_path=zip_path, extract_directory=corpusdir, processes=processes, skip_existing=True)
     if rm_metadata:
         os.remove(metadata_path)
 
 
-def create_test_plos_corpus(corpusdir=corpusdir):
+def create_test_plos_corpus(corpusdir=corpusdir, zip_store=False):
     """
     Downloads a copy of 10,000 randomly selected PLOS articles by:
     1) creating corpusdir if it doesn't exist
     2) downloading the zip file (defaults to corpus directory)
     3) extracting the individual XML files into the corpus directory
     :param corpusdir: directory where the corpus is to be downloaded and extracted
+    :param zip_store: don't extract the zip file, but keep it next to corpusdir and read articles
+    from it as they're needed (see corpus_store.ZipStore)
     :return: None
     """
     if os.path.isdir(corpusdir) is False:
         os.mkdir(corpusdir)
         print('Creating folder for article xml')
-    zip_path = download_file_from_google_drive(test_zip_id, local_test_zip)
-    unzip_articles(file_path=zip_path, extract_directory=corpusdir)
+    if zip_store:
+        download_zip_store(test_zip_id, corpusdir)
+    else:
+        zip_path = download_file_from_google_drive(test_zip_id, local_test_zip)
+        unzip_articles(file_path=zip_path, extract_directory=corpusdir)
 
 
 def download_corpus_metadata_files(csv_abstracts=True, csv_no_abstracts=True, sqlitedb=True, destination=None):
@@ -934,7 +1120,25 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--plos', action='store_true', help=
                         'Used when inside the plos network')
+    parser.add_argument('--pipeline', action='store_true', help=
+                        'Download and check new articles concurrently')
+    parser.add_argument('--stream', action='store_true', help=
+                        'Extract the initial corpus while the zip file downloads')
+    parser.add_argument('--layout', choices=layouts, help=
+                        'Move the article files of the corpus to this layout in place, and exit')
+    parser.add_argument('--index', action='store_true', help=
+                        'Build the metadata index of the corpus, or bring it up to date, and exit')
     args = parser.parse_args()
+    if args.layout:
+        moved = migrate_layout(corpusdir, args.layout)
+        print('{0} files moved. Corpus layout is now {1}.'.format(moved, args.layout))
+        return None
+    if args.index:
+        with CorpusIndex(corpusdir) as index:
+            indexed, removed = index.build()
+            print('{0} articles indexed, {1} removed. Index now has {2} articles.'
+                  .format(indexed, removed, index.count()))
+        return None
     plos_network = False
     if args.plos:
         URL_TMP = INT_URL_TMP
@@ -942,36 +1146,49 @@ def main():
     else:
         URL_TMP = EXT_URL_TMP
     # Step 0: Initialize first copy of repository]
+    # The sync state records what's in corpusdir, so it doesn't have to be listed on every run
+    state = SyncState(corpusdir)
+    index = None
     try:
-        corpus_files = [name for name in os.listdir(corpusdir) if os.path.isfile(
-                        os.path.join(corpusdir, name))]
-    except FileNotFoundError:
-        corpus_files = []
-    if len(corpus_files) < min_files_for_valid_corpus:
-        print('Not enough articles in corpusdir, re-downloading zip file')
-        # TODO: check if zip file is in top-level directory before downloading
-        create_local_plos_corpus()
-
-    # Step 1: Query solr via URL and construct DOI list
-        # Filtered by article type & scheduled for the last 14 days.
-        # Returns specific URL query & the number of search results.
-        # Parses the returned dictionary of article DOIs, removing common leading numbers, as a list.
-        # Compares to list of existing articles in the PLOS corpus folder to create list of DOIs to download.
-    dois_needed_list = get_dois_needed_list()
-
-    # Step 2: Download new articles
-        # For every doi in dois_needed_list, grab the accompanying XML from content-repo
-        # If no new articles, don't run any other cells
-        # Check if articles are uncorrected proofs
-        # Check if corrected articles linked to new corrections articles are updated
-        # Merge new XML into folder
-        # If need to bulk download, please start here:
-        # https://drive.google.com/open?id=0B_JDnoghFeEKLTlJT09IckMwOFk
-    download_check_and_move(dois_needed_list,
-                            uncorrected_proofs_text_list,
-                            tempdir=newarticledir,
-                            destination=corpusdir,
-                            plos_network=plos_network)
+        # once built with --index, the metadata index is kept up to date by every sync
+        if os.path.isfile(get_index_path(corpusdir)):
+            index = CorpusIndex(corpusdir)
+        state.refresh()
+        if state.count() < min_files_for_valid_corpus:
+            print('Not enough articles in corpusdir, re-downloading zip file')
+            # TODO: check if zip file is in top-level directory before downloading
+            create_local_plos_corpus(stream=args.stream)
+            state.refresh(force=True)
+            if index is not None:
+                index.build()
+
+        # Step 1: Query solr via URL and construct DOI list
+            # Filtered by article type & scheduled for the last 14 days.
+            # Returns specific URL query & the number of search results.
+            # Parses the returned dictionary of article DOIs, removing common leading numbers, as a list.
+            # Compares to list of existing articles in the PLOS corpus folder to create list of DOIs to download.
+        dois_needed_list = get_dois_needed_list(state=state)
+
+        # Step 2: Download new articles
+            # For every doi in dois_needed_list, grab the accompanying XML from content-repo
+            # If no new articles, don't run any other cells
+            # Check if articles are uncorrected proofs
+            # Check if corrected articles linked to new corrections articles are updated
+            # Merge new XML into folder
+            # If need to bulk download, please start here:
+            # https://drive.google.com/open?id=0B_JDnoghFeEKLTlJT09IckMwOFk
+        download_check_and_move(dois_needed_list,
+                                uncorrected_proofs_text_list,
+                                tempdir=newarticledir,
+                                destination=corpusdir,
+                                plos_network=plos_network,
+                                pipeline=args.pipeline,
+                                state=state,
+                                index=index)
+    finally:
+        state.close()
+        if index is not None:
+            index.close()
     return None
 
 if __name__ == "__main__":
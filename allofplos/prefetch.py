@@ -0,0 +1,167 @@
+"""Reading article files ahead of parsing them.
+
+A pass over the corpus alternates between waiting for a file to be read and parsing it.
+prefetch_files() reads the next files on background threads while the caller parses the
+current one, so reading and parsing overlap. filesystem_order() sorts files by inode number,
+which for most filesystems is close to the order their data was written in, so reads
+are closer to sequential than in alphabetical order.
+
+Where the OS supports it, prefetch_files() can also tell the kernel about files further
+ahead with posix_fadvise(), so the kernel starts reading them into the page cache before
+the threads get to them. This helps most on network filesystems and cold caches. The hints
+are given by the reading threads along with their reads, so the thread that uses the files
+doesn't make any extra system calls.
+"""
+
+import collections
+import io
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from allofplos import corpus_store, parsers
+from allofplos.corpus_layout import article_path, corpus_directory
+from allofplos.transformations import strip_compressed_suffix
+
+# Number of files read ahead of the one being handed out, and threads reading them
+default_depth = 64
+default_workers = 4
+
+
+def filesystem_order(paths):
+    """
+    Sort files in the order they're stored in, by inode number
+    Each directory is listed once to find the inode numbers, so no file is opened or stat'ed.
+    Articles in the pack store of their directory (see corpus_store) come after the files, in
+    the order they are in the pack.
+    :param paths: paths to files
+    :return: list of the paths; files that weren't found are sorted last, by name
+    """
+    paths = list(paths)
+    inodes = {}
+    offsets = {}
+    for directory in {os.path.dirname(path) for path in paths}:
+        try:
+            for entry in os.scandir(directory or os.curdir):
+                # compressed article files are listed by the name of the XML file they hold
+                inodes.setdefault(os.path.join(directory, strip_compressed_suffix(entry.name)), entry.inode())
+        except FileNotFoundError:
+            pass
+    for directory in {corpus_directory(path) for path in paths}:
+        store = corpus_store.get_store(directory or os.curdir)
+        if store is not None:
+            for filename in store.filenames():
+                offsets[article_path(directory, filename)] = store.offset(store.find(filename))
+
+    def order(path):
+        if path in inodes:
+            return 0, inodes[path], path
+        if path in offsets:
+            return 1, offsets[path], path
+        return 2, 0, path
+    return sorted(paths, key=order)
+
+
+def read_file(path):
+    """
+    :param path: path to a file, or to an article in a pack store (see corpus_store.read_article())
+    :return: contents of the file as bytes, or None if there's no such file
+    """
+    try:
+        return corpus_store.read_article(path)
+    except FileNotFoundError:
+        return None
+
+
+def advise_file(path):
+    """
+    Tell the kernel that a file will be read soon, so it can start reading it into the page cache
+    Does nothing if the file can't be opened, or posix_fadvise() isn't available.
+    :param path: path to a file
+    :return: None
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def pair_ahead(paths, depth):
+    """
+    Pair each path with the path depth places after it
+    :param paths: paths to files
+    :param depth: how far ahead the second path of each pair is
+    :return: generator of tuples of path, path depth places later (None for the last depth paths)
+    """
+    window = collections.deque()
+    for path in paths:
+        window.append(path)
+        if len(window) > depth:
+            yield window.popleft(), path
+    while window:
+        yield window.popleft(), None
+
+
+def advise_and_read(path, advise_path=None):
+    """
+    :param path: path to a file to read
+    :param advise_path: path to a file to call advise_file() on first, or None
+    :return: contents of the file at path, see read_file()
+    """
+    if advise_path is not None:
+        advise_file(advise_path)
+    return read_file(path)
+
+
+def prefetch_files(paths, depth=default_depth, workers=default_workers, advise=False):
+    """
+    Read files on background threads, up to depth files ahead of the one being yielded
+    :param paths: paths to files, in the order to read them
+    :param depth: how many files to read ahead
+    :param workers: number of threads reading files
+    :param advise: also hint the next depth files after those to the kernel, see advise_file();
+    the hints are given by the threads reading the files
+    :return: generator of tuples of path, contents as bytes (None if there's no such file)
+    """
+    if advise:
+        reads = pair_ahead(paths, depth)
+    else:
+        reads = ((path, None) for path in paths)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for path, advise_path in itertools.islice(reads, depth):
+                pending.append((path, executor.submit(advise_and_read, path, advise_path)))
+            while pending:
+                path, future = pending.popleft()
+                for next_path, advise_path in itertools.islice(reads, 1):
+                    pending.append((next_path, executor.submit(advise_and_read, next_path, advise_path)))
+                yield path, future.result()
+        finally:
+            # if the caller stopped early, don't read the files that are still queued
+            for _, future in pending:
+                future.cancel()
+
+
+def prefetch_trees(article_files, parse=parsers.parse, **kwargs):
+    """
+    Parse article files in order, reading the next ones ahead on background threads
+    For corpus scans with functions that take an article file, like plos_corpus.check_article_type(),
+    which also accept the parsed tree instead.
+    :param article_files: paths to article files
+    :param parse: function that parses a file-like object into a tree, like tree_cache.parse_front
+    :param kwargs: passed to prefetch_files()
+    :return: generator of tuples of article file, its parsed tree; if the file couldn't be read
+    (for instance because it's a DOI), the article file again instead of the tree
+    """
+    for article_file, content in prefetch_files(article_files, **kwargs):
+        if content is None:
+            yield article_file, article_file
+        else:
+            yield article_file, parse(io.BytesIO(content))
@@ -10,14 +10,20 @@ examples of analysis. It can:
 import collections
 import csv
 import datetime
-import lxml.etree as et
+import functools
 import os
-import progressbar
 import random
-import requests
 
+from allofplos import http_client
+from allofplos.article_fields import ArticleParts, extract_fields, get_journal, parse_article_file
+from allofplos.corpus_scan import get_checkpoint_path, map_corpus, scan_corpus
+from allofplos.corpus_store import article_exists
+from allofplos.parsers import parse
 from allofplos.plos_regex import (validate_doi, corpusdir, newarticledir, full_doi_regex_match, validate_url, currents_doi_filter)
+from allofplos.prefetch import prefetch_trees
+from allofplos.sync_state import SyncState
 from allofplos.transformations import (filename_to_doi, doi_to_path, doi_to_url)
+from allofplos.tree_cache import parse_front
 from allofplos.plos_corpus import (listdir_nohidden, check_article_type, get_article_xml, uncorrected_proofs_text_list,
                          get_related_article_doi, download_updated_xml, get_all_solr_dois, get_article_pubdate,
                          download_check_and_move)
@@ -25,6 +31,8 @@ from allofplos.plos_corpus import (listdir_nohidden, check_article_type, get_art
 counter = collections.Counter
 pmcdir = "pmc_articles"
 max_invalid_files_to_print = 100
+# Number of articles checked for updates between saves of the revision date check's progress
+revisiondate_chunk_size = 100
 pmcdir = 'pmc_articles'
 
 
@@ -62,7 +70,7 @@ def validate_corpus(corpusdir=corpusdir):
         else:
             print("Invalid filenames: {}".format(set(plos_valid_dois) - set(plos_valid_filenames)))
             return False
-        plos_valid_files = [article for article in plos_valid_filenames if os.path.isfile(article)]
+        plos_valid_files = [article for article in plos_valid_filenames if article_exists(article)]
         if set(plos_valid_filenames) == set(plos_valid_files):
             return True
         else:
@@ -85,8 +93,8 @@ def get_jats_article_type_list(article_list=None, directory=corpusdir):
 
     jats_article_type_list = []
 
-    for article_file in article_list:
-        jats_article_type = check_article_type(article_file=article_file)
+    for article_file, article_tree in prefetch_trees(article_list, parse=parse_front, advise=True):
+        jats_article_type = check_article_type(article_file=article_tree)
         jats_article_type_list.append(jats_article_type)
 
     print(len(set(jats_article_type_list)), 'types of articles found.')
@@ -95,22 +103,7 @@ def get_jats_article_type_list(article_list=None, directory=corpusdir):
 
 
 def get_plos_article_type(article_file):
-    article_categories = get_article_xml(article_file=article_file,
-                                         tag_path_elements=["/",
-                                                            "article",
-                                                            "front",
-                                                            "article-meta",
-                                                            "article-categories"])
-    subject_list = article_categories[0].getchildren()
-
-    for i, subject in enumerate(subject_list):
-        if subject.get('subj-group-type') == "heading":
-            subject_instance = subject_list[i][0]
-            s = ''
-            for text in subject_instance.itertext():
-                s = s + text
-                PLOS_article_type = s
-    return PLOS_article_type
+    return extract_fields(article_file, ['plostype'])['plostype']
 
 
 def get_plos_article_type_list(article_list=None):
@@ -133,19 +126,7 @@ def get_article_dtd(article_file):
     """
     For more information on these DTD tagsets, see https://jats.nlm.nih.gov/1.1d3/ and https://dtd.nlm.nih.gov/3.0/
     """
-    try:
-        dtd = get_article_xml(article_file=article_file,
-                              tag_path_elements=["/",
-                                                 "article"])
-        dtd = dtd[0].attrib['dtd-version']
-        if str(dtd) == '3.0':
-            dtd = 'NLM 3.0'
-        elif dtd == '1.1d3':
-            dtd = 'JATS 1.1d3'
-    except KeyError:
-        print('Error parsing DTD from', article_file)
-        dtd = 'N/A'
-    return dtd
+    return extract_fields(article_file, ['dtd'])['dtd']
 
 
 # Get tuples of article types mapped for all PLOS articles
@@ -185,7 +166,7 @@ def check_if_link_works(url):
     '''See if a link is valid (i.e., returns a '200' to the HTML request).
     Used for checking a URL to a PLOS article on journals.plos.org
     '''
-    request = requests.get(url)
+    request = http_client.get(url)
     if request.status_code == 200:
         return True
     elif request.status_code == 404:
@@ -210,21 +191,32 @@ def get_related_retraction_article(article_file):
             print('Accompanying retracted article not found for', article)
 
 
-def get_retracted_doi_list(article_list=None, directory=corpusdir):
+def scan_retraction(article_file, article_tree):
+    """
+    For scanning the corpus with corpus_scan: the DOI of the article retracted by a retraction notification
+    :return: DOI of the retracted article if the article is a retraction, otherwise None
+    """
+    if check_if_retraction_article(article_tree):
+        return get_related_retraction_article(article_tree)[0]
+    return None
+
+
+def get_retracted_doi_list(article_list=None, directory=corpusdir, processes=None):
     """
     Scans through articles in a directory to see if they are retraction notifications,
     scans articles that are that type to find DOIs of retracted articles
+    :param processes: number of processes to scan with, defaults to the number of CPUs
     :return: tuple of lists of DOIs for retractions articles, and retracted articles
     """
     retractions_doi_list = []
     retracted_doi_list = []
     if article_list is None:
         article_list = listdir_nohidden(directory)
-    for article_file in article_list:
-        if check_if_retraction_article(article_file):
+    # Look in retraction articles to find actual articles that are retracted
+    retracted_dois = scan_corpus(scan_retraction, article_list, processes=processes)
+    for article_file, retracted_doi in zip(article_list, retracted_dois):
+        if retracted_doi is not None:
             retractions_doi_list.append(filename_to_doi(article_file))
-            # Look in those articles to find actual articles that are retracted
-            retracted_doi = get_related_retraction_article(article_file)[0]
             retracted_doi_list.append(retracted_doi)
             # check linked DOI for accuracy
             if make_regex_bool(full_doi_regex_match.search(retracted_doi)) is False:
@@ -237,12 +229,23 @@ def get_retracted_doi_list(article_list=None, directory=corpusdir):
     return retractions_doi_list, retracted_doi_list
 
 
-def get_corrected_article_list(article_list=None, directory=corpusdir):
+def scan_correction(article_file, article_tree):
+    """
+    For scanning the corpus with corpus_scan: the DOI of the article corrected by a correction notification
+    :return: DOI of the corrected article if the article is a correction, otherwise None
+    """
+    if check_article_type(article_tree) == 'correction':
+        return get_related_article_doi(article_tree, corrected=True)[0]
+    return None
+
+
+def get_corrected_article_list(article_list=None, directory=corpusdir, processes=None):
     """
     Scans through articles in a directory to see if they are correction notifications,
     scans articles that are that type to find DOI substrings of corrected articles
     :param article: the filename for a single article
     :param directory: directory where the article file is, default is corpusdir
+    :param processes: number of processes to scan with, defaults to the number of CPUs
     :return: list of DOIs for articles issued a correction
     """
     corrections_article_list = []
@@ -250,13 +253,11 @@ def get_corrected_article_list(article_list=None, directory=corpusdir):
     if article_list is None:
         article_list = listdir_nohidden(directory)
 
-    # check for corrections article type
-    for article_file in article_list:
-        article_type = check_article_type(article_file)
-        if article_type == 'correction':
+    # check for corrections article type, and get the linked DOI of the corrected article
+    corrected_dois = scan_corpus(scan_correction, article_list, processes=processes)
+    for article_file, corrected_article in zip(article_list, corrected_dois):
+        if corrected_article is not None:
             corrections_article_list.append(article_file)
-            # get the linked DOI of the corrected article
-            corrected_article = get_related_article_doi(article_file, corrected=True)[0]
             corrected_article_list.append(corrected_article)
             # check linked DOI for accuracy
             if make_regex_bool(full_doi_regex_match.search(corrected_article)) is False:
@@ -267,26 +268,44 @@ def get_corrected_article_list(article_list=None, directory=corpusdir):
 
 # These functions are for checking for silent XML updates
 
-def create_pubdate_dict(directory=corpusdir):
+def scan_article_pubdate(article_file, article_tree):
+    """For scanning the corpus with corpus_scan: the article's pubdate, see get_article_pubdate()"""
+    return get_article_pubdate(article_tree)
+
+
+def create_pubdate_dict(directory=corpusdir, processes=1):
     """
     For articles in directory, create a dictionary mapping them to their pubdate.
     Used for truncating the revisiondate_sanity_check to more recent articles only
+    :param processes: number of processes to scan with, None for one per CPU; defaults to this process
     :return: a dictionary mapping article files to datetime objects of their pubdates
     """
     articles = listdir_nohidden(directory)
-    pubdates = {article: get_article_pubdate(article) for article in articles}
+    pubdates = dict(map_corpus(scan_article_pubdate, articles, processes=processes))
     return pubdates
 
 
-def revisiondate_sanity_check(article_list=None, tempdir=newarticledir, directory=corpusdir, truncated=True):
+def scan_updated_xml(article_file, article_tree, state=None):
+    """For scanning articles with corpus_scan: whether the article has an update, see download_updated_xml()"""
+    return download_updated_xml(article_file=article_file, state=state)
+
+
+def revisiondate_sanity_check(article_list=None, tempdir=newarticledir, directory=corpusdir, truncated=True,
+                              checkpoint=None, processes=1):
     """
     :param truncated: if True, restrict articles to only those with pubdates from the last year or two
+    :param processes: number of processes that read pubdates when truncating, None for one per CPU;
+    defaults to this process, since the check goes on to make requests and write the sync state
+    :param checkpoint: path to a file that progress is saved to, so an interrupted check can be restarted
+    where it stopped, like corpus_scan.get_checkpoint_path('revisiondate', directory); off by default,
+    because saved results don't notice articles that PLOS updated since they were saved
+    Digests of the checked articles are kept in the corpus's sync state, so articles that haven't
+    changed since the last check aren't parsed again
     """
-    list_provided = bool(article_list)
     if article_list is None and truncated is False:
         article_list = listdir_nohidden(directory)
     if article_list is None and truncated:
-        pubdates = create_pubdate_dict(directory=directory)
+        pubdates = create_pubdate_dict(directory=directory, processes=processes)
         article_list = sorted(pubdates, key=pubdates.__getitem__, reverse=True)
         article_list = article_list[:30000]
 
@@ -294,17 +313,11 @@ def revisiondate_sanity_check(article_list=None, tempdir=newarticledir, director
         os.mkdir(tempdir)
     except FileExistsError:
         pass
-    articles_different_list = []
-    max_value = len(article_list)
-    bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
-    for i, article_file in enumerate(article_list):
-        updated = download_updated_xml(article_file=article_file)
-        if updated:
-            articles_different_list.append(article_file)
-        if list_provided:
-            article_list.remove(article_file)  # helps save time if need to restart process
-        bar.update(i+1)
-    bar.finish()
+    with SyncState(directory) as state:
+        # requests to PLOS are made one at a time, so the check runs in this process
+        updates = map_corpus(functools.partial(scan_updated_xml, state=state), article_list, parse=None,
+                             processes=1, chunk_size=revisiondate_chunk_size, checkpoint=checkpoint)
+        articles_different_list = [article_file for article_file, updated in updates if updated]
     print(len(article_list), "article checked for updates.")
     print(len(articles_different_list), "articles have updates.")
     return articles_different_list
@@ -314,12 +327,7 @@ def revisiondate_sanity_check(article_list=None, tempdir=newarticledir, director
 
 
 def get_article_doi(article_file):
-    raw_xml = get_article_xml(article_file=article_file,
-                              tag_path_elements=["/",
-                                                 "article",
-                                                 "front",
-                                                 "article-meta",
-                                                 "article-id"])
+    raw_xml = get_article_xml(article_file=article_file, location='article_id')
     for x in raw_xml:
         for name, value in x.items():
             if value == 'doi':
@@ -328,10 +336,16 @@ def get_article_doi(article_file):
     return doi
 
 
-def article_doi_sanity_check(directory=corpusdir, article_list=None, source='solr'):
+def scan_article_doi(article_file, article_tree):
+    """For scanning the corpus with corpus_scan: the DOI in the article's DOI field, see get_article_doi()"""
+    return get_article_doi(article_tree)
+
+
+def article_doi_sanity_check(directory=corpusdir, article_list=None, source='solr', processes=None):
     """
     For every article in a directory, make sure that the DOI field is both valid and matches
     the file name, if applicable. Prints invalid DOIs that don't match regex.
+    :param processes: number of processes to scan with, defaults to the number of CPUs
     :return: list of articles where the filename does not match the linked DOI
     """
     messed_up_articles = []
@@ -340,7 +354,8 @@ def article_doi_sanity_check(directory=corpusdir, article_list=None, source='sol
             article_list = listdir_nohidden(pmcdir, extension='.nxml')
         elif source == 'solr':
             article_list = listdir_nohidden(corpusdir)
-    doifile_dict = {get_article_doi(article_file=article_file): article_file for article_file in article_list}
+    doifile_dict = {doi: article_file for article_file, doi in map_corpus(scan_article_doi, article_list,
+                                                                          processes=processes)}
     doi_list = list(doifile_dict.keys())
     # check for PLOS regular regex
     bad_doi_list = [doi for doi in full_doi_filter(doi_list) if doi is not False]
@@ -415,7 +430,7 @@ def check_solr_doi(doi):
     For an article doi, see if there's a record of it in Solr.
     '''
     solr_url = 'http://api.plos.org/search?q=*%3A*&fq=doc_type%3Afull&fl=id,&wt=json&indent=true&fq=id:%22{}%22'.format(doi)
-    article_search = requests.get(solr_url).json()
+    article_search = http_client.get(solr_url).json()
     return bool(article_search['response']['numFound'])
 
 
@@ -430,7 +445,7 @@ def check_if_doi_resolves(doi, plos_valid=True):
     url = "http://dx.doi.org/" + doi
     if check_if_link_works(url):
         headers = {"accept": "application/vnd.citationstyles.csl+json"}
-        r = requests.get(url, headers=headers)
+        r = http_client.get(url, headers=headers)
         r_doi = r.json()['DOI']
         if r_doi == doi:
             return 'works'
@@ -494,33 +509,10 @@ def get_plos_journal(article_file, caps_fixed=True):
     :param caps_fixed: whether to render the journal name correctly or as-is
     :return: PLOS journal at specified xpath location
     """
-    try:
-        journal = get_article_xml(article_file=article_file,
-                                  tag_path_elements=["/",
-                                                     "article",
-                                                     "front",
-                                                     "journal-meta",
-                                                     "journal-title-group",
-                                                     "journal-title"])
-        journal = journal[0].text
-    except IndexError:
-        # Need to file ticket for this
-        journal_meta = get_article_xml(article_file='allofplos_xml/journal.pone.0047704.xml',
-                                       tag_path_elements=["/",
-                                                          "article",
-                                                          "front",
-                                                          "journal-meta"])
-        for journal_child in journal_meta[0]:
-            if journal_child.attrib['journal-id-type'] == 'nlm-ta':
-                journal = journal_child.text
-                break
-
     if caps_fixed:
-        journal = journal.split()
-        if journal[0].lower() == 'plos':
-            journal[0] = "PLOS"
-        journal = (' ').join(journal)
-    return journal
+        return extract_fields(article_file, ['journal'])['journal']
+    parts = ArticleParts(parse_article_file(article_file, parse=parse_front).getroot(), label=article_file)
+    return get_journal(parts, caps_fixed=False)
 
 
 def get_article_title(article_file):
@@ -529,15 +521,7 @@ def get_article_title(article_file):
     :param article_file: individual local PLOS XML article
     :return: string of article title at specified xpath location
     """
-    title = get_article_xml(article_file=article_file,
-                            tag_path_elements=["/",
-                                               "article",
-                                               "front",
-                                               "article-meta",
-                                               "title-group",
-                                               "article-title"])
-    title_text = et.tostring(title[0], encoding='unicode', method='text')
-    return title_text
+    return extract_fields(article_file, ['title'])['title']
 
 
 def parse_article_date(date_element, date_format='%d %m %Y'):
@@ -584,67 +568,16 @@ def get_article_abstract(article_file):
     :param article_file: individual local PLOS XML article
     :return: plain-text string of content in abstract
     """
-    abstract = get_article_xml(article_file, tag_path_elements=["/",
-                                                                "article",
-                                                                "front",
-                                                                "article-meta",
-                                                                "abstract"])
-    try:
-        abstract_text = et.tostring(abstract[0], encoding='unicode', method='text')
-    except IndexError:
-        if check_article_type(article_file) == 'research-article' and \
-          get_plos_article_type(article_file) == 'Research Article':
-            print('No abstract found for research article {}'.format(filename_to_doi(article_file)))
-
-        abstract_text = ''
-
-    # clean up text: rem white space, new line marks, blank lines
-    abstract_text = abstract_text.strip().replace('  ', '')
-    abstract_text = os.linesep.join([s for s in abstract_text.splitlines() if s])
+    return extract_fields(article_file, ['abstract'], label=filename_to_doi(article_file))['abstract']
 
-    return abstract_text
 
-
-def get_article_dates(article_file, string_=False):
+def get_wrong_date_strings(dates, article_file):
     """
-    For an individual article, get all of its dates
+    Check whether an article was received before it was accepted, and accepted before it was published
+    :param dates: dict of date types mapped to datetime objects for the article
     :param article_file: file path/DOI of the article
-    :return: tuple of dict of date types mapped to datetime objects for that article, dict for date strings if wrong order
+    :return: dict of date strings and the article's DOI if the dates are in the wrong order, otherwise ''
     """
-    dates = {}
-
-    tag_path_1 = ["/",
-                  "article",
-                  "front",
-                  "article-meta",
-                  "pub-date"]
-    raw_xml_1 = get_article_xml(article_file=article_file,
-                                tag_path_elements=tag_path_1)
-    for element in raw_xml_1:
-        pub_type = element.get('pub-type')
-        try:
-            date = parse_article_date(element)
-        except ValueError:
-            print('Error getting pubdate for {}'.format(article_file))
-            date = ''
-        dates[pub_type] = date
-
-    tag_path_2 = ["/",
-                  "article",
-                  "front",
-                  "article-meta",
-                  "history"]
-    raw_xml_2 = get_article_xml(article_file=article_file,
-                                tag_path_elements=tag_path_2)
-    for element in raw_xml_2:
-        for part in element:
-            date_type = part.get('date-type')
-            try:
-                date = parse_article_date(part)
-            except ValueError:
-                print('Error getting history dates for {}'.format(article_file))
-                date = ''
-            dates[date_type] = date
     if dates.get('received', '') and dates.get('accepted', '') in dates:
         if not dates['received'] <= dates['accepted'] <= dates['epub']:
             wrong_date_strings = {date_type: date.strftime('%Y-%m-%d') for date_type, date in dates.items()}
@@ -654,6 +587,19 @@ def get_article_dates(article_file, string_=False):
             wrong_date_strings = ''
     else:
         wrong_date_strings = ''
+    return wrong_date_strings
+
+
+def get_article_dates(article_file, string_=False, dates=None):
+    """
+    For an individual article, get all of its dates
+    :param article_file: file path/DOI of the article
+    :param dates: the article's 'dates' field, if it was already read with extract_fields()
+    :return: tuple of dict of date types mapped to datetime objects for that article, dict for date strings if wrong order
+    """
+    if dates is None:
+        dates = extract_fields(article_file, ['dates'])['dates']
+    wrong_date_strings = get_wrong_date_strings(dates, article_file)
 
     if string_:
         for key, value in dates.items():
@@ -670,23 +616,7 @@ def get_article_counts(article_file):
     :param article_file: file path/DOI of the article
     :return: counts dictionary
     """
-    counts = {}
-
-    tag_path = ["/",
-                "article",
-                "front",
-                "article-meta",
-                "counts"]
-    raw_xml = get_article_xml(article_file=article_file,
-                              tag_path_elements=tag_path)
-    for element in raw_xml:
-        for count_item in element:
-            count = count_item.get('count')
-            count_type = count_item.tag
-            counts[count_type] = count
-    if len(counts) > 3:
-        print(counts)
-    return counts
+    return extract_fields(article_file, ['counts'])['counts']
 
 
 def get_article_body_word_count(article_file):
@@ -695,46 +625,42 @@ def get_article_body_word_count(article_file):
     :param article_file: individual local PLOS XML article
     :return: count of words in the body of the PLOS article
     """
-    body = get_article_xml(article_file, tag_path_elements=["/",
-                                                            "article",
-                                                            "body"])
-    try:
-        body_text = et.tostring(body[0], encoding='unicode', method='text')
-        body_word_count = len(body_text.split(" "))
-    except IndexError:
-        print("Error parsing article body: {}".format(article_file))
-        body_word_count = 0
-    return body_word_count
+    return extract_fields(article_file, ['word_count'])['word_count']
 
 
-def get_article_metadata(article_file, size='small'):
+# fields of article_fields.FIELDS read by get_article_metadata()
+metadata_fields = ['title', 'journal', 'type_', 'plostype', 'dtd', 'dates', 'counts', 'word_count', 'related_doi',
+                   'abstract']
+
+
+def get_article_metadata(article_file, size='small', article_tree=None):
     """
     For an individual article in the PLOS corpus, create a tuple of a set of metadata fields sbout that corpus.
     Make it small, medium, or large depending on number of fields desired.
+    The article is parsed once for all of the fields, see article_fields.extract_fields()
     :param article_file: individual local PLOS XML article
     :param size: small, medium or large, aka how many fields to return for each article
+    :param article_tree: the article's tree if it was already parsed, e.g. by prefetch.prefetch_trees()
     :return: tuple of metadata fields tuple, wrong_date_strings dict
     """
     doi = filename_to_doi(article_file)
     filename = os.path.basename(doi_to_path(article_file)).rstrip('.xml')
-    title = get_article_title(article_file)
-    journal = get_plos_journal(article_file)
-    jats_article_type = check_article_type(article_file)
-    plos_article_type = get_plos_article_type(article_file)
-    dtd_version = get_article_dtd(article_file)
-    dates, wrong_date_strings = get_article_dates(article_file, string_=True)
+    if article_tree is None:
+        article_tree = article_file
+    fields = extract_fields(article_tree, metadata_fields, label=doi)
+    title = fields['title']
+    journal = fields['journal']
+    jats_article_type = fields['type_']
+    plos_article_type = fields['plostype']
+    dtd_version = fields['dtd']
+    dates, wrong_date_strings = get_article_dates(article_file, string_=True, dates=fields['dates'])
     (pubdate, collection, received, accepted) = ('', '', '', '')
     pubdate = dates['epub']
-    counts = get_article_counts(article_file)
+    counts = fields['counts']
     (fig_count, table_count, page_count) = ('', '', '')
-    body_word_count = get_article_body_word_count(article_file)
-    if jats_article_type == 'correction':
-        related_article = get_related_article_doi(article_file, corrected=True)[0]
-    elif jats_article_type == 'retraction':
-        related_article = get_related_retraction_article(article_file)[0]
-    else:
-        related_article = ''
-    abstract = get_article_abstract(article_file)
+    body_word_count = fields['word_count']
+    related_article = fields['related_doi']
+    abstract = fields['abstract']
     try:
         collection = dates['collection']
     except KeyError:
@@ -769,26 +695,37 @@ def get_article_metadata(article_file, size='small'):
         return False
 
 
-def get_corpus_metadata(article_list=None):
+def scan_article_metadata(article_file, article_tree):
+    """For scanning the corpus with corpus_scan: the article's metadata, see get_article_metadata()"""
+    return get_article_metadata(article_file, article_tree=article_tree)
+
+
+def get_corpus_metadata(article_list=None, processes=None, checkpoint=None):
     """
     Run get_article_metadata() on a list of files, by default every file in corpusdir
+    The files are split between processes on all cores, and each process reads its files ahead
+    of parsing them, see corpus_scan.map_corpus()
+    When scanning all of corpusdir, progress is saved to a checkpoint file, so if the scan is interrupted,
+    running it again continues where it stopped. Articles that can't be read are printed and left out.
     Includes a progress bar
     :param article_list: list of articles to run it on
+    :param processes: number of processes to scan with, defaults to the number of CPUs
+    :param checkpoint: path to the checkpoint file; defaults to corpus_scan.get_checkpoint_path('metadata')
+    if article_list isn't given, otherwise no checkpoint
     :return: list of tuples for each article; list of dicts for wrong date orders
     """
     if article_list is None:
         article_list = listdir_nohidden(corpusdir)
-    max_value = len(article_list)
-    bar = progressbar.ProgressBar(redirect_stdout=True, max_value=max_value)
+        if checkpoint is None:
+            checkpoint = get_checkpoint_path('metadata')
     corpus_metadata = []
     wrong_dates = []
-    for i, article_file in enumerate(article_list):
-        metadata, wrong_date_strings = get_article_metadata(article_file)
+    article_metadata = scan_corpus(scan_article_metadata, article_list, parse=parse, processes=processes,
+                                   checkpoint=checkpoint)
+    for metadata, wrong_date_strings in filter(None, article_metadata):
         corpus_metadata.append(metadata)
         if wrong_date_strings:
             wrong_dates.append(wrong_date_strings)
-        bar.update(i+1)
-    bar.finish()
     return corpus_metadata, wrong_dates
 
 
@@ -861,8 +798,8 @@ def update_corpus_metadata_csv(csv_file='allofplos_metadata.csv', comparison_doi
                                 tempdir=newarticledir,
                                 destination=corpusdir)
 
-    # Step 4: append new data to existing list
-    new_corpus_metadata, wrong_dates = get_corpus_metadata(article_list=dois_needed_list)
+    # Step 4: append new data to existing list, in this process since it follows a sync
+    new_corpus_metadata, wrong_dates = get_corpus_metadata(article_list=dois_needed_list, processes=1)
     corpus_metadata.extend(new_corpus_metadata)
     # Step 5: write new dataset to .csv
     corpus_metadata_to_csv(corpus_metadata=corpus_metadata, csv_file='allofplos_metadata_updated.csv')
@@ -0,0 +1,242 @@
+"""Asynchronous pipeline for the incremental corpus update in plos_corpus.download_check_and_move.
+
+The sequential update downloads every new article, then scans them all for corrections,
+then downloads corrected articles one by one, then checks each uncorrected proof for a
+version of record (VOR), then scans again for new uncorrected proofs.
+The pipeline runs the same steps, but per article: as soon as an article is downloaded it is
+checked for being a correction or an uncorrected proof, and the follow-up downloads
+(corrected articles, VOR updates) are scheduled the moment they are discovered.
+The blocking work runs on worker threads; downloads and checks have separate worker slots,
+so follow-up checks never wait behind a long queue of new downloads.
+Both ways of running the update produce the same files and the same uncorrected proofs list.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import lxml.etree as et
+import requests
+
+from allofplos.corpus_store import article_exists
+from allofplos.download import (download_article, get_host_limiters, max_download_workers,
+                                print_failure_summary)
+from allofplos.plos_corpus import (check_article_type, get_related_article_doi, check_if_uncorrected_proof,
+                                   download_updated_xml, get_uncorrected_proofs_list, check_for_vor_updates,
+                                   compare_article_pubdate, listdir_nohidden, uncorrected_proofs_text_list)
+from allofplos.plos_regex import newarticledir
+from allofplos.transformations import (EXT_URL_TMP, INT_URL_TMP, URL_TMP, filename_to_doi, doi_to_path,
+                                       doi_to_url)
+
+# Errors that fail a single article without stopping the pipeline
+article_errors = (requests.RequestException, et.XMLSyntaxError, OSError, IndexError, KeyError)
+
+
+def inspect_article(article_file):
+    """
+    Run the checks done on every newly downloaded article
+    :param article_file: path to the article file
+    :return: tuple of DOI of the corrected article (None if not a correction), whether it's an uncorrected proof
+    """
+    corrected_doi = None
+    if check_article_type(article_file) == 'correction':
+        corrected_doi = get_related_article_doi(article_file)[0]
+    return corrected_doi, check_if_uncorrected_proof(article_file)
+
+
+def call_with_limiter(limiter, func, *args, **kwargs):
+    """
+    Call a function that makes a request while holding a slot in a host's limiter
+    :param limiter: download.HostLimiter for the host being requested
+    :param func: function to call
+    :return: the return value of func
+    """
+    with limiter:
+        return func(*args, **kwargs)
+
+
+class SyncPipeline():
+    """Download new articles and check them for corrections and VOR updates, all at the same time.
+
+    Usage:
+    `SyncPipeline(tempdir).run(article_list)` downloads the articles in article_list to tempdir and
+    leaves corrected articles and VOR updates there as well, ready for move_articles()
+    """
+    def __init__(self, tempdir=newarticledir, text_list=uncorrected_proofs_text_list, plos_network=False,
+                 max_workers=None, limits=None, state=None):
+        """
+        :param tempdir: directory where articles are downloaded to
+        :param text_list: text file of uncorrected proofs to check for VOR updates
+        :param plos_network: whether to download from content-repo inside the PLOS network
+        :param max_workers: number of downloads, and separately of checks, run at the same time
+        :param limits: dict of host to (requests per second, requests in flight), see download.host_limits
+        :param state: SyncState passed on to download_updated_xml
+        """
+        self.tempdir = tempdir
+        self.text_list = text_list
+        self.plos_network = plos_network
+        self.max_workers = max_workers or max_download_workers
+        self.limiters = get_host_limiters([EXT_URL_TMP, INT_URL_TMP], limits=limits)
+        self.state = state
+
+        self.downloaded = []
+        self.failed = {}
+        self.corrected_articles = set()
+        self.corrected_updated = []
+        self.uncorrected_proofs = []
+        self.vor_updated = []
+        self.new_proofs = []
+
+    def run(self, article_list):
+        """
+        Run the whole pipeline for a list of new articles, and update the uncorrected proofs list
+        :param article_list: DOIs of new articles to download
+        :return: None
+        """
+        try:
+            os.mkdir(self.tempdir)
+        except FileExistsError:
+            pass
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        executor = ThreadPoolExecutor(max_workers=2 * self.max_workers)
+        self.loop.set_default_executor(executor)
+        try:
+            self.loop.run_until_complete(self._run(article_list))
+        finally:
+            self.loop.close()
+            asyncio.set_event_loop(None)
+            executor.shutdown()
+        self.finish()
+
+    def limiter_for(self, url):
+        return self.limiters[urlparse(url).netloc]
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking function on a worker thread."""
+        return await self.loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    def _spawn(self, coroutine):
+        """Schedule a coroutine; _run() waits for every scheduled coroutine before finishing."""
+        self._tasks.append(self.loop.create_task(coroutine))
+
+    async def _run(self, article_list):
+        self.download_slots = asyncio.Semaphore(self.max_workers)
+        self.check_slots = asyncio.Semaphore(self.max_workers)
+        self._tasks = []
+
+        existing_files = listdir_nohidden(self.tempdir)
+        self.batch_dois = set(article_list) - set(filename_to_doi(file) for file in existing_files)
+        for doi in sorted(self.batch_dois):
+            self._spawn(self._download_and_check(doi))
+        # articles left in tempdir by an earlier, interrupted run still need checking
+        for article_file in existing_files:
+            self._spawn(self._check_article(article_file))
+        self._spawn(self._check_vor_updates())
+
+        while self._tasks:
+            tasks, self._tasks = self._tasks, []
+            await asyncio.wait(tasks)
+            for task in tasks:
+                task.result()
+
+    async def _download_and_check(self, doi):
+        url = doi_to_url(doi, plos_network=self.plos_network)
+        async with self.download_slots:
+            try:
+                article_file = await self._call(download_article,
+                                                doi,
+                                                self.tempdir,
+                                                self.limiter_for(url),
+                                                plos_network=self.plos_network)
+            except article_errors as e:
+                self.failed[doi] = e
+                return
+        self.downloaded.append(doi)
+        await self._check_article(article_file)
+
+    async def _check_article(self, article_file):
+        async with self.check_slots:
+            try:
+                corrected_doi, proof = await self._call(inspect_article, article_file)
+            except article_errors as e:
+                self.failed[filename_to_doi(article_file)] = e
+                return
+        if proof:
+            self.new_proofs.append(filename_to_doi(article_file))
+        # corrected articles in this batch are being downloaded fresh anyway
+        if corrected_doi and corrected_doi not in self.corrected_articles \
+                and corrected_doi not in self.batch_dois:
+            self.corrected_articles.add(corrected_doi)
+            self._spawn(self._update_corrected(corrected_doi))
+
+    async def _update(self, article_file, vor_check=False):
+        """Download a newer version of an existing article, if there is one."""
+        async with self.check_slots:
+            try:
+                return await self._call(call_with_limiter,
+                                        self.limiter_for(URL_TMP),
+                                        download_updated_xml,
+                                        article_file,
+                                        tempdir=self.tempdir,
+                                        vor_check=vor_check,
+                                        state=self.state)
+            except article_errors as e:
+                self.failed[filename_to_doi(article_file)] = e
+                return False
+
+    async def _update_corrected(self, doi):
+        article_file = doi_to_path(doi)
+        if not article_exists(article_file):
+            article_file = doi_to_path(doi, directory=self.tempdir)
+        if await self._update(article_file):
+            self.corrected_updated.append(article_file)
+            await self._check_article(doi_to_path(doi, directory=self.tempdir))
+
+    async def _check_vor_updates(self):
+        async with self.check_slots:
+            # the pipeline runs on threads, so a list made from scratch is scanned in this process
+            self.uncorrected_proofs = await self._call(get_uncorrected_proofs_list, processes=1,
+                                                       text_list=self.text_list)
+            try:
+                # Solr doesn't always know about VOR updates, so every proof is checked directly,
+                # but the ones Solr does know about go first
+                solr_vor_updates = await self._call(check_for_vor_updates, self.uncorrected_proofs)
+            except requests.RequestException:
+                solr_vor_updates = []
+        for doi in solr_vor_updates + sorted(set(self.uncorrected_proofs) - set(solr_vor_updates)):
+            self._spawn(self._update_vor(doi))
+
+    async def _update_vor(self, doi):
+        if await self._update(doi_to_path(doi), vor_check=True):
+            self.vor_updated.append(doi)
+
+    def finish(self):
+        """Print the results of the pipeline and save the new uncorrected proofs list."""
+        print(len(self.downloaded), "new articles downloaded.")
+        logging.info(len(self.downloaded))
+        print(len(self.corrected_articles), 'corrected articles found.')
+        print(len(self.corrected_updated), 'corrected articles downloaded with new xml.')
+
+        remaining_proofs = sorted(set(self.uncorrected_proofs) - set(self.vor_updated))
+        if self.plos_network:
+            too_old_proofs = [proof for proof in remaining_proofs if compare_article_pubdate(proof)]
+            if too_old_proofs:
+                print("Proofs older than 3 weeks: {}".format(too_old_proofs))
+        if self.vor_updated:
+            print("{} uncorrected proofs updated to version of record.\n".format(len(self.vor_updated)) +
+                  "{} uncorrected proofs remaining in uncorrected proof list.".format(len(remaining_proofs)))
+        else:
+            print("No uncorrected proofs have a VOR update.")
+
+        uncorrected_proofs_list = sorted(set(remaining_proofs + self.new_proofs))
+        with open(self.text_list, 'w') as file:
+            for item in uncorrected_proofs_list:
+                file.write("%s\n" % item)
+        print("{} uncorrected proofs found. {} total in list.".format(len(self.new_proofs),
+                                                                      len(uncorrected_proofs_list)))
+        if self.failed:
+            print_failure_summary(self.failed)
@@ -0,0 +1,310 @@
+"""Persistent record of the articles in a local corpus directory.
+
+Finding out what's in corpusdir used to mean listing all of its 230k+ files, several times per
+sync. The sync state is a small SQLite database next to the corpus directory
+(`allofplos_xml_state.db` for `allofplos_xml`) with one row per article: its file, size,
+content hash, when it was last checked against PLOS and whether it's an uncorrected proof.
+
+The database is kept up to date as articles are moved into the corpus. It also stores the
+modification time of the directory, which changes whenever a file is added or removed, so a
+sync where nothing else touched the directory needs a single os.stat() instead of a listing.
+If something else did change the directory, refresh() lists it once and updates only the rows
+for files that appeared or disappeared. In the sharded layout (see corpus_layout), files added
+to or removed from an existing shard don't change the directory, so use refresh(force=True)
+after changing the shards outside of allofplos. Bulk extractions into the corpus call
+invalidate_state(), so the next refresh() lists the directory.
+
+For checking articles against PLOS, the state also remembers a digest of the last response
+received for each article, together with the digest of the local file it matched. If both
+are the same next time, the article hasn't changed and neither copy needs to be parsed.
+The response's ETag and Last-Modified validators are kept as well, so the next check can be a
+conditional request that the server answers with an empty 304 Not Modified.
+A SyncState can be shared between threads.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from allofplos.corpus_layout import article_path, list_files
+from allofplos.corpus_store import article_version, get_pack_path, list_articles, read_article
+from allofplos.plos_regex import corpusdir, validate_filename
+from allofplos.transformations import filename_to_doi, strip_compressed_suffix
+
+state_suffix = '_state.db'
+
+schema = """
+CREATE TABLE IF NOT EXISTS articles (
+    doi TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    sha1 TEXT,
+    checked REAL,
+    proof INTEGER
+);
+CREATE TABLE IF NOT EXISTS remote (
+    doi TEXT PRIMARY KEY,
+    remote_sha1 TEXT,
+    local_sha1 TEXT,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def get_state_path(directory=corpusdir):
+    """
+    Where the sync state of a corpus directory is kept
+    :param directory: corpus directory
+    :return: path to the SQLite database next to the directory
+    """
+    return os.path.abspath(directory).rstrip(os.sep) + state_suffix
+
+
+def content_sha1(content):
+    """
+    :param content: bytes
+    :return: hex SHA-1 digest of content
+    """
+    return hashlib.sha1(content).hexdigest()
+
+
+def file_sha1(path):
+    """
+    :param path: path to a file, or to an article that's compressed or in a store (see corpus_store)
+    :return: hex SHA-1 digest of the file's contents
+    """
+    return content_sha1(read_article(path))
+
+
+def list_article_filenames(directory):
+    """
+    List the article files of a corpus directory, in either layout and in its store
+    :param directory: corpus directory
+    :return: set of article filenames, like 'journal.pone.0185809.xml'; compressed articles are
+    listed by the name of the XML file they hold
+    """
+    try:
+        names = (strip_compressed_suffix(os.path.basename(file)) for file in list_files(directory))
+        filenames = {name for name in names if name.endswith('.xml') and validate_filename(name)}
+    except FileNotFoundError:
+        filenames = set()
+    # articles in the directory's pack store, see corpus_store
+    filenames.update(filename for filename in list_articles(directory) if validate_filename(filename))
+    return filenames
+
+
+def invalidate_state(directory=corpusdir):
+    """
+    Forget the modification time stored in the sync state of a directory, if it has one, so the next
+    refresh() lists the directory. For writing many files at once, which in the sharded layout
+    (see corpus_layout) can leave the directory's own modification time unchanged.
+    :param directory: corpus directory
+    :return: None
+    """
+    state_path = get_state_path(directory)
+    if not os.path.isfile(state_path):
+        return None
+    connection = sqlite3.connect(state_path)
+    try:
+        connection.executescript(schema)
+        with connection:
+            connection.execute("DELETE FROM meta WHERE key = 'directory_mtime'")
+    finally:
+        connection.close()
+    return None
+
+
+class SyncState():
+    """The articles in a corpus directory, as of the last sync.
+
+    Usage:
+    ```
+    state = SyncState(corpusdir)
+    state.refresh()
+    local_dois = state.dois()
+    ```
+    """
+    def __init__(self, directory=corpusdir, state_path=None):
+        """
+        :param directory: corpus directory the state describes
+        :param state_path: path to the database, defaults to get_state_path(directory)
+        """
+        self.directory = directory
+        self.state_path = state_path or get_state_path(directory)
+        self.connection = sqlite3.connect(self.state_path, check_same_thread=False)
+        self.connection.executescript(schema)
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _get_meta(self, key):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def _set_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _directory_mtime(self):
+        try:
+            mtime = str(os.stat(self.directory).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        # articles added to the directory's pack store don't change the directory
+        try:
+            return '{}:{}'.format(mtime, os.stat(get_pack_path(self.directory)).st_mtime_ns)
+        except FileNotFoundError:
+            return mtime
+
+    def mark_synced(self):
+        """Record that the database matches the directory as it is now."""
+        with self._lock, self.connection:
+            self._set_meta('directory_mtime', self._directory_mtime())
+
+    def refresh(self, force=False):
+        """
+        Bring the database up to date with the directory, if the directory changed since the last sync
+        :param force: list the directory even if it looks unchanged
+        :return: tuple of number of articles added, number of articles removed
+        """
+        mtime = self._directory_mtime()
+        if not force and mtime == self._get_meta('directory_mtime'):
+            return 0, 0
+        filenames = list_article_filenames(self.directory)
+        known = dict(self._query("SELECT filename, doi FROM articles"))
+        added = filenames - set(known)
+        removed = set(known) - filenames
+        with self._lock, self.connection:
+            self.connection.executemany("DELETE FROM articles WHERE doi = ?",
+                                        ((known[filename],) for filename in removed))
+            for filename in added:
+                self._record(article_path(self.directory, filename))
+            self._set_meta('directory_mtime', mtime)
+        return len(added), len(removed)
+
+    def _record(self, path, sha1=None, checked=None):
+        doi = filename_to_doi(os.path.basename(path))
+        _, size = article_version(path)
+        self.connection.execute("INSERT OR IGNORE INTO articles (doi, filename) VALUES (?, ?)",
+                                (doi, os.path.basename(path)))
+        self.connection.execute("UPDATE articles SET filename = ?, size = ?, sha1 = ?, "
+                                "checked = COALESCE(?, checked) WHERE doi = ?",
+                                (os.path.basename(path), size, sha1, checked, doi))
+
+    def record(self, paths, checked=None):
+        """
+        Add or update articles after their files were written to the corpus directory
+        :param paths: paths to the article files in the corpus directory
+        :param checked: time the articles were last checked against PLOS, defaults to now
+        :return: None
+        """
+        checked = checked or time.time()
+        with self._lock, self.connection:
+            for path in paths:
+                self._record(path, sha1=file_sha1(path), checked=checked)
+
+    def mark_checked(self, dois, checked=None):
+        """
+        Record that articles were compared against PLOS without needing an update
+        :param dois: DOIs of the articles
+        :param checked: time of the check, defaults to now
+        :return: None
+        """
+        checked = checked or time.time()
+        with self._lock, self.connection:
+            self.connection.executemany("UPDATE articles SET checked = ? WHERE doi = ?",
+                                        ((checked, doi) for doi in dois))
+
+    def set_proofs(self, dois):
+        """
+        Replace the set of articles marked as uncorrected proofs
+        :param dois: DOIs of every current uncorrected proof
+        :return: None
+        """
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE articles SET proof = 0")
+            self.connection.executemany("UPDATE articles SET proof = 1 WHERE doi = ?", ((doi,) for doi in dois))
+
+    def dois(self):
+        """:return: set of the DOIs of every article in the corpus directory"""
+        return {doi for doi, in self._query("SELECT doi FROM articles")}
+
+    def proofs(self):
+        """:return: sorted list of DOIs of articles marked as uncorrected proofs"""
+        return [doi for doi, in self._query("SELECT doi FROM articles WHERE proof = 1 ORDER BY doi")]
+
+    def count(self):
+        """:return: number of articles in the corpus directory"""
+        return self._query("SELECT COUNT(*) FROM articles")[0][0]
+
+    def get(self, doi):
+        """
+        :param doi: DOI of an article
+        :return: dict of the article's path, size, sha1, checked time and proof status; None if not in the corpus
+        """
+        rows = self._query("SELECT filename, size, sha1, checked, proof FROM articles WHERE doi = ?", (doi,))
+        if not rows:
+            return None
+        filename, size, sha1, checked, proof = rows[0]
+        return {'path': article_path(self.directory, filename),
+                'size': size,
+                'sha1': sha1,
+                'checked': checked,
+                'proof': None if proof is None else bool(proof),
+                }
+
+    def is_unchanged(self, doi, remote_sha1, local_sha1):
+        """
+        Whether an article's remote and local copies are the same ones that were last found to match
+        :param doi: DOI of the article
+        :param remote_sha1: digest of the article as just downloaded from PLOS
+        :param local_sha1: digest of the local article file
+        :return: bool
+        """
+        rows = self._query("SELECT remote_sha1, local_sha1 FROM remote WHERE doi = ?", (doi,))
+        return bool(rows) and rows[0] == (remote_sha1, local_sha1)
+
+    def get_remote(self, doi):
+        """
+        :param doi: DOI of an article
+        :return: dict of the remote_sha1, local_sha1, etag and last_modified stored by record_remote();
+        None if the article hasn't been checked
+        """
+        rows = self._query("SELECT remote_sha1, local_sha1, etag, last_modified FROM remote WHERE doi = ?", (doi,))
+        if not rows:
+            return None
+        return dict(zip(('remote_sha1', 'local_sha1', 'etag', 'last_modified'), rows[0]))
+
+    def record_remote(self, doi, remote_sha1, local_sha1, etag=None, last_modified=None):
+        """
+        Remember that the article downloaded from PLOS with remote_sha1 matches the local file with local_sha1
+        :param doi: DOI of the article
+        :param remote_sha1: digest of the article as downloaded from PLOS
+        :param local_sha1: digest of the local article file that has the same content
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        :return: None
+        """
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO remote (doi, remote_sha1, local_sha1, etag, last_modified) "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (doi, remote_sha1, local_sha1, etag, last_modified))
@@ -1,12 +1,41 @@
 import datetime
+import hashlib
+import http.server
+import io
 import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-from allofplos.article_class import Article
-from allofplos.plos_corpus import INT_URL_TMP, EXT_URL_TMP
+import lxml.etree as et
+
+from allofplos.article_class import Article, ArticleRecord
+from allofplos.article_fields import extract_fields
+from allofplos.bulk_download import (StreamReader, extract_zip, merge_ranges, missing_ranges, read_zip_member,
+                                     resumable_download, split_ranges)
+from allofplos.corpus_index import CorpusIndex
+from allofplos.corpus_layout import article_path, get_layout, get_layout_path, migrate_layout
+from allofplos.corpus_scan import ScanCheckpoint, reduce_corpus, scan_corpus
+from allofplos.corpus_store import (ZipStore, close_stores, compress_corpus, get_pack_path, get_store, get_zip_path,
+                                    pack_articles, pack_corpus, read_article)
+from allofplos.download import HostLimiter, get_host_limiters
+from allofplos import corpus_store, plos_corpus
+from allofplos.plos_corpus import INT_URL_TMP, EXT_URL_TMP, download_updated_xml, move_articles
 from allofplos.transformations import (doi_to_path, url_to_path, filename_to_doi, url_to_doi,
                              filename_to_url, doi_to_url)
+from allofplos.parsers import get_parser, parse
 from allofplos.plos_regex import corpusdir
+from allofplos.prefetch import prefetch_trees
+from allofplos.sync_pipeline import SyncPipeline
+from allofplos.sync_state import SyncState
+from allofplos.tree_cache import TreeCache, disable_tree_cache, enable_tree_cache, parse_front
+from allofplos.xpaths import XPATHS, get_xpath
 
 
 suffix = '.xml'
@@ -24,6 +53,60 @@ example_url2_int = 'http://contentrepo.plos.org:8002/v1/objects/mogilefs-'\
 example_file2 = 'plos.correction.3155a3e9-5fbe-435c-a07a-e9a4846ec0b6.xml'
 example_doi2 = '10.1371/annotation/3155a3e9-5fbe-435c-a07a-e9a4846ec0b6'
 class_doi = '10.1371/journal.pone.0185809'
+testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def scan_article_type(article_file, article_tree):
+    return plos_corpus.check_article_type(article_tree)
+
+
+class ArticleServer(http.server.BaseHTTPRequestHandler):
+    """Serves the testdata articles like journals.plos.org does, with an ETag for each one."""
+    statuses = []
+
+    def do_GET(self):
+        doi = parse_qs(urlparse(self.path).query)['id'][0]
+        with open(doi_to_path(doi, directory=testdata), 'rb') as f:
+            content = f.read()
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.statuses.append(200)
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeServer(http.server.BaseHTTPRequestHandler):
+    """Serves the same bytes at every path, answering Range requests."""
+    content = b''
+
+    def do_GET(self):
+        content = self.content
+        byte_range = self.headers.get('Range')
+        if byte_range:
+            start, end = byte_range.split('=')[1].split('-')
+            start, end = int(start), int(end) + 1
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end - 1, len(content)))
+            content = content[start:end]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
 
 
 class TestDOIMethods(unittest.TestCase):
@@ -207,5 +290,614 @@ class TestArticleClass(unittest.TestCase):
         self.assertEqual(article.url[:100], "http://journals.plos.org/plosone/article/file?id=10.1371/annotation/3155a3e9-5fbe-435c-a07a-e9a4846e", 'url does not transform correctly for {}'.format(article.doi))
         self.assertEqual(article.word_count, 129, 'word_count does not transform correctly for {}'.format(article.doi))
 
+    def test_tree_memoized(self):
+        """The article tree is parsed once per article, and shared between articles through the tree cache."""
+        article = Article(example_doi, directory=testdata)
+        self.assertIs(article.tree, article.tree)
+        article.doi = class_doi
+        self.assertEqual(article.type_, 'research-article')
+        cache = enable_tree_cache()
+        try:
+            self.assertIs(Article(example_doi, directory=testdata).tree, Article(example_doi, directory=testdata).tree)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        finally:
+            disable_tree_cache()
+
+    def test_lazy_article(self):
+        """Lazy articles read metadata from <front> only, and parse the whole file for the body."""
+        article = Article(class_doi, directory=testdata)
+        lazy_article = Article(class_doi, directory=testdata, lazy=True)
+        for attribute in ('title', 'journal', 'pubdate', 'type_', 'plostype', 'dtd', 'abstract', 'counts', 'proof'):
+            self.assertEqual(getattr(lazy_article, attribute), getattr(article, attribute))
+        self.assertEqual([element.tag for element in lazy_article.front_tree.getroot()], ['front'])
+        self.assertIsNone(lazy_article._tree)
+        self.assertEqual(lazy_article.word_count, article.word_count)
+
+    def test_article_record(self):
+        """Article records hold the article's metadata and survive pickling."""
+        article = Article(example_doi2, directory=testdata)
+        record = article.to_record()
+        self.assertEqual(record.doi, example_doi2)
+        self.assertEqual(record.type_, article.type_)
+        self.assertEqual(record.related_doi, article.related_doi)
+        self.assertEqual(record.pubdate, article.pubdate)
+        self.assertEqual(record.word_count, article.word_count)
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+        self.assertFalse(hasattr(record, '__dict__'))
+        lazy_record = ArticleRecord.from_article(Article(example_doi2, directory=testdata, lazy=True),
+                                                 word_count=False)
+        self.assertEqual(lazy_record._replace(word_count=record.word_count), record)
+
+    def test_extract_fields(self):
+        """All fields read in one pass match the article's properties, with or without the body."""
+        for doi in (class_doi, example_doi, example_doi2):
+            article = Article(doi, directory=testdata)
+            fields = extract_fields(article.filename)
+            self.assertEqual(fields['doi'], doi)
+            self.assertEqual(fields['title'], article.title)
+            self.assertEqual(fields['plostype'], article.plostype)
+            self.assertEqual(fields['pubdate'], article.pubdate)
+            self.assertEqual(fields['related_doi'], article.related_doi)
+            self.assertEqual(fields['word_count'], article.word_count)
+            self.assertEqual(fields, Article(doi, directory=testdata, lazy=True).get_fields())
+            front_fields = extract_fields(article.filename, ['journal', 'abstract', 'counts'])
+            self.assertEqual(front_fields, {field: fields[field] for field in front_fields})
+        with self.assertRaises(ValueError):
+            extract_fields(article.filename, ['title', 'colour'])
+
+    def test_iter_many(self):
+        """Articles from iter_many() and batch() match articles read one by one."""
+        dois = [class_doi, example_doi, example_doi2, '10.1371/journal.pone.0000000']
+        articles = list(Article.iter_many(dois, directory=testdata, depth=2, workers=2))
+        self.assertCountEqual([article.doi for article in articles], dois)
+        for article in articles:
+            if article.doi == dois[-1]:
+                self.assertFalse(article.local)
+            else:
+                self.assertIsNotNone(article._tree)
+                self.assertEqual(article.to_record(), Article(article.doi, directory=testdata).to_record())
+        records = list(Article.batch(dois, fields=['title', 'proof'], directory=testdata))
+        self.assertEqual(len(records), 3)
+        for record in records:
+            self.assertEqual(record['title'], Article(record['doi'], directory=testdata).title)
+
+
+class TestTreeCache(unittest.TestCase):
+
+    def test_tree_cache(self):
+        """Cached trees are parsed again when their file changes, and evicted to stay within the memory budget."""
+        with tempfile.TemporaryDirectory() as directory:
+            for file in (example_file, example_file2):
+                shutil.copy(os.path.join(testdata, file), directory)
+            path, path2 = os.path.join(directory, example_file), os.path.join(directory, example_file2)
+            cache = TreeCache(max_memory=os.path.getsize(path) * 5)
+            tree = cache.get(path)
+            self.assertIs(cache.get(path), tree)
+            os.utime(path, ns=(0, 0))
+            self.assertIsNot(cache.get(path), tree)
+            cache.get(path2)
+            self.assertEqual(len(cache), 1)
+            self.assertLessEqual(cache.memory, cache.max_memory)
+
+
+class TestXpaths(unittest.TestCase):
+
+    def test_xpath_registry(self):
+        """XPaths are compiled once per location and shared between named and tag path lookups."""
+        path = ['/', 'article', 'front', 'article-meta', 'pub-date']
+        self.assertIs(get_xpath(path), XPATHS['pub_date'])
+        self.assertIs(get_xpath(), XPATHS['proof'])
+        self.assertIs(get_xpath(['/', 'article', 'back', 'ref-list']), get_xpath(['/', 'article', 'back', 'ref-list']))
+        article = Article(class_doi, directory=testdata)
+        self.assertEqual(article.get_element_xpath(path), article.root.xpath('/'.join(path)))
+        self.assertEqual(len(article.get_element_xpath(location='contrib')), 13)
+
+
+class TestParsers(unittest.TestCase):
+
+    def test_parsers(self):
+        """Parsers are reused within a thread but not shared between threads, and never expand entities."""
+        parser = get_parser()
+        self.assertIs(get_parser(), parser)
+        self.assertIsNot(get_parser('view'), parser)
+        other_thread_parsers = []
+        thread = threading.Thread(target=lambda: other_thread_parsers.append(get_parser()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_thread_parsers[0], parser)
+        xml = b'<!DOCTYPE article [<!ENTITY name "expanded">]><article>&name;</article>'
+        self.assertIn('<article>&name;</article>', et.tostring(parse(io.BytesIO(xml)), encoding='unicode'))
+        article_view = str(Article(class_doi, directory=testdata))
+        self.assertNotIn('<back>', article_view)
+        self.assertIn('<front>', article_view)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_prefetch_trees(self):
+        """Prefetched trees keep the order of the files, and give the same answers as the files."""
+        article_files = [os.path.join(testdata, file) for file in sorted(os.listdir(testdata))] + [class_doi]
+        advised = []
+        with mock.patch('allofplos.prefetch.advise_file',
+                        side_effect=lambda path: advised.append((path, threading.get_ident()))):
+            results = list(prefetch_trees(article_files, parse=parse_front, depth=1, advise=True))
+        # files are hinted to the kernel ahead of their reads, by the reading threads
+        self.assertEqual(sorted(path for path, _ in advised), sorted(article_files[1:]))
+        self.assertNotIn(threading.get_ident(), [thread for _, thread in advised])
+        self.assertEqual([article_file for article_file, _ in results], article_files)
+        self.assertEqual(results[-1], (class_doi, class_doi))
+        for article_file, article_tree in results[:-1]:
+            self.assertEqual(plos_corpus.check_article_type(article_tree), plos_corpus.check_article_type(article_file))
+
+
+class TestCorpusScan(unittest.TestCase):
+
+    def test_scan_corpus(self):
+        """A scan on several processes gives the same results, in the same order, as one in this process."""
+        article_files = [os.path.join(testdata, file) for file in sorted(os.listdir(testdata))]
+        types = [plos_corpus.check_article_type(article_file) for article_file in article_files]
+        self.assertEqual(scan_corpus(scan_article_type, article_files, processes=1, progress=False), types)
+        self.assertEqual(scan_corpus(scan_article_type, article_files, processes=2, chunk_size=1,
+                                     progress=False), types)
+        all_types = reduce_corpus(scan_article_type, lambda combined, article_file, type_: combined + [type_], [],
+                                  article_files, processes=2, chunk_size=1, progress=False)
+        self.assertEqual(sorted(all_types), sorted(types))
+
+    def test_scan_checkpoint(self):
+        """Articles that fail are collected, and a resumed scan only rescans failed or changed articles."""
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree(testdata, os.path.join(directory, 'articles'))
+            article_files = [os.path.join(directory, 'articles', file) for file in sorted(os.listdir(testdata))]
+            types = [plos_corpus.check_article_type(article_file) for article_file in article_files]
+            broken_file = os.path.join(directory, 'journal.pone.0000000.xml')
+            with open(broken_file, 'w') as f:
+                f.write('<article><front>')
+            checkpoint_path = os.path.join(directory, 'scan_checkpoint.db')
+            errors = []
+            results = scan_corpus(scan_article_type, article_files + [broken_file], processes=1, chunk_size=1,
+                                  progress=False, checkpoint=checkpoint_path, errors=errors)
+            self.assertEqual(results, types + [None])
+            self.assertEqual([error.article_file for error in errors], [broken_file])
+            with ScanCheckpoint(checkpoint_path) as checkpoint:
+                self.assertEqual(checkpoint.results(), dict(zip(article_files, types)))
+                self.assertEqual(checkpoint.errors(), errors)
+            # only the broken file and a changed file are scanned again; then the finished checkpoint is deleted
+            shutil.copy(os.path.join(testdata, example_file), broken_file)
+            with open(article_files[0], 'a') as f:
+                f.write('\n')
+            with mock.patch('allofplos.plos_corpus.check_article_type',
+                            return_value='resumed') as check_article_type:
+                results = scan_corpus(scan_article_type, article_files + [broken_file], processes=1,
+                                      progress=False, checkpoint=checkpoint_path, errors=errors)
+            self.assertEqual(results, ['resumed'] + types[1:] + ['resumed'])
+            self.assertEqual(check_article_type.call_count, 2)
+            self.assertFalse(os.path.exists(checkpoint_path))
+            # results for DOIs are checked against the article file in corpusdir, and not saved without one
+            with ScanCheckpoint(checkpoint_path) as checkpoint:
+                checkpoint.save([(article_files[1], types[1]), ('10.1371/journal.pone.0000000', 'stale')])
+                self.assertEqual(checkpoint.results(), {article_files[1]: types[1]})
+
+
+class TestDownload(unittest.TestCase):
+
+    def test_host_limiter(self):
+        """HostLimiter spaces requests to a host by its rate limit."""
+        limiter = HostLimiter(rate=20, max_concurrent=2)
+        start = time.monotonic()
+        for _ in range(5):
+            with limiter:
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.19, 'HostLimiter does not enforce its rate limit')
+
+    def test_get_host_limiters(self):
+        """One limiter is made per host, shared by every URL on that host."""
+        limiters = get_host_limiters([example_url, example_url2, example_url_int])
+        self.assertEqual(sorted(limiters), ['contentrepo.plos.org:8002', 'journals.plos.org'])
+        self.assertEqual(limiters['journals.plos.org'].interval, 0.5)
+        self.assertEqual(limiters['contentrepo.plos.org:8002'].interval, 0)
+
+    def test_sync_pipeline(self):
+        """The pipeline downloads new articles, and checks the proofs in its own text list for VOR updates."""
+        server = http.server.HTTPServer(('127.0.0.1', 0), ArticleServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/article/file?id={{0}}&type=manuscript'.format(server.server_port)
+        ArticleServer.statuses = []
+        try:
+            with tempfile.TemporaryDirectory() as directory, \
+                    mock.patch('allofplos.transformations.EXT_URL_TMP', url), \
+                    mock.patch('allofplos.sync_pipeline.EXT_URL_TMP', url), \
+                    mock.patch('allofplos.sync_pipeline.URL_TMP', url), \
+                    mock.patch.object(plos_corpus, 'URL_TMP', url), \
+                    mock.patch('allofplos.sync_pipeline.check_for_vor_updates', return_value=[]):
+                articles = os.path.join(directory, 'articles')
+                tempdir = os.path.join(directory, 'new')
+                os.mkdir(articles)
+                shutil.copy(os.path.join(testdata, example_file), articles)
+                text_list = os.path.join(directory, 'proofs.txt')
+                with open(text_list, 'w') as f:
+                    f.write(example_doi + '\n')
+                with mock.patch.object(plos_corpus, 'corpusdir', articles):
+                    pipeline = SyncPipeline(tempdir=tempdir, text_list=text_list)
+                    pipeline.run([class_doi, example_doi2])
+                self.assertEqual(sorted(pipeline.downloaded), sorted([class_doi, example_doi2]))
+                self.assertEqual(sorted(os.listdir(tempdir)), sorted(['journal.pone.0185809.xml', example_file2]))
+                self.assertEqual(pipeline.uncorrected_proofs, [example_doi])
+                self.assertEqual(pipeline.failed, {})
+                self.assertEqual(ArticleServer.statuses, [200, 200, 200])
+                with open(text_list) as f:
+                    self.assertEqual(f.read().splitlines(), [example_doi])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_move_articles(self):
+        """Moved articles replace existing ones and are recorded in the sync state."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'new')
+            destination = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, source)
+            os.mkdir(destination)
+            with open(os.path.join(destination, example_file), 'w') as f:
+                f.write('<article/>')
+            with SyncState(destination) as state:
+                move_articles(source, destination, state=state)
+                self.assertEqual(state.dois(), {example_doi, example_doi2, class_doi})
+                self.assertEqual(state.refresh(), (0, 0))
+            self.assertEqual(os.listdir(source), [])
+            with open(os.path.join(destination, example_file)) as f:
+                self.assertNotEqual(f.read(), '<article/>')
+
+
+class TestBulkDownload(unittest.TestCase):
+
+    def test_byte_ranges(self):
+        """Downloaded byte ranges are merged, and the gaps between them found, for resuming downloads."""
+        self.assertEqual(merge_ranges([[10, 20], [0, 5], [5, 8], [15, 30]]), [[0, 8], [10, 30]])
+        self.assertEqual(missing_ranges([[10, 20], [0, 5]], 30), [[5, 10], [20, 30]])
+        self.assertEqual(missing_ranges([], 30), [[0, 30]])
+        self.assertEqual(missing_ranges([[0, 30]], 30), [])
+        self.assertEqual(split_ranges([[0, 100]], 4, min_segment_size=10), [[0, 25], [25, 50], [50, 75], [75, 100]])
+        self.assertEqual(split_ranges([[0, 100]], 4, min_segment_size=60), [[0, 60], [60, 100]])
+
+    def test_read_zip_member(self):
+        """Zip members are read in order from a stream, without seeking to the central directory."""
+        zip_bytes = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr(example_file, b'<article/>' * 100)
+            zip_file.writestr(example_file2, b'<article/>', compress_type=zipfile.ZIP_STORED)
+        data = zip_bytes.getvalue()
+        reader = StreamReader(data[i:i+7] for i in range(0, len(data), 7))
+        self.assertEqual(read_zip_member(reader), (example_file, b'<article/>' * 100))
+        self.assertEqual(read_zip_member(reader), (example_file2, b'<article/>'))
+        self.assertIsNone(read_zip_member(reader))
+        reader.drain()
+        self.assertEqual(reader.position, len(data))
+
+    def test_extract_zip(self):
+        """Extracting over a partly extracted directory only rewrites missing or changed files."""
+        with tempfile.TemporaryDirectory() as directory:
+            zip_path = os.path.join(directory, 'articles.zip')
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                zip_file.writestr(example_file, b'<article/>')
+                zip_file.writestr(example_file2, b'<article/>')
+            extract_directory = os.path.join(directory, 'articles')
+            self.assertEqual(extract_zip(zip_path, extract_directory, processes=1), (2, 0))
+            with open(os.path.join(extract_directory, example_file2), 'wb') as f:
+                f.write(b'<changed/>')
+            self.assertEqual(extract_zip(zip_path, extract_directory, processes=1, skip_existing=True), (1, 1))
+            with open(os.path.join(extract_directory, example_file2), 'rb') as f:
+                self.assertEqual(f.read(), b'<article/>')
+
+    def test_checksum_mismatch(self):
+        """A download with the wrong checksum is deleted with its sidecar, so the next attempt starts over."""
+        server = http.server.HTTPServer(('127.0.0.1', 0), RangeServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/corpus.zip'.format(server.server_port)
+        RangeServer.content = b'corrupt' * 1000
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, 'corpus.zip')
+                checksum = 'md5:' + hashlib.md5(b'article' * 1000).hexdigest()
+                with self.assertRaises(OSError):
+                    resumable_download(url, file_path, checksum=checksum)
+                self.assertEqual(os.listdir(directory), [])
+                RangeServer.content = b'article' * 1000
+                self.assertEqual(resumable_download(url, file_path, checksum=checksum), file_path)
+                self.assertEqual(os.listdir(directory), ['corpus.zip'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestSyncState(unittest.TestCase):
+
+    def test_sync_state(self):
+        """The sync state follows files added to and removed from the corpus directory."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, articles)
+            with SyncState(articles) as state:
+                self.assertEqual(state.refresh(), (3, 0))
+                self.assertEqual(state.refresh(), (0, 0))
+                self.assertEqual(state.dois(), {example_doi, example_doi2, class_doi})
+                os.remove(os.path.join(articles, example_file2))
+                self.assertEqual(state.refresh(force=True), (0, 1))
+                state.record([os.path.join(articles, example_file)])
+                self.assertEqual(state.get(example_doi)['path'], os.path.join(articles, example_file))
+                self.assertEqual(len(state.get(example_doi)['sha1']), 40)
+                state.set_proofs([class_doi])
+                self.assertEqual(state.proofs(), [class_doi])
+                state.record_remote(example_doi, 'remote', 'local')
+                self.assertTrue(state.is_unchanged(example_doi, 'remote', 'local'))
+                self.assertFalse(state.is_unchanged(example_doi, 'remote', 'changed'))
+
+    def test_sync_state_after_extraction(self):
+        """Articles extracted into existing shards are found without forcing a refresh."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            zip_path = os.path.join(directory, 'download.zip')
+            shutil.copytree(testdata, articles)
+            migrate_layout(articles, 'sharded')
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                for file in os.listdir(testdata):
+                    zip_file.write(os.path.join(testdata, file), arcname=file)
+            for file in (example_file, example_file2):
+                os.remove(article_path(articles, file))
+            with SyncState(articles) as state:
+                self.assertEqual(state.refresh(), (1, 0))
+                plos_corpus.unzip_articles(zip_path, articles, delete_file=False, skip_existing=True)
+                self.assertEqual(state.refresh(), (2, 0))
+                self.assertEqual(state.count(), 3)
+
+    def test_conditional_update_check(self):
+        """Checking an unchanged article again gets an empty 304 response."""
+        server = http.server.HTTPServer(('127.0.0.1', 0), ArticleServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/article/file?id={{0}}&type=manuscript'.format(server.server_port)
+        ArticleServer.statuses = []
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                articles = os.path.join(directory, 'articles')
+                tempdir = os.path.join(directory, 'new')
+                os.mkdir(articles)
+                shutil.copy(os.path.join(testdata, example_file), articles)
+                with mock.patch.object(plos_corpus, 'URL_TMP', url), \
+                        mock.patch.object(plos_corpus, 'corpusdir', articles), \
+                        SyncState(articles) as state:
+                    self.assertFalse(download_updated_xml(example_file, tempdir=tempdir, state=state))
+                    self.assertFalse(download_updated_xml(example_file, tempdir=tempdir, state=state))
+                    self.assertEqual(ArticleServer.statuses, [200, 304])
+                    # a changed local file means the stored validators no longer apply
+                    with open(os.path.join(articles, example_file)) as f:
+                        changed = f.read().replace('</article>', '<sec/></article>')
+                    with open(os.path.join(articles, example_file), 'w') as f:
+                        f.write(changed)
+                    self.assertTrue(download_updated_xml(example_file, tempdir=tempdir, state=state))
+                    self.assertEqual(ArticleServer.statuses, [200, 304, 304, 200])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestCorpusStore(unittest.TestCase):
+
+    def tearDown(self):
+        close_stores()
+
+    def test_pack_corpus(self):
+        """Packed articles are listed and read like article files, and files in the directory take precedence."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, articles)
+            self.assertEqual(pack_corpus(articles, remove_files=True), 3)
+            self.assertEqual(os.listdir(articles), [])
+            self.assertEqual(sorted(plos_corpus.listdir_nohidden(articles, include_dir=False)),
+                             sorted(os.listdir(testdata)))
+            self.assertEqual(sorted(plos_corpus.extract_filenames(articles)),
+                             sorted(file[:-4] for file in os.listdir(testdata)))
+            article = Article(class_doi, directory=articles)
+            self.assertTrue(article.local)
+            self.assertEqual(article.title, Article(class_doi, directory=testdata).title)
+            self.assertEqual(plos_corpus.check_article_type(os.path.join(articles, example_file2)), 'retraction')
+            with SyncState(articles) as state:
+                self.assertEqual(state.refresh(), (3, 0))
+            store = get_store(articles)
+            with open(os.path.join(testdata, example_file), 'rb') as f:
+                self.assertEqual(store.read(example_doi), f.read())
+            self.assertEqual(sorted(doi for doi, _ in store.iter_articles()), sorted(store.dois()))
+            with open(os.path.join(articles, example_file), 'w') as f:
+                f.write('<article article-type="updated"/>')
+            self.assertEqual(plos_corpus.check_article_type(os.path.join(articles, example_file)), 'updated')
+
+    def test_zip_store(self):
+        """Articles are read from the corpus zip file without extracting it."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            os.mkdir(articles)
+            with zipfile.ZipFile(get_zip_path(articles), 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                for file in os.listdir(testdata):
+                    zip_file.write(os.path.join(testdata, file), arcname='allofplos_xml/' + file)
+                zip_file.writestr('allofplos_xml/README.txt', 'not an article')
+            self.assertIsInstance(get_store(articles), ZipStore)
+            self.assertEqual(sorted(plos_corpus.listdir_nohidden(articles, include_dir=False)),
+                             sorted(os.listdir(testdata)))
+            with open(os.path.join(testdata, example_file), 'rb') as f:
+                self.assertEqual(get_store(articles).read(example_doi), f.read())
+            article = Article(class_doi, directory=articles)
+            self.assertTrue(article.local)
+            self.assertEqual(article.word_count, Article(class_doi, directory=testdata).word_count)
+            self.assertEqual(scan_corpus(scan_article_type, plos_corpus.listdir_nohidden(articles), processes=2,
+                                         chunk_size=1, progress=False).count('retraction'), 1)
+
+    def test_bad_zip_store(self):
+        """A zip file that isn't complete is skipped, and a zip store is only put in place once it's verified."""
+        server = http.server.HTTPServer(('127.0.0.1', 0), RangeServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/uc'.format(server.server_port)
+        zip_bytes = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes, 'w') as zip_file:
+            zip_file.write(os.path.join(testdata, example_file), arcname='allofplos_xml/' + example_file)
+        RangeServer.content = zip_bytes.getvalue()
+        try:
+            with tempfile.TemporaryDirectory() as directory, \
+                    mock.patch.object(plos_corpus, 'google_drive_url', url):
+                articles = os.path.join(directory, 'articles')
+                os.mkdir(articles)
+                with open(get_zip_path(articles), 'wb') as f:
+                    f.write(os.urandom(1024))
+                self.assertIsNone(get_store(articles))
+                self.assertEqual(plos_corpus.listdir_nohidden(articles), [])
+                os.remove(get_zip_path(articles))
+                with self.assertRaises(OSError):
+                    plos_corpus.download_zip_store('id', articles, resume=True, checksum='md5:0')
+                self.assertFalse(os.path.exists(get_zip_path(articles)))
+                plos_corpus.download_zip_store('id', articles, resume=True)
+                self.assertEqual(plos_corpus.listdir_nohidden(articles, include_dir=False), [example_file])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_compress_corpus(self):
+        """Compressed article files are read like XML files, and articles moved into the corpus are compressed too."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            new_articles = os.path.join(directory, 'new')
+            shutil.copytree(testdata, articles)
+            os.mkdir(new_articles)
+            shutil.move(os.path.join(articles, example_file), new_articles)
+            self.assertEqual(compress_corpus(articles, '.gz'), 2)
+            self.assertEqual(sorted(os.listdir(articles)), sorted(file + '.gz' for file in (example_file2, 'journal.pone.0185809.xml')))
+            self.assertEqual(filename_to_doi('journal.pone.0185809.xml.gz'), class_doi)
+            self.assertEqual(sorted(plos_corpus.listdir_nohidden(articles, include_dir=False)),
+                             sorted([example_file2, 'journal.pone.0185809.xml']))
+            article = Article(class_doi, directory=articles)
+            self.assertTrue(article.local)
+            self.assertEqual(article.title, Article(class_doi, directory=testdata).title)
+            with SyncState(articles) as state:
+                move_articles(new_articles, articles, state=state)
+                self.assertEqual(state.dois(), {example_doi, example_doi2, class_doi})
+            self.assertTrue(os.path.isfile(os.path.join(articles, example_file + '.gz')))
+            self.assertEqual(plos_corpus.check_article_type(os.path.join(articles, example_file)), 'other')
+
+    @unittest.skipUnless(corpus_store.zstandard, "needs the zstandard package")
+    def test_zstd_dictionary(self):
+        """zstd articles are read with the trained dictionary, which can't be replaced while they need it."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, articles)
+            # a dictionary needs more samples than the test articles
+            for number in range(30):
+                shutil.copy(os.path.join(testdata, example_file),
+                            os.path.join(articles, 'journal.pone.{:07d}.xml'.format(number)))
+            with mock.patch.object(corpus_store, 'dictionary_size', 4096):
+                self.assertEqual(compress_corpus(articles, '.zst', dictionary=True), 33)
+                with open(corpus_store.get_dictionary_path(articles), 'rb') as f:
+                    dictionary = f.read()
+                self.assertTrue(all(file.endswith('.zst') for file in os.listdir(articles)))
+                with open(os.path.join(testdata, example_file), 'rb') as f:
+                    self.assertEqual(read_article(os.path.join(articles, 'journal.pone.0000007.xml')), f.read())
+                self.assertEqual(Article(class_doi, directory=articles).title,
+                                 Article(class_doi, directory=testdata).title)
+                with self.assertRaises(ValueError):
+                    compress_corpus(articles, '.zst', dictionary=True)
+                with open(corpus_store.get_dictionary_path(articles), 'rb') as f:
+                    self.assertEqual(f.read(), dictionary)
+
+
+class TestCorpusLayout(unittest.TestCase):
+
+    def test_migrate_layout(self):
+        """Articles are found by DOI in the sharded layout, and the corpus can be migrated back and forth."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, articles)
+            self.assertEqual(migrate_layout(articles, 'sharded'), 3)
+            self.assertEqual(get_layout(articles), 'sharded')
+            sharded_path = os.path.join(articles, 'pone', '0185', 'journal.pone.0185809.xml')
+            self.assertTrue(os.path.isfile(sharded_path))
+            self.assertEqual(doi_to_path(class_doi, directory=articles), sharded_path)
+            self.assertEqual(filename_to_doi(sharded_path), class_doi)
+            self.assertEqual(url_to_path(example_url2, directory=articles),
+                             os.path.join(articles, 'correction', '31', example_file2))
+            self.assertEqual(sorted(plos_corpus.listdir_nohidden(articles)),
+                             sorted(doi_to_path(doi, directory=articles)
+                                    for doi in (example_doi, example_doi2, class_doi)))
+            article = Article(class_doi, directory=articles)
+            self.assertEqual(article.filename, sharded_path)
+            self.assertEqual(article.title, Article(class_doi, directory=testdata).title)
+            with SyncState(articles) as state:
+                self.assertEqual(state.refresh(), (3, 0))
+                self.assertEqual(state.get(class_doi)['path'], sharded_path)
+            self.assertEqual(migrate_layout(articles, 'flat'), 3)
+            self.assertEqual(sorted(os.listdir(articles)), sorted(os.listdir(testdata)))
+
+    def test_layout_follows_layout_file(self):
+        """Only a sharded directory is listed with its subdirectories, and extracted articles follow the layout."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, os.path.join(articles, 'pone', '0185'))
+            self.assertEqual(plos_corpus.listdir_nohidden(articles), [])
+            # a migration done elsewhere, by writing the layout file
+            with open(get_layout_path(articles), 'w') as f:
+                f.write('sharded')
+            self.assertEqual(get_layout(articles), 'sharded')
+            self.assertEqual(len(plos_corpus.listdir_nohidden(articles)), 3)
+            zip_path = os.path.join(directory, 'articles.zip')
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                zip_file.write(os.path.join(testdata, example_file), arcname=example_file)
+            self.assertEqual(extract_zip(zip_path, articles, processes=1), (1, 0))
+            self.assertTrue(os.path.isfile(os.path.join(articles, 'pbio', '2001', example_file)))
+            os.remove(get_layout_path(articles))
+            self.assertEqual(get_layout(articles), 'flat')
+
+
+class TestCorpusIndex(unittest.TestCase):
+
+    def test_corpus_index(self):
+        """The index answers metadata queries without parsing, and only rescans articles that changed."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            shutil.copytree(testdata, articles)
+            with CorpusIndex(articles) as index:
+                self.assertEqual(index.build(processes=1), (3, 0))
+                self.assertEqual(index.build(processes=1), (0, 0))
+                self.assertEqual(index.query(type_='retraction'), [example_doi2])
+                record = Article(class_doi, directory=testdata).to_record()
+                self.assertEqual(index.get(class_doi), record)
+                self.assertEqual(index.query(journal=record.journal, start_date=record.pubdate,
+                                             end_date=record.pubdate.strftime('%Y-%m-%d')), [class_doi])
+                self.assertEqual(index.query(journal=record.journal, end_date=datetime.datetime(2000, 1, 1)), [])
+                self.assertEqual([article.doi for article in index.articles(related_doi=record.related_doi)],
+                                 index.query(related_doi=record.related_doi))
+                self.assertEqual(sum(count for _, count in index.count_by('type_')), 3)
+                with self.assertRaises(ValueError):
+                    index.query(volume='1')
+                with open(os.path.join(articles, example_file)) as f:
+                    changed = f.read().replace('article-type="other"', 'article-type="correction"')
+                with open(os.path.join(articles, example_file), 'w') as f:
+                    f.write(changed)
+                os.remove(os.path.join(articles, example_file2))
+                self.assertEqual(index.build(processes=1), (1, 1))
+                self.assertEqual(index.query(type_='correction'), [example_doi])
+                self.assertEqual(index.count(), 2)
+
+    def test_index_packed_articles(self):
+        """Packing more articles doesn't make the index scan the articles already packed again."""
+        with tempfile.TemporaryDirectory() as directory:
+            articles = os.path.join(directory, 'articles')
+            os.mkdir(articles)
+            pack_path = get_pack_path(articles)
+            pack_articles([os.path.join(testdata, file) for file in (example_file, example_file2)], pack_path)
+            try:
+                with CorpusIndex(articles) as index:
+                    self.assertEqual(index.build(processes=1), (2, 0))
+                    pack_articles([os.path.join(testdata, 'journal.pone.0185809.xml')], pack_path)
+                    close_stores()
+                    self.assertEqual(index.build(processes=1), (1, 0))
+                    self.assertEqual(index.count(), 3)
+            finally:
+                close_stores()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,6 +3,7 @@
 
 import os
 
+from allofplos.corpus_layout import article_path
 from allofplos.plos_regex import validate_filename, validate_doi, corpusdir
 
 # URL bases for PLOS's Solr instances, that index PLOS articles
@@ -18,6 +19,8 @@ url_suffix = '&type=manuscript'
 INT_URL_SUFFIX = '.XML'
 prefix = '10.1371/'
 suffix_lower = '.xml'
+# extensions of compressed article files, after suffix_lower, like 'journal.pone.1000001.xml.gz'
+compressed_suffixes = ('.zst', '.gz')
 annotation = 'annotation'
 correction = 'correction'
 annotation_url = 'http://journals.plos.org/plosone/article/file?id=10.1371/annotation/'
@@ -45,19 +48,35 @@ def filename_to_url(filename, plos_network=False):
     return doi_to_url(doi, plos_network)
 
 
+def strip_compressed_suffix(filename):
+    """
+    For a compressed article file, the name of the XML file it holds
+    Example:
+    strip_compressed_suffix('journal.pone.1000001.xml.gz') = 'journal.pone.1000001.xml'
+    :param filename: name of or path to an article file
+    :return: filename without its compressed_suffixes extension, if it has one
+    """
+    for compressed_suffix in compressed_suffixes:
+        if filename.endswith(suffix_lower + compressed_suffix):
+            return filename[:-len(compressed_suffix)]
+    return filename
+
+
 def filename_to_doi(filename):
     """
     For a local XML file in the corpusdir directory, transform it to the article's DOI
     Includes transform for the 'annotation' DOIs
     Uses regex to make sure it's a file and not a DOI
+    Compressed article files (see corpus_store) have the same DOI as the XML file they hold
     Example:
     filename_to_doi('journal.pone.1000001.xml') = '10.1371/journal.pone.1000001'
     :param article_file: relative path to local XML file in the corpusdir directory
     :param directory: defaults to corpusdir, containing article files
     :return: full unique identifier for a PLOS article
     """
+    filename = strip_compressed_suffix(filename)
     if correction in filename and validate_filename(filename):
-        article = 'annotation/' + (filename.split('.', 4)[2])
+        article = 'annotation/' + (os.path.basename(filename).split('.', 4)[2])
         doi = prefix + article
     elif validate_filename(filename):
         doi = prefix + os.path.splitext((os.path.basename(filename)))[0]
@@ -75,18 +94,19 @@ def url_to_path(url, directory=corpusdir, plos_network=False):
     'allofplos_xml/journal.pone.1000001.xml'
     :param url: online location of a PLOS article's XML
     :param directory: defaults to corpusdir, containing article files
-    :return: relative path to local XML file in the corpusdir directory
+    :return: relative path to local XML file in the corpusdir directory, in the directory's layout
+    (see corpus_layout)
     """
     annot_prefix = 'plos.correction.'
     if url.startswith(annotation_url) or url.startswith(annotation_url_int):
         # NOTE: REDO THIS!
-        file_ = os.path.join(directory,
+        file_ = article_path(directory,
                              annot_prefix +
                              url[url.index(annotation_doi + '/')+len(annotation_doi + '/'):].
                              replace(url_suffix, '').
                              replace(INT_URL_SUFFIX, '') + '.xml')
     else:
-        file_ = os.path.join(directory,
+        file_ = article_path(directory,
                              url[url.index(prefix)+len(prefix):].
                              replace(url_suffix, '').
                              replace(INT_URL_SUFFIX, '') + '.xml')
@@ -128,12 +148,12 @@ def doi_to_path(doi, directory=corpusdir):
     doi_to_path('10.1371/journal.pone.1000001') = 'allofplos_xml/journal.pone.1000001.xml'
     :param doi: full unique identifier for a PLOS article
     :param directory: defaults to corpusdir, containing article files
-    :return: relative path to local XML file
+    :return: relative path to local XML file, in the directory's layout (see corpus_layout)
     """
     if doi.startswith(annotation_doi) and validate_doi(doi):
-        article_file = os.path.join(directory, "plos.correction." + doi.split('/')[-1] + suffix_lower)
+        article_file = article_path(directory, "plos.correction." + doi.split('/')[-1] + suffix_lower)
     elif validate_doi(doi):
-        article_file = os.path.join(directory, doi.lstrip(prefix) + suffix_lower)
+        article_file = article_path(directory, doi.lstrip(prefix) + suffix_lower)
     # NOTE: The following check is weird, a DOI should never validate as a file name.
     elif validate_filename(doi):
         article_file = doi
@@ -0,0 +1,155 @@
+"""Process-wide cache of parsed article trees.
+
+Parsing an article's XML file is the slowest part of reading its metadata. When the cache is
+switched on with enable_tree_cache(), every Article reading the same file shares one parsed tree.
+Trees are kept in least-recently-used order within a memory budget, and are checked against the
+file's modification time and size on every access, so an article that was downloaded again is
+parsed again. The cache is off by default.
+
+Trees from the cache are shared between Article objects, so they shouldn't be modified.
+
+Most metadata is in an article's <front> element, while the body and reference list make up
+most of the file. parse_front() reads a file only as far as the end of <front>, for looking up
+metadata without parsing (or keeping in memory) the rest of the article.
+"""
+
+import collections
+import os
+import threading
+
+from allofplos import corpus_store, parsers
+
+# An lxml tree takes several times more memory than the XML file it was parsed from
+TREE_SIZE_FACTOR = 5
+default_max_memory = 512 * 1024 * 1024
+
+
+class TreeCache():
+    """Least-recently-used cache of parsed XML files, limited by their estimated memory use."""
+    def __init__(self, max_memory=default_max_memory):
+        """
+        :param max_memory: memory budget in bytes; each tree is counted as TREE_SIZE_FACTOR times its file size
+        """
+        self.max_memory = max_memory
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self._trees = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._trees)
+
+    def get(self, filename, parse=parsers.parse, key=None):
+        """
+        Get the parsed tree of a file, parsing it if it isn't cached or the file has changed
+        :param filename: path to an XML file
+        :param parse: function that parses the file into a tree
+        :param key: what kind of tree parse() makes, so different trees of the same file are cached separately
+        :return: lxml element tree
+        """
+        version, file_size = corpus_store.article_version(filename)
+        cache_key = (os.path.abspath(filename), key)
+        with self._lock:
+            cached = self._trees.get(cache_key)
+            if cached is not None and cached[0] == version:
+                self._trees.move_to_end(cache_key)
+                self.hits += 1
+                return cached[2]
+
+        tree = parse(filename)
+        size = file_size * TREE_SIZE_FACTOR
+        with self._lock:
+            self.misses += 1
+            old = self._trees.pop(cache_key, None)
+            if old is not None:
+                self.memory -= old[1]
+            if size <= self.max_memory:
+                self._trees[cache_key] = (version, size, tree)
+                self.memory += size
+                while self.memory > self.max_memory:
+                    _, (_, old_size, _) = self._trees.popitem(last=False)
+                    self.memory -= old_size
+        return tree
+
+    def clear(self):
+        with self._lock:
+            self._trees.clear()
+            self.memory = 0
+
+
+def parse_front(filename):
+    """
+    Parse an article file only as far as the end of its <front> element
+    Files without a <front> element are parsed whole.
+    :param filename: path to an article XML file, or a file-like object such as io.BytesIO
+    :return: lxml element tree of the <article> element, with <front> as its only child
+    """
+    for _, front in parsers.iterparse(filename, events=('end',), tag='front'):
+        # the parser reads ahead in chunks, so drop the start of the body it may have read
+        root = front.getparent()
+        for element in list(front.itersiblings()):
+            root.remove(element)
+        return front.getroottree()
+    if hasattr(filename, 'seek'):
+        filename.seek(0)
+    return parsers.parse(filename)
+
+
+def is_front_path(tag_location):
+    """
+    Whether an XPath location from the root of an article only looks at <article> or inside <front>,
+    so that it can be evaluated on a tree from parse_front()
+    :param tag_location: absolute XPath location, like '/article/front/article-meta'
+    :return: bool
+    """
+    path = tag_location.lstrip('/')
+    return path == 'article' or path == 'article/front' or path.startswith('article/front/')
+
+
+_tree_cache = None
+
+
+def enable_tree_cache(max_memory=default_max_memory):
+    """
+    Switch on the process-wide tree cache, or change its memory budget (which empties it)
+    :param max_memory: memory budget in bytes, see TreeCache
+    :return: the TreeCache, e.g. for looking at its hits and misses
+    """
+    global _tree_cache
+    _tree_cache = TreeCache(max_memory=max_memory)
+    return _tree_cache
+
+
+def disable_tree_cache():
+    """Switch off the process-wide tree cache and free the trees in it."""
+    global _tree_cache
+    _tree_cache = None
+
+
+def get_tree_cache():
+    """:return: the process-wide TreeCache, or None if it's off"""
+    return _tree_cache
+
+
+def cached_parse(filename, parse=parsers.parse, key=None):
+    """
+    Parse an XML file, through the process-wide tree cache if it's on
+    :param filename: path to an XML file
+    :param parse: function that parses the file into a tree
+    :param key: see TreeCache.get()
+    :return: lxml element tree
+    """
+    cache = _tree_cache
+    if cache is None:
+        return parse(filename)
+    return cache.get(filename, parse=parse, key=key)
+
+
+def cached_parse_front(filename):
+    """
+    Parse an article file as far as the end of <front>, through the process-wide tree cache if it's on
+    :param filename: path to an article XML file
+    :return: lxml element tree, see parse_front()
+    """
+    return cached_parse(filename, parse=parse_front, key='front')
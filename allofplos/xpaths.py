@@ -0,0 +1,63 @@
+"""Precompiled XPath expressions for locations in PLOS article trees.
+
+Evaluating an XPath string with element.xpath() compiles it again on every call, which adds up
+over a corpus of 230k+ articles. The locations that Article and plos_corpus look up are listed
+here by name, and each is compiled once into an lxml XPath object that every caller shares.
+Any other location passed to get_xpath() is compiled on first use and kept.
+
+Usage:
+`XPATHS['pub_date'](article_tree)` or `get_xpath(['/', 'article', 'front', 'article-meta', 'pub-date'])(article_tree)`
+"""
+
+import threading
+
+import lxml.etree as et
+
+# Named locations in a PLOS article, as XPath tag path elements from the root
+article_paths = {'article': ('/', 'article'),
+                 'journal_meta': ('/', 'article', 'front', 'journal-meta'),
+                 'journal_title': ('/', 'article', 'front', 'journal-meta', 'journal-title-group',
+                                   'journal-title'),
+                 'article_meta': ('/', 'article', 'front', 'article-meta'),
+                 'article_id': ('/', 'article', 'front', 'article-meta', 'article-id'),
+                 'article_categories': ('/', 'article', 'front', 'article-meta', 'article-categories'),
+                 'title': ('/', 'article', 'front', 'article-meta', 'title-group', 'article-title'),
+                 'contrib_group': ('/', 'article', 'front', 'article-meta', 'contrib-group'),
+                 'contrib': ('/', 'article', 'front', 'article-meta', 'contrib-group', 'contrib'),
+                 'author_notes': ('/', 'article', 'front', 'article-meta', 'author-notes'),
+                 'pub_date': ('/', 'article', 'front', 'article-meta', 'pub-date'),
+                 'history': ('/', 'article', 'front', 'article-meta', 'history'),
+                 'counts': ('/', 'article', 'front', 'article-meta', 'counts'),
+                 'abstract': ('/', 'article', 'front', 'article-meta', 'abstract'),
+                 'related_article': ('/', 'article', 'front', 'article-meta', 'related-article'),
+                 'custom_meta': ('/', 'article', 'front', 'article-meta', 'custom-meta-group', 'custom-meta'),
+                 # where uncorrected proofs and versions of record are marked
+                 'proof': ('/', 'article', 'front', 'article-meta', 'custom-meta-group', 'custom-meta',
+                           'meta-value'),
+                 'body': ('/', 'article', 'body'),
+                 'back': ('/', 'article', 'back'),
+                 }
+
+# compiled XPath objects by location string, shared by article_paths and get_xpath()
+_compiled = {'/'.join(path): et.XPath('/'.join(path)) for path in article_paths.values()}
+_compiled_lock = threading.Lock()
+
+XPATHS = {name: _compiled['/'.join(path)] for name, path in article_paths.items()}
+
+
+def get_xpath(tag_path_elements=None, name=None):
+    """
+    Get the compiled XPath for a location in an article, compiling it only the first time
+    :param tag_path_elements: XPath location as a list of tag path elements, like ['/', 'article', 'body']
+    :param name: name of a location in article_paths, instead of tag_path_elements; defaults to 'proof'
+    :return: lxml XPath object, which is called with an element or tree and returns a list of results
+    """
+    if tag_path_elements is None:
+        return XPATHS[name or 'proof']
+    tag_location = '/'.join(tag_path_elements)
+    xpath = _compiled.get(tag_location)
+    if xpath is None:
+        xpath = et.XPath(tag_location)
+        with _compiled_lock:
+            xpath = _compiled.setdefault(tag_location, xpath)
+    return xpath